@@ -1,98 +1,239 @@
+import contextvars
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import pyarrow as pa
 import requests
 
-WEATHER_API_URL = "http://api.openweathermap.org/data/2.5/weather"
-WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
-COVID_API_URL = "https://api.covidtracking.com/v1/states"
-EXCHANGE_API_URL = "https://api.exchangerate-api.com/v4/latest"
-SPACEX_API_URL = "https://api.spacexdata.com/v4/launches/upcoming"
-
-
-def fetch_weather_data():
-    """Fetch weather data from OpenWeather API"""
-
-    cities = ["London", "New York", "Tokyo", "Paris", "Sydney"]
-
-    weather_data = []
-    for city in cities:
-        try:
-            response = requests.get(WEATHER_API_URL, params={"q": city, "appid": WEATHER_API_KEY})
-            response.raise_for_status()
-            data = response.json()
-            weather_data.append(data)
-        except Exception as e:
-            print(f"Error fetching data for {city}: {e}")
-
-    # Save the weather data for multiple cities
-    with open("/app/shared_data/weather_data.json", "w") as f:
-        json.dump(weather_data, f)
-    print("Weather data fetched for multiple cities.")
-
-
-def fetch_covid_data():
-    """Fetch COVID-19 data for multiple states"""
-    states = ["ca", "ny", "tx", "fl", "wa"]
-    covid_data = []
-
-    for state in states:
-        try:
-            response = requests.get(f"{COVID_API_URL}/{state}/current.json")
-            response.raise_for_status()
-            covid_data.append(response.json())
-        except Exception as e:
-            print(f"Error fetching COVID-19 data for {state}: {e}")
-
-    # Save the COVID-19 data
-    with open("/app/shared_data/covid_data.json", "w") as f:
-        json.dump(covid_data, f)
-    print("COVID-19 data fetched for multiple states.")
-
-
-def fetch_exchange_rate_data():
-    """Fetch exchange rates for multiple base currencies"""
-    currencies = ["USD", "EUR", "GBP"]
-    exchange_data = {}
-
-    for currency in currencies:
+from etl_common.handoff import RAW_DATA_PATH, write_handoff
+from etl_common.metrics import add_metrics, instrument, reset_run, write_run_report
+from etl_common.pipeline import Pipeline
+from etl_common.scheduler import Scheduler
+from etl_common.sources import SOURCES, collect_payload, page_query, request_jobs, settled
+from http_client import get_json, get_session, latency_report, post_json, reset_latencies
+
+# Seconds a cached response is reused without contacting the API; older ones are revalidated
+CACHE_TTLS = {name: source["cache_ttl"] for name, source in SOURCES.items()}
+
+# "sequential" issues one blocking request at a time, "concurrent" fans out over a pooled session
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "concurrent")
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "16"))
+# "once" extracts every source and exits, "daemon" keeps running and refreshes each source on its interval
+RUN_MODE = os.getenv("RUN_MODE", "once")
+EXTRACT_INTERVALS = {name: source["interval"] for name, source in SOURCES.items()}
+# "json" hands raw payloads over as JSON files, "arrow" as memory-mappable Arrow IPC files
+HANDOFF_FORMAT = os.getenv("HANDOFF_FORMAT", "json")
+
+
+def fetch_many(jobs, mode=None, ttl=None):
+    """Fetch (key, url, params) jobs and return {key: data}, preserving job order"""
+    mode = mode or EXTRACT_MODE
+    stats = {}
+    if mode == "concurrent":
+        session = get_session()
+        with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as executor:
+            # Requests run in the caller's context, so their latencies are recorded for its metrics run
+            futures = [(key, executor.submit(contextvars.copy_context().run, get_json, url, params, session, stats, ttl))
+                       for key, url, params in jobs]
+            outcomes = []
+            for key, future in futures:
+                try:
+                    outcomes.append((key, future.result(), None))
+                except Exception as e:
+                    outcomes.append((key, None, e))
+    else:
+        outcomes = []
+        for key, url, params in jobs:
+            try:
+                # The bare requests module keeps the original one-connection-per-call behaviour
+                outcomes.append((key, get_json(url, params, session=requests, stats=stats, ttl=ttl), None))
+            except Exception as e:
+                outcomes.append((key, None, e))
+
+    results = {}
+    for key, data, error in outcomes:
+        if error is None:
+            results[key] = data
+        else:
+            print(f"Error fetching data for {key}: {error}")
+    # Counted here, in the instrumented thread, rather than in the pool's workers
+    add_metrics(**stats)
+    return results
+
+
+def save_raw_data(data, name):
+    """Write a raw payload to the shared volume for the transform service"""
+    os.makedirs(RAW_DATA_PATH, exist_ok=True)
+    if HANDOFF_FORMAT == "arrow":
         try:
-            response = requests.get(f"{EXCHANGE_API_URL}/{currency}")
-            response.raise_for_status()
-            exchange_data[currency] = response.json()
-        except Exception as e:
-            print(f"Error fetching exchange rate data for {currency}: {e}")
-
-    # Save the exchange rate data
-    with open("/app/shared_data/exchange_rate_data.json", "w") as f:
-        json.dump(exchange_data, f)
-    print("Exchange rate data fetched for multiple currencies.")
-
-
-def fetch_spacex_data():
-    """Fetch SpaceX upcoming and past launches"""
+            size = write_handoff(data, f"{RAW_DATA_PATH}/{name}.arrow")
+            add_metrics(rows=len(data), bytes_written=size)
+            return
+        except pa.ArrowException as e:
+            print(f"Falling back to JSON for {name}, payload does not fit one Arrow schema: {e}")
+    path = f"{RAW_DATA_PATH}/{name}.json"
+    # Replaced in one step, so a daemon refresh never exposes a half-written file to the transform
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(f"{path}.tmp", path)
+    add_metrics(rows=len(data), bytes_written=os.path.getsize(path))
+
+
+# Paginated sources are written as a JSON array with one record per line, so the next
+# run can read the stored records back one at a time without a streaming JSON parser
+def _write_record(f, record, first):
+    f.write(("\n" if first else ",\n") + json.dumps(record))
+
+
+def _stored_records(path):
+    """Yield the records of a raw file written by extract_pages; raises ValueError for any other layout"""
+    with open(path, "r") as f:
+        if f.readline().strip() != "[":
+            raise ValueError(f"{path} was not written page by page")
+        for line in f:
+            line = line.strip().rstrip(",")
+            if line and line != "]":
+                yield json.loads(line)
+
+
+def _stored_watermark(name, path):
+    """The previous raw file's latest settled watermark value and the keys of its pending records.
+
+    The watermark is None when the source has to be fetched in full.
+    """
+    source = SOURCES[name]
+    values, pending = [], set()
     try:
-        response = requests.get(SPACEX_API_URL)
-        response.raise_for_status()
-        spacex_data = response.json()
-
-        # Save the SpaceX data
-        with open("/app/shared_data/spacex_data.json", "w") as f:
-            json.dump(spacex_data, f)
-        print("SpaceX launch data fetched.")
-    except Exception as e:
-        print(f"Error fetching SpaceX data: {e}")
-
-
-def extract_data():
-    """Run all extraction tasks"""
-    print("Starting data extraction...")
-    fetch_weather_data()
-    fetch_covid_data()
-    fetch_exchange_rate_data()
-    fetch_spacex_data()
-    print("Data extraction completed!")
+        for record in _stored_records(path):
+            if record.get(source["pending"]):
+                pending.add(record.get(source["key"]))
+            else:
+                values.append(record.get(source["watermark"]))
+    except FileNotFoundError:
+        return None, set()
+    except ValueError as e:
+        print(f"Fetching {name} in full: {e}")
+        return None, set()
+    values = [value for value in values if value is not None]
+    pending.discard(None)
+    return (max(values) if values else None), pending
+
+
+def extract_pages(name):
+    """Stream a paginated source to its raw file page by page, fetching only what changed since the last run.
+
+    Settled records are copied over from the previous raw file, then every page
+    of the query is appended as it arrives, so memory holds one page at a time.
+    """
+    source = SOURCES[name]
+    path = f"{RAW_DATA_PATH}/{name}.json"
+    watermark, pending = _stored_watermark(name, path)
+    session = get_session() if EXTRACT_MODE == "concurrent" else requests
+    stats = {}
+    kept = fetched = pages = 0
+    os.makedirs(RAW_DATA_PATH, exist_ok=True)
+    try:
+        with open(f"{path}.tmp", "w") as f:
+            f.write("[")
+            if watermark is not None:
+                for record in _stored_records(path):
+                    if settled(name, record, watermark):
+                        _write_record(f, record, kept == 0)
+                        kept += 1
+            page = 1
+            while page:
+                response = post_json(source["url"], page_query(name, page, watermark, pending), session, stats,
+                                     CACHE_TTLS[name])
+                for record in response["docs"]:
+                    _write_record(f, record, kept + fetched == 0)
+                    fetched += 1
+                pages += 1
+                page = response.get("nextPage") if response.get("hasNextPage") else None
+            f.write("\n]\n")
+        if kept + fetched == 0:
+            # The previous handoff is kept rather than overwritten with nothing
+            raise RuntimeError(f"no data fetched from {source['url']}")
+        os.replace(f"{path}.tmp", path)
+    except Exception:
+        if os.path.exists(f"{path}.tmp"):
+            os.remove(f"{path}.tmp")
+        raise
+    finally:
+        add_metrics(**stats)
+    add_metrics(rows=kept + fetched, bytes_written=os.path.getsize(path))
+    since = f" since {watermark}" if watermark is not None else ""
+    print(f"{name} fetched ({fetched} new or pending records{since} in {pages} pages, {kept} kept).")
+
+
+def extract_source(name):
+    """Fetch one source as declared in the registry and hand its raw payload off"""
+    source = SOURCES[name]
+    if source["collect"] == "pages":
+        extract_pages(name)
+        return
+    jobs = request_jobs(name)
+    data = collect_payload(name, fetch_many(jobs, ttl=CACHE_TTLS[name]))
+    if data is None:
+        # The previous handoff is kept rather than overwritten with nothing
+        raise RuntimeError(f"no data fetched from {source['url']}")
+    save_raw_data(data, name)
+    print(f"{name} fetched ({len(data) if source['collect'] != 'single' else 1} of {len(jobs)} payloads).")
+
+
+def extract_data(names=None, run=None):
+    """Run the extraction of the given sources (all of them by default), each as an independent task.
+
+    The metrics and latencies are reported as the given run, so concurrent
+    scheduled runs each keep their own figures in the service's report.
+    """
+    names = list(names or SOURCES)
+    print(f"Starting data extraction of {', '.join(names)} ({EXTRACT_MODE})...")
+    reset_run(run)
+    reset_latencies()
+    start = time.perf_counter()
+
+    def run_task(name):
+        with instrument("extract", name):
+            extract_source(name)
+
+    pipeline = Pipeline(max_workers=len(names) if EXTRACT_MODE == "concurrent" else 1)
+    for name in names:
+        pipeline.add(f"extract:{name}", run_task, name)
+    try:
+        pipeline.run()
+    except RuntimeError as e:
+        # A failed source keeps its previous handoff; the others are still delivered
+        print(f"Data extraction incomplete: {e}")
+    elapsed = time.perf_counter() - start
+
+    report = latency_report()
+    print(f"Data extraction completed in {elapsed:.2f}s")
+    if report["cache_hits"] or report["revalidated"]:
+        print(f"HTTP cache: {report['cache_hits']} fresh hits, {report['revalidated']} revalidated (304)")
+    if report["requests"]:
+        print(
+            f"{report['requests']} requests ({report['retries']} retries): "
+            f"mean {report['mean'] * 1000:.0f}ms, p50 {report['p50'] * 1000:.0f}ms, "
+            f"p95 {report['p95'] * 1000:.0f}ms, max {report['max'] * 1000:.0f}ms"
+        )
+    write_run_report("api_service")
+
+
+def run_daemon():
+    """Refresh every source on its own interval, reusing the warm session and HTTP cache"""
+    scheduler = Scheduler(max_workers=len(SOURCES))
+    for name, interval in EXTRACT_INTERVALS.items():
+        # A scheduled refresh must at least revalidate, never be served a still-fresh cache entry
+        CACHE_TTLS[name] = min(CACHE_TTLS[name], interval // 2)
+        print(f"Scheduling {name} every {interval}s")
+        scheduler.every(name, interval, lambda name=name: extract_data([name], run=name))
+    scheduler.run()
 
 
 if __name__ == "__main__":
-    extract_data()
+    if RUN_MODE == "daemon":
+        run_daemon()
+    else:
+        extract_data()
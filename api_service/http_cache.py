@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "/app/shared_data/http_cache")
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE", "true").lower() in ("1", "true", "yes")
+# Entries not fetched or revalidated for this many seconds are pruned, then the oldest ones beyond the size limit.
+# Query bodies such as the SpaceX watermark make new keys every run, so the cache would otherwise grow forever
+HTTP_CACHE_MAX_AGE = float(os.getenv("HTTP_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+HTTP_CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "256"))
+# Pruning walks the whole cache, so a process does it at most this often (seconds)
+PRUNE_INTERVAL = 60
+
+_prune_lock = threading.Lock()
+_last_prune = None
+
+
+def cache_key(url, params=None):
+    canonical = json.dumps([url, sorted((params or {}).items())], default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _path(key):
+    return f"{HTTP_CACHE_DIR}/{key[:2]}/{key}.json"
+
+
+def load(url, params=None):
+    """Return the cached entry for a request, or None"""
+    try:
+        with open(_path(cache_key(url, params)), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store(url, params, data, etag=None, last_modified=None):
+    entry = {
+        "url": url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time(),
+        "data": data
+    }
+    path = _path(cache_key(url, params))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique temporary name so concurrent writers of the same entry never interleave
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+    _maybe_prune()
+    return entry
+
+
+def _maybe_prune():
+    global _last_prune
+    with _prune_lock:
+        now = time.monotonic()
+        if _last_prune is not None and now - _last_prune < PRUNE_INTERVAL:
+            return
+        _last_prune = now
+    prune()
+
+
+def prune(max_age=None, max_bytes=None):
+    """Remove the entries older than max_age, then the least recently stored ones above max_bytes.
+
+    Age is the file's modification time, which store() and touch() renew.
+    Returns the number of files removed.
+    """
+    max_age = HTTP_CACHE_MAX_AGE if max_age is None else max_age
+    max_bytes = HTTP_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    entries = []
+    for directory, _, names in os.walk(HTTP_CACHE_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for modified, size, path in entries:
+        # Oldest first: expired entries and leftover temporary files, then whatever exceeds the size limit
+        if now - modified <= max_age:
+            if total <= max_bytes:
+                break
+            if path.endswith(".tmp"):
+                # Still being written by another request
+                continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def touch(url, params, entry):
+    """Mark a revalidated (304) entry as fresh again"""
+    return store(url, params, entry["data"], entry.get("etag"), entry.get("last_modified"))
+
+
+def is_fresh(entry, ttl):
+    return entry is not None and ttl is not None and time.time() - entry["fetched_at"] < ttl
+
+
+def conditional_headers(entry):
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
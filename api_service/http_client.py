@@ -0,0 +1,238 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from etl_common.metrics import current_run
+import http_cache
+
+# Connection pool and retry settings shared by every extractor
+POOL_SIZE = 20
+MAX_PER_HOST = 4
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+# Longest Retry-After a server can make a retry wait, in seconds
+RETRY_AFTER_CAP = 60.0
+REQUEST_TIMEOUT = 10
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Token-bucket limits per API host as (requests per second, burst); unlisted hosts are unlimited.
+# API_RATE_LIMITS="host=rate:burst,..." overrides or extends them.
+RATE_LIMITS = {
+    "api.openweathermap.org": (1.0, 10),
+    "api.covidtracking.com": (2.0, 10),
+    "api.exchangerate-api.com": (0.5, 5),
+    "api.spacexdata.com": (0.5, 5),
+}
+for _limit in filter(None, os.getenv("API_RATE_LIMITS", "").split(",")):
+    _host, _spec = _limit.split("=")
+    _rate, _burst = _spec.split(":")
+    RATE_LIMITS[_host.strip()] = (float(_rate), int(_burst))
+
+_session = None
+_session_lock = threading.Lock()
+_host_limits = defaultdict(lambda: threading.BoundedSemaphore(MAX_PER_HOST))
+_host_limits_lock = threading.Lock()
+_buckets = {}
+_latencies = []
+_latencies_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide session with keep-alive connection pools"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available; return the seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def _rate_limit(url):
+    """Block until the URL's host allows another request"""
+    host = urlparse(url).hostname
+    if host not in RATE_LIMITS:
+        return 0.0
+    with _host_limits_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(*RATE_LIMITS[host])
+        bucket = _buckets[host]
+    return bucket.acquire()
+
+
+def _host_semaphore(url):
+    host = urlparse(url).netloc
+    with _host_limits_lock:
+        return _host_limits[host]
+
+
+def _retry_after(response):
+    """Seconds a 429/503 response asks the client to wait (Retry-After in seconds or as an HTTP date), or None"""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), RETRY_AFTER_CAP)
+
+
+def _backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter, added on top of the server's Retry-After when it sent one.
+
+    The jitter keeps the workers a Retry-After released together from retrying in lockstep.
+    """
+    return (retry_after or 0.0) + random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _record_latency(url, seconds, attempts, status):
+    with _latencies_lock:
+        _latencies.append({"run": current_run(), "url": url, "seconds": seconds, "attempts": attempts,
+                           "status": status})
+
+
+def _add_stats(stats, **counts):
+    if stats is not None:
+        with _latencies_lock:
+            for counter, value in counts.items():
+                stats[counter] = stats.get(counter, 0) + value
+
+
+def get_json(url, params=None, session=None, stats=None, ttl=None):
+    """GET a JSON document, retrying transient failures with jittered backoff.
+
+    With a ttl (seconds), responses are kept in the on-disk HTTP cache: a
+    cached response younger than the ttl is returned without a request, and an
+    older one is revalidated with If-None-Match/If-Modified-Since so that an
+    unchanged document costs a 304 instead of a full download.
+    When a stats dict is given, the bytes read, retries and cache hits are added to it.
+    """
+    return _request_json(url, params, None, session, stats, ttl)
+
+
+def post_json(url, body, session=None, stats=None, ttl=None):
+    """POST a JSON body (a query) and return the JSON response, like get_json.
+
+    Responses are cached per body, so a rerun asking the same query is answered from the cache.
+    """
+    return _request_json(url, None, body, session, stats, ttl)
+
+
+def _request_json(url, params, body, session, stats, ttl):
+    session = session or get_session()
+    cache_params = params if body is None else {"body": json.dumps(body, sort_keys=True)}
+    cached = http_cache.load(url, cache_params) if http_cache.HTTP_CACHE_ENABLED and ttl is not None else None
+    if http_cache.is_fresh(cached, ttl):
+        _record_latency(url, 0.0, 0, "cached")
+        _add_stats(stats, cache_hits=1)
+        return cached["data"]
+
+    attempt = 0
+    start = time.perf_counter()
+    while True:
+        status = None
+        response = None
+        try:
+            _rate_limit(url)
+            with _host_semaphore(url):
+                headers = http_cache.conditional_headers(cached)
+                if body is None:
+                    response = session.get(url, params=params, timeout=REQUEST_TIMEOUT, headers=headers)
+                else:
+                    response = session.post(url, json=body, timeout=REQUEST_TIMEOUT, headers=headers)
+            status = response.status_code
+            if status in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+                raise requests.HTTPError(f"retryable status {status}", response=response)
+            if status == 304 and cached is not None:
+                http_cache.touch(url, cache_params, cached)
+                _record_latency(url, time.perf_counter() - start, attempt + 1, status)
+                _add_stats(stats, retries=attempt, revalidated=1)
+                return cached["data"]
+            response.raise_for_status()
+            data = response.json()
+            if http_cache.HTTP_CACHE_ENABLED and ttl is not None:
+                http_cache.store(url, cache_params, data, response.headers.get("ETag"),
+                                 response.headers.get("Last-Modified"))
+            _record_latency(url, time.perf_counter() - start, attempt + 1, status)
+            _add_stats(stats, bytes_read=len(response.content), retries=attempt)
+            return data
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError):
+            retryable = status is None or status in RETRY_STATUS_CODES
+            if not retryable or attempt >= MAX_RETRIES:
+                _record_latency(url, time.perf_counter() - start, attempt + 1, status)
+                _add_stats(stats, retries=attempt)
+                raise
+            time.sleep(_backoff_delay(attempt, _retry_after(response)))
+            attempt += 1
+
+
+def reset_latencies():
+    """Forget the latencies of the current metrics run; concurrent runs keep theirs"""
+    run = current_run()
+    with _latencies_lock:
+        _latencies[:] = [sample for sample in _latencies if sample["run"] != run]
+
+
+def latency_report():
+    """Summarize the per-request latencies of the current metrics run since the last reset"""
+    run = current_run()
+    with _latencies_lock:
+        samples = [sample for sample in _latencies if sample["run"] == run]
+    cache_hits = sum(1 for sample in samples if sample["status"] == "cached")
+    revalidated = sum(1 for sample in samples if sample["status"] == 304)
+    samples = [sample for sample in samples if sample["status"] != "cached"]
+    if not samples:
+        return {"requests": 0, "cache_hits": cache_hits, "revalidated": revalidated}
+    seconds = sorted(sample["seconds"] for sample in samples)
+    count = len(seconds)
+    return {
+        "requests": count,
+        "cache_hits": cache_hits,
+        "revalidated": revalidated,
+        "retries": sum(sample["attempts"] - 1 for sample in samples),
+        "mean": sum(seconds) / count,
+        "p50": seconds[count // 2],
+        "p95": seconds[min(count - 1, int(count * 0.95))],
+        "max": seconds[-1],
+    }
@@ -0,0 +1,268 @@
+"""Local stand-in for the four public APIs used by the extractor.
+
+Serves deterministic payloads with ETag and Last-Modified headers and answers
+conditional requests with 304, so the extractor and its HTTP cache can be
+exercised offline and without rate limits:
+
+    python stub_server.py --port 8099 --latency-ms 50
+
+    WEATHER_API_URL=http://localhost:8099/data/2.5/weather \\
+    COVID_API_URL=http://localhost:8099/v1/states \\
+    EXCHANGE_API_URL=http://localhost:8099/v4/latest \\
+    SPACEX_API_URL=http://localhost:8099/v4/launches/query \\
+    python extract_data.py
+
+Payloads change every --rotate-seconds (never by default), which makes the
+validators change too. --fail-first N answers the first N requests to every
+path with --fail-status (503 by default) and, with --retry-after, a
+Retry-After header, to exercise the extractor's retries. The SpaceX launch query endpoint pages through a fixed
+launch history and honours the query's select, sort and pagination options.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LAUNCH_HISTORY = 250
+UPCOMING_LAUNCHES = 20
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "AUD", "CAD", "CHF", "CNY", "SEK", "NZD"]
+STARTED = int(time.time())
+
+
+def weather_payload(city, seed):
+    rng = random.Random(f"{city}-{seed}")
+    temp = rng.uniform(260, 310)
+    return {
+        "coord": {"lon": round(rng.uniform(-180, 180), 4), "lat": round(rng.uniform(-90, 90), 4)},
+        "weather": [{"id": 800, "main": "Clear", "description": rng.choice(["clear sky", "light rain", "few clouds"])}],
+        "main": {"temp": round(temp, 2), "feels_like": round(temp - rng.uniform(0, 3), 2),
+                 "humidity": rng.randint(10, 100)},
+        "dt": STARTED + seed,
+        "name": city
+    }
+
+
+def covid_payload(state, seed):
+    rng = random.Random(f"{state}-{seed}")
+    return {
+        "state": state.upper(),
+        "positive": rng.randint(10 ** 5, 10 ** 7),
+        "hospitalizedCurrently": rng.randint(100, 10 ** 4),
+        "death": rng.randint(10 ** 3, 10 ** 5),
+        "date": 20210307
+    }
+
+
+def exchange_payload(base, seed):
+    rng = random.Random(f"{base}-{seed}")
+    return {
+        "base": base,
+        "time_last_updated": STARTED + seed,
+        "rates": {currency: 1.0 if currency == base else round(rng.uniform(0.005, 200), 6) for currency in CURRENCIES}
+    }
+
+
+def spacex_payload(seed):
+    rng = random.Random(f"spacex-{seed}")
+    return [
+        {
+            "id": f"{index:024x}",
+            "name": f"Mission {index}",
+            "date_utc": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(STARTED + index * 86400)),
+            "rocket": rng.choice(["5e9d0d95eda69973a809d1ec", "5e9d0d95eda69974db09d1ed"])
+        }
+        for index in range(20)
+    ]
+
+
+def launch(index, seed):
+    """The index-th launch of the history; the last UPCOMING_LAUNCHES are still upcoming"""
+    rng = random.Random(f"launch-{index}-{seed}")
+    days = index - (LAUNCH_HISTORY - UPCOMING_LAUNCHES)
+    return {
+        "id": f"{index:024x}",
+        "flight_number": index + 1,
+        "name": f"Mission {index}",
+        "date_utc": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(STARTED + days * 86400)),
+        "rocket": rng.choice(["5e9d0d95eda69973a809d1ec", "5e9d0d95eda69974db09d1ed"]),
+        "upcoming": days >= 0,
+        "details": "x" * 200
+    }
+
+
+def _matches(doc, query):
+    """The subset of MongoDB query syntax the extractor sends: $or, $gte, $in and equality"""
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(_matches(doc, alternative) for alternative in condition):
+                return False
+        elif isinstance(condition, dict):
+            if "$gte" in condition and not (doc.get(field) is not None and doc[field] >= condition["$gte"]):
+                return False
+            if "$in" in condition and doc.get(field) not in condition["$in"]:
+                return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+def launches_query(body, seed):
+    """Paginated POST /v4/launches/query, with select and sort options"""
+    options = body.get("options", {})
+    docs = [doc for doc in (launch(index, seed) for index in range(LAUNCH_HISTORY))
+            if _matches(doc, body.get("query", {}))]
+    for field, direction in reversed(list(options.get("sort", {}).items())):
+        docs.sort(key=lambda doc: doc.get(field), reverse=direction in ("desc", -1))
+    select = options.get("select")
+    if select:
+        docs = [{field: doc[field] for field in select if field in doc} for doc in docs]
+    limit = options.get("limit", 10)
+    page = options.get("page", 1)
+    total_pages = max(1, -(-len(docs) // limit))
+    return {
+        "docs": docs[(page - 1) * limit:page * limit],
+        "totalDocs": len(docs),
+        "limit": limit,
+        "page": page,
+        "totalPages": total_pages,
+        "hasNextPage": page < total_pages,
+        "nextPage": page + 1 if page < total_pages else None
+    }
+
+
+ROUTES = [
+    (re.compile(r"^/data/2\.5/weather$"), lambda match, query, seed: weather_payload(query.get("q", ["London"])[0], seed)),
+    (re.compile(r"^/v1/states/(\w+)/current\.json$"), lambda match, query, seed: covid_payload(match.group(1), seed)),
+    (re.compile(r"^/v4/latest/(\w+)$"), lambda match, query, seed: exchange_payload(match.group(1).upper(), seed)),
+    (re.compile(r"^/v4/launches/upcoming$"), lambda match, query, seed: spacex_payload(seed)),
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    rotate_seconds = 0
+    fail_first = 0
+    fail_status = 503
+    retry_after = None
+    # Requests seen per (method, path), for the injected failures
+    requests = {}
+    requests_lock = threading.Lock()
+
+    def _version(self):
+        """Seconds since startup at which the current payloads were generated"""
+        if not self.rotate_seconds:
+            return 0
+        return (int(time.time()) - STARTED) // self.rotate_seconds * self.rotate_seconds
+
+    def _injected_failure(self):
+        """Answer with the configured error while the path has had fewer than fail_first requests"""
+        key = (self.command, urlparse(self.path).path)
+        with self.requests_lock:
+            seen = self.requests[key] = self.requests.get(key, 0) + 1
+        if seen > self.fail_first:
+            return False
+        headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+        self._send(self.fail_status, json.dumps({"message": "injected failure"}).encode(), headers)
+        return True
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._injected_failure():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        for pattern, build in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            self._send(404, json.dumps({"message": "not found"}).encode())
+            return
+
+        seed = self._version()
+        body = json.dumps(build(match, query, seed)).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        last_modified = formatdate(STARTED + seed, usegmt=True)
+        headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "no-cache"}
+
+        if self._not_modified(etag, STARTED + seed):
+            self._send(304, b"", headers)
+        else:
+            self._send(200, body, headers)
+
+    def do_POST(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._injected_failure():
+            return
+        if urlparse(self.path).path != "/v4/launches/query":
+            self._send(404, json.dumps({"message": "not found"}).encode())
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send(400, json.dumps({"message": "invalid JSON body"}).encode())
+            return
+        self._send(200, json.dumps(launches_query(body, self._version())).encode())
+
+    def _not_modified(self, etag, modified_at):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return modified_at <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every response")
+    parser.add_argument("--rotate-seconds", type=int, default=0, help="regenerate the payloads this often")
+    parser.add_argument("--fail-first", type=int, default=0, help="fail the first N requests to every path")
+    parser.add_argument("--fail-status", type=int, default=503, help="status of the injected failures")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds sent with them")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency_ms / 1000
+    StubHandler.rotate_seconds = args.rotate_seconds
+    StubHandler.fail_first = args.fail_first
+    StubHandler.fail_status = args.fail_status
+    StubHandler.retry_after = args.retry_after
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Stub API server listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
-import psycopg2
 import plotly.express as px
 import emoji
 import warnings
+from datetime import datetime, timedelta, timezone
+from data_access import average_by, distinct_values, fetch_rows, history_between, latest_by
+from etl_common.schema import numeric_columns
+from etl_common.sources import SOURCES
 warnings.filterwarnings('ignore')
 
 st.set_page_config(layout="centered")
@@ -11,24 +14,6 @@ st.title("Dashboard de Dados")
 
 st.markdown("<hr>", unsafe_allow_html=True)
 
-def load_data_from_postgres(table_name):
-    try:
-        conn = psycopg2.connect(
-            dbname="etl_database",
-            user="user",
-            password="password",
-            host="db",
-            port=5432,
-            options="-c client_encoding=UTF8"
-        )
-        query = f"SELECT * FROM {table_name}"
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
-    except psycopg2.Error as e:
-        st.error(f"Erro ao carregar dados de {table_name}: {e}")
-        return pd.DataFrame()
-
 def get_weather_emoji(description):
     description_map = {
         "clear sky": "☀️",
@@ -54,31 +39,32 @@ def get_state_name(state):
     }
     return state_map.get(state, state)
 
-data_options = {
-    "weather_data": "Dados Meteorológicos",
-    "covid_data": "Dados de COVID-19",
-    "exchange_rate_data": "Taxas de Câmbio",
-    "spacex_data": "Lançamentos da SpaceX"
-}
+data_options = {name: source["label"] for name, source in SOURCES.items()}
+
+# Column each dataset is filtered on; its distinct values populate the first widget
+filter_columns = {name: source["filter_column"] for name, source in SOURCES.items()}
 
 
 selected_dataset = st.selectbox("Escolha o dataset:", list(data_options.keys()), format_func=lambda x: data_options[x])
 
-df = load_data_from_postgres(selected_dataset)
+filter_values = distinct_values(selected_dataset, filter_columns[selected_dataset])
 
 st.markdown("<hr>", unsafe_allow_html=True)
 
-if not df.empty:
+if filter_values:
     st.subheader(data_options[selected_dataset])
 
     if selected_dataset == "weather_data":
-        cities = df["city"].unique()
+        cities = filter_values
         selected_cities = st.multiselect("Escolha as cidades:", cities, key="city_multiselect")
 
         if selected_cities:
+            filtered_df = fetch_rows("weather_data", "city", selected_cities)
+            latest_df = latest_by("weather_data", "city", selected_cities)
+
             cols = st.columns(len(selected_cities))
             for idx, city in enumerate(selected_cities):
-                city_data = df[df['city'] == city].iloc[-1] 
+                city_data = latest_df[latest_df['city'] == city].iloc[0]
                 weather_emoji = get_weather_emoji(city_data['weather'])
                 with cols[idx]:
                     st.markdown(f"<h2 style='font-size: 20px;'>{weather_emoji} {city}</h2>", unsafe_allow_html=True)
@@ -86,16 +72,12 @@ if not df.empty:
                     st.markdown(f"<p style='font-size: 12px;'>Humidity: {city_data['humidity']}%</p>", unsafe_allow_html=True)
                     st.markdown(f"<p style='font-size: 12px;'>Feels Like: {city_data['feels_like_temp']}°C</p>", unsafe_allow_html=True)
 
-            filtered_df = df[df["city"].isin(selected_cities)]
             st.write(filtered_df)
 
             metrics = st.multiselect("Escolha as métricas que deseja ver:", ["temperature_celsius", "humidity", "feels_like_temp"], key="metrics_multiselect")
 
             if metrics:
-                for metric in metrics:
-                    filtered_df[metric] = pd.to_numeric(filtered_df[metric], errors='coerce')
-
-                avg_df = filtered_df.groupby('city')[metrics].mean().reset_index()
+                avg_df = average_by("weather_data", "city", selected_cities, metrics)
                 st.write(avg_df)
 
                
@@ -104,21 +86,27 @@ if not df.empty:
                     fig = px.bar(avg_df, x=avg_df.index, y=metrics, barmode='group', width=1000)
                     st.plotly_chart(fig, use_container_width=True)
 
+            days = st.slider("Histórico (dias):", 1, 90, 7, key="weather_history_days")
+            # Rounded so reruns within the same minute share the cached query
+            end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+            history_df = history_between("weather_data", "city", selected_cities, end - timedelta(days=days), end)
+            if not history_df.empty:
+                fig = px.line(history_df, x="observed_at", y="temperature_celsius", color="city",
+                              title="Temperatura ao longo do tempo")
+                st.plotly_chart(fig, use_container_width=True)
+
     elif selected_dataset == "covid_data":
-        states = df["state"].unique()
+        states = filter_values
         state_names = [get_state_name(state) for state in states]
         selected_states = st.multiselect("Escolha os estados:", state_names, key="state_multiselect")
 
         if selected_states:
 
             selected_state_codes = [state for state in states if get_state_name(state) in selected_states]
-            filtered_df = df[df["state"].isin(selected_state_codes)].drop_duplicates(subset="state", keep="first")
+            filtered_df = fetch_rows("covid_data", "state", selected_state_codes).drop_duplicates(subset="state", keep="first")
             
-            numeric_columns = ["positive_cases", "hospitalized", "deaths"] 
-            for column in numeric_columns:
-                filtered_df[column] = pd.to_numeric(filtered_df[column], errors='coerce')
-
-            filtered_df = filtered_df.fillna(0)
+            # Only the counts are filled; text columns may be categorical
+            filtered_df = filtered_df.fillna({col: 0 for col in numeric_columns("covid_data") if col in filtered_df})
 
             cols = st.columns(len(selected_state_codes))
             for idx, state in enumerate(selected_state_codes):
@@ -134,7 +122,7 @@ if not df.empty:
 
             st.markdown("<hr>", unsafe_allow_html=True)
 
-            metrics = st.multiselect("Escolha as métricas que deseja ver:", df.columns.difference(['state']), key="covid_metrics_multiselect")
+            metrics = st.multiselect("Escolha as métricas que deseja ver:", numeric_columns("covid_data"), key="covid_metrics_multiselect")
 
             if metrics:
                 filtered_df.set_index('state', inplace=True)
@@ -143,11 +131,11 @@ if not df.empty:
                     st.plotly_chart(fig, use_container_width=True)
 
     elif selected_dataset == "exchange_rate_data":
-        base_currencies = df["base_currency"].unique()
+        base_currencies = filter_values
         selected_base_currencies = st.multiselect("Escolha as moedas base:", base_currencies)
         
         if selected_base_currencies:
-            filtered_df = df[df["base_currency"].isin(selected_base_currencies)].drop_duplicates()
+            filtered_df = fetch_rows("exchange_rate_data", "base_currency", selected_base_currencies).drop_duplicates()
             st.write(filtered_df)
 
             selected_currencies_for_chart = st.multiselect("Escolha as moedas base para o gráfico:", selected_base_currencies)
@@ -165,19 +153,24 @@ if not df.empty:
                     st.plotly_chart(fig, use_container_width=True)
 
     elif selected_dataset == "spacex_data":
-        mission_names = df["mission_name"].unique()
+        mission_names = filter_values
         selected_missions = st.multiselect("Escolha as missões:", mission_names)
         
         if selected_missions:
-            filtered_df = df[df["mission_name"].isin(selected_missions)].drop_duplicates()
+            filtered_df = fetch_rows("spacex_data", "mission_name", selected_missions).drop_duplicates()
             st.write(filtered_df)
-            
-            filtered_df['launch_date'] = pd.to_datetime(filtered_df['launch_date'])
-            
+
             fig = px.scatter(filtered_df, x='launch_date', y='mission_name', title='Missões da SpaceX ao longo do tempo', hover_data=['mission_name'])
             fig.update_traces(marker=dict(size=10, opacity=0.8), selector=dict(mode='markers'))
             fig.update_layout(xaxis_title='Data', yaxis_title='Missão')
             
             st.plotly_chart(fig, use_container_width=True)
+
+    else:
+        # Sources without a dedicated view are shown as a filterable table
+        selected_values = st.multiselect("Escolha os valores:", filter_values)
+
+        if selected_values:
+            st.write(fetch_rows(selected_dataset, filter_columns[selected_dataset], selected_values))
 else:
     st.warning("Nenhum dado disponível para exibição.")
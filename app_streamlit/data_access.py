@@ -0,0 +1,117 @@
+import os
+
+import pandas as pd
+import psycopg2
+import streamlit as st
+from psycopg2 import sql
+
+from etl_common.compact import compact
+from etl_common.db import connection, get_load_version
+from etl_common.history import TIME_COLUMN, history_table, latest_query, range_query
+from etl_common.rollups import rollup_for
+
+# Query results are cached per load version, so unchanged data is never fetched twice
+CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "600"))
+CACHE_MAX_ENTRIES = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "256"))
+# How long a load-version lookup is trusted before asking Postgres again
+VERSION_TTL = int(os.getenv("DASHBOARD_VERSION_TTL", "5"))
+
+
+@st.cache_data(ttl=VERSION_TTL, show_spinner=False)
+def load_version(table_name):
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            return get_load_version(cursor, table_name)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_query(kind, table_name, column, values, metrics, date_range, version):
+    # version is unused in the body; it is part of the cache key
+    table = sql.Identifier(table_name)
+    params = None
+    if kind == "distinct":
+        query = sql.SQL("SELECT DISTINCT {column} FROM {table} ORDER BY 1").format(
+            column=sql.Identifier(column), table=table)
+    elif kind == "rows":
+        query = sql.SQL("SELECT * FROM {table} WHERE {column} = ANY(%s)").format(
+            table=table, column=sql.Identifier(column))
+        params = (list(values),)
+    elif kind == "latest":
+        # Most recent snapshot per key, by observation time rather than row order
+        query = sql.SQL("SELECT DISTINCT ON ({column}) * FROM {table} WHERE {column} = ANY(%s) "
+                        "ORDER BY {column}, {time} DESC NULLS LAST").format(
+            column=sql.Identifier(column), table=table, time=sql.Identifier(TIME_COLUMN))
+        params = (list(values),)
+    elif kind in ("history_latest", "history"):
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (history_table(table_name),))
+                if not cursor.fetchone()[0]:
+                    # History is only kept when the transform service runs with POSTGRES_HISTORY
+                    return pd.DataFrame()
+        if kind == "history_latest":
+            query = sql.SQL(latest_query(table_name, column))
+            params = (list(values),)
+        else:
+            query = sql.SQL(range_query(table_name, column))
+            params = (list(values), date_range[0], date_range[1])
+    elif kind == "rollup":
+        # Precomputed per-group aggregates maintained by the transform service
+        query = sql.SQL("SELECT {columns} FROM {rollup} WHERE {column} = ANY(%s) ORDER BY 1").format(
+            columns=sql.SQL(", ").join(sql.Identifier(col) for col in (column, *metrics)),
+            rollup=sql.Identifier(rollup_for(table_name, column, "avg", metrics)), column=sql.Identifier(column))
+        params = (list(values),)
+    elif kind == "average":
+        averages = sql.SQL(", ").join(
+            sql.SQL("AVG({metric}) AS {metric}").format(metric=sql.Identifier(metric))
+            for metric in metrics
+        )
+        query = sql.SQL("SELECT {column}, {averages} FROM {table} WHERE {column} = ANY(%s) GROUP BY {column}").format(
+            column=sql.Identifier(column), averages=averages, table=table)
+        params = (list(values),)
+    else:
+        raise ValueError(f"Unknown query kind: {kind}")
+
+    with connection() as conn:
+        # Cached results are kept compact, so more of them fit in the container's memory
+        return compact(pd.read_sql_query(query.as_string(conn), conn, params=params))
+
+
+def _query(kind, table_name, column, values=(), metrics=(), date_range=None):
+    try:
+        version = load_version(table_name)
+        return _cached_query(kind, table_name, column, tuple(values), tuple(metrics), date_range, version)
+    except psycopg2.Error as e:
+        st.error(f"Erro ao carregar dados de {table_name}: {e}")
+        return pd.DataFrame()
+
+
+def distinct_values(table_name, column):
+    """Distinct values of a column, for populating a filter widget"""
+    df = _query("distinct", table_name, column)
+    return df[column].tolist() if not df.empty else []
+
+
+def fetch_rows(table_name, column, values):
+    """Rows whose column matches one of the selected values"""
+    return _query("rows", table_name, column, values)
+
+
+def latest_by(table_name, column, values):
+    """Latest observed row per key, from the history when it is kept and the snapshot table otherwise"""
+    if history_table(table_name):
+        df = _query("history_latest", table_name, column, values)
+        if not df.empty:
+            return df
+    return _query("latest", table_name, column, values)
+
+
+def history_between(table_name, column, values, start, end):
+    """Snapshots of the keys observed in [start, end), oldest first"""
+    return _query("history", table_name, column, values, date_range=(start, end))
+
+
+def average_by(table_name, column, values, metrics):
+    """Per-group averages of the metrics, read from the rollup table when one covers them"""
+    kind = "rollup" if rollup_for(table_name, column, "avg", metrics) else "average"
+    return _query(kind, table_name, column, values, metrics)
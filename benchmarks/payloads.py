@@ -0,0 +1,119 @@
+import random
+import string
+from datetime import datetime, timedelta, timezone
+
+WEATHER_DESCRIPTIONS = [
+    "clear sky", "few clouds", "scattered clouds", "broken clouds", "overcast clouds",
+    "shower rain", "rain", "thunderstorm", "snow", "mist"
+]
+
+
+def _codes(count, length, rng):
+    """Unique uppercase codes, e.g. synthetic city, state or currency names"""
+    codes = set()
+    while len(codes) < count:
+        codes.add("".join(rng.choices(string.ascii_uppercase, k=length)))
+    return sorted(codes)
+
+
+def weather_payload(records, seed=0):
+    """OpenWeather /data/2.5/weather responses, one per city"""
+    rng = random.Random(seed)
+    return [
+        {
+            "coord": {"lon": round(rng.uniform(-180, 180), 4), "lat": round(rng.uniform(-90, 90), 4)},
+            "weather": [{"id": 800, "main": "Clouds", "description": rng.choice(WEATHER_DESCRIPTIONS), "icon": "04d"}],
+            "base": "stations",
+            "main": {
+                "temp": round(rng.uniform(250, 315), 2),
+                "feels_like": round(rng.uniform(250, 315), 2),
+                "pressure": rng.randint(980, 1040),
+                "humidity": rng.randint(5, 100)
+            },
+            "visibility": 10000,
+            "wind": {"speed": round(rng.uniform(0, 20), 2), "deg": rng.randint(0, 359)},
+            "dt": 1700000000 + i,
+            "sys": {"country": "XX", "sunrise": 1699990000, "sunset": 1700030000},
+            "id": i,
+            "name": f"City {i}",
+            "cod": 200
+        }
+        for i in range(records)
+    ]
+
+
+def covid_payload(records, seed=0):
+    """covidtracking.com /v1/states/{state}/current.json responses"""
+    rng = random.Random(seed)
+    return [
+        {
+            "date": 20210307,
+            "state": f"S{i}",
+            "positive": rng.randint(0, 4_000_000),
+            "negative": rng.randint(0, 40_000_000),
+            "hospitalized": rng.choice([None, rng.randint(0, 100_000)]),
+            "hospitalizedCurrently": rng.randint(0, 10_000),
+            "death": rng.randint(0, 60_000),
+            "totalTestResults": rng.randint(0, 50_000_000),
+            "dataQualityGrade": None
+        }
+        for i in range(records)
+    ]
+
+
+def exchange_rate_payload(records, seed=0, targets=160):
+    """exchangerate-api.com /v4/latest/{base} responses keyed by base currency.
+
+    records is the number of (base, target) rows the transform will produce.
+    """
+    rng = random.Random(seed)
+    bases = max(1, records // targets)
+    count = max(targets, bases)
+    currencies = _codes(count, 3 if count <= 10_000 else 5, rng)
+    rates = {code: rng.uniform(0.01, 1000) for code in currencies[:targets]}
+    return {
+        base: {
+            "provider": "https://www.exchangerate-api.com",
+            "base": base,
+            "date": "2024-01-01",
+            "time_last_updated": 1704067201,
+            "rates": {target: rate / rates.get(base, 1.0) for target, rate in rates.items()}
+        }
+        for base in currencies[:bases]
+    }
+
+
+def spacex_payload(records, seed=0):
+    """SpaceX /v4/launches responses"""
+    rng = random.Random(seed)
+    start = datetime(2006, 3, 24, tzinfo=timezone.utc)
+    rockets = [f"{rng.getrandbits(96):024x}" for _ in range(4)]
+    return [
+        {
+            "fairings": None,
+            "links": {"patch": {"small": None, "large": None}, "webcast": None},
+            "static_fire_date_utc": None,
+            "rocket": rng.choice(rockets),
+            "success": None,
+            "details": None,
+            "crew": [],
+            "payloads": [f"{rng.getrandbits(96):024x}"],
+            "launchpad": "5e9e4502f509094188566f88",
+            "flight_number": i + 1,
+            "name": f"Mission {i}",
+            "date_utc": (start + timedelta(hours=6 * i)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "date_precision": "hour",
+            "upcoming": False,
+            "cores": [{"core": None, "flight": None}],
+            "id": f"{i:024x}"
+        }
+        for i in range(records)
+    ]
+
+
+PAYLOADS = {
+    "weather_data": weather_payload,
+    "covid_data": covid_payload,
+    "exchange_rate_data": exchange_rate_payload,
+    "spacex_data": spacex_payload
+}
@@ -0,0 +1,173 @@
+"""Offline benchmarks for the transforms and sinks of the transform service.
+
+Generates synthetic API payloads, times every transform and sink and writes
+the results as JSON that later runs can be compared against:
+
+    python benchmarks/run_benchmarks.py --sizes 1000,100000 --output baseline.json
+    python benchmarks/run_benchmarks.py --sizes 1000,100000 --compare baseline.json
+
+Files and SQLite go to a temporary directory. PostgreSQL is benchmarked
+against the local server configured by the POSTGRES_* variables (database
+etl_benchmark on localhost by default) and skipped if it is unreachable.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "transform_service")]
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "etl_benchmark")
+
+import pandas as pd  # noqa: E402
+import psycopg2  # noqa: E402
+
+import transform_data  # noqa: E402
+from benchmarks.payloads import PAYLOADS  # noqa: E402
+from etl_common.db import connection, ensure_load_version_table  # noqa: E402
+from etl_common.metrics import PeakRSS  # noqa: E402
+from parquet_dataset import write_parquet_dataset  # noqa: E402
+
+TRANSFORMS = {
+    "weather_data": transform_data.transform_weather_data,
+    "covid_data": transform_data.transform_covid_data,
+    "exchange_rate_data": transform_data.transform_exchange_rate_data,
+    "spacex_data": transform_data.transform_spacex_data
+}
+
+
+def _measure(stage, dataset, records, rows, func, *args, **kwargs):
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    rows = len(result) if rows is None else rows
+    print(f"{stage:<16} {dataset:<20} {records:>10} records {seconds:>9.3f}s "
+          f"{rows / seconds if seconds else 0:>14,.0f} rows/s {rss.peak / 2 ** 20:>9.1f} MiB")
+    return result, {
+        "stage": stage,
+        "dataset": dataset,
+        "records": records,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else None,
+        "peak_rss_bytes": rss.peak
+    }
+
+
+def _postgres_available():
+    try:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                ensure_load_version_table(cursor)
+            conn.commit()
+        return True
+    except psycopg2.Error as e:
+        print(f"Skipping PostgreSQL sinks: {e}")
+        return False
+
+
+def _drop_postgres_table(table_name):
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        conn.commit()
+
+
+def run(sizes, datasets, postgres):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="etl-bench-") as workdir:
+        sqlite_path = os.path.join(workdir, "etl_database.sqlite")
+        for records in sizes:
+            for dataset in datasets:
+                payload = PAYLOADS[dataset](records)
+                df, result = _measure("transform", dataset, records, None, TRANSFORMS[dataset], payload)
+                results.append(result)
+                del payload
+
+                sinks = [
+                    ("files", transform_data.save_data_to_file_formats, (df,),
+                     {"base_path": workdir, "table_name": dataset}),
+                    ("parquet_dataset", write_parquet_dataset, (df, dataset),
+                     {"base_path": os.path.join(workdir, "datasets")}),
+                    ("sqlite", transform_data.load_to_sqlite, (df,),
+                     {"db_path": sqlite_path, "table_name": dataset}),
+                ]
+                if postgres:
+                    for mode in ("copy", "values"):
+                        sinks.append((f"postgres_{mode}", transform_data.load_to_postgres, (df, dataset),
+                                      {"mode": mode}))
+
+                for stage, func, args, kwargs in sinks:
+                    if stage.startswith("postgres_"):
+                        # Every mode loads into an empty table; an upsert over the previous mode's rows would time a no-op
+                        _drop_postgres_table(dataset)
+                    _, result = _measure(stage, dataset, records, len(df), func, *args, **kwargs)
+                    results.append(result)
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """Print throughput relative to a baseline; return the regressions beyond the threshold"""
+    with open(baseline_path) as f:
+        baseline = {
+            (entry["stage"], entry["dataset"], entry["records"]): entry
+            for entry in json.load(f)["results"]
+        }
+
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for entry in results:
+        previous = baseline.get((entry["stage"], entry["dataset"], entry["records"]))
+        if not previous or not previous["rows_per_second"] or not entry["rows_per_second"]:
+            continue
+        ratio = entry["rows_per_second"] / previous["rows_per_second"]
+        flag = ""
+        if ratio < 1 - threshold:
+            flag = "  REGRESSION"
+            regressions.append(entry)
+        print(f"{entry['stage']:<16} {entry['dataset']:<20} {entry['records']:>10} records "
+              f"{ratio:>6.2f}x throughput{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated record counts per dataset (1000 to 10000000)")
+    parser.add_argument("--datasets", default=",".join(PAYLOADS), help="comma-separated datasets to benchmark")
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare throughput against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative throughput drop reported as a regression (default 0.10)")
+    parser.add_argument("--no-postgres", action="store_true", help="skip the PostgreSQL sinks")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    datasets = args.datasets.split(",")
+    postgres = not args.no_postgres and _postgres_available()
+
+    results = run(sizes, datasets, postgres)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "platform": platform.platform(),
+                "results": results
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
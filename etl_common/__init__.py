@@ -0,0 +1 @@
+"""Modules shared by the extract, transform and dashboard services"""
@@ -0,0 +1,95 @@
+"""Compact in-memory representation of the dataset frames.
+
+Repeated strings (cities, states, currency codes, weather descriptions,
+rocket ids) become categoricals, which Arrow and Parquet carry over as
+dictionary-encoded columns. Integers are downcast to the smallest width
+that holds their values. Floats keep 64 bits, since rates and temperatures
+are stored as DOUBLE PRECISION and must round-trip unchanged.
+
+Compaction is for the frames in memory only. Each frame or chunk gets its
+own widths and categories, so stored() restores the registry's types before
+any Parquet write, and every file of a dataset shares one schema.
+"""
+import os
+
+import pandas as pd
+from pandas.api import types
+
+from etl_common.metrics import add_metrics
+from etl_common.schema import column_types
+
+# Set to false to keep the frames as pandas builds them
+COMPACT_FRAMES = os.getenv("COMPACT_FRAMES", "true").lower() in ("1", "true", "yes")
+# A string column becomes categorical when its distinct values are at most this share of its rows
+COMPACT_CATEGORY_RATIO = float(os.getenv("COMPACT_CATEGORY_RATIO", "0.5"))
+
+# Width of the integer columns written to files; undeclared integer columns are stored as int64
+_STORED_INTEGERS = {"INTEGER": "int32", "BIGINT": "int64"}
+
+
+def _compact_column(column):
+    if isinstance(column.dtype, pd.CategoricalDtype) or types.is_bool_dtype(column):
+        return column
+    if types.is_object_dtype(column) or types.is_string_dtype(column):
+        try:
+            distinct = column.nunique(dropna=True)
+        except TypeError:
+            # Unhashable values such as lists stay as they are
+            return column
+        if distinct <= len(column) * COMPACT_CATEGORY_RATIO:
+            return column.astype("category")
+    elif types.is_integer_dtype(column):
+        return pd.to_numeric(column, downcast="integer")
+    return column
+
+
+def compact(df, label=None):
+    """Return df with categorical strings and downcast integers.
+
+    Columns only change where that saves memory. The bytes saved are added
+    to the current stage's metrics, and printed when a label is given.
+    """
+    if not COMPACT_FRAMES or df.empty:
+        return df
+    usage = df.memory_usage(index=True, deep=True)
+    compacted = {}
+    for col in df.columns:
+        original = df[col]
+        column = _compact_column(original)
+        if column is not original and column.memory_usage(index=False, deep=True) < usage[col]:
+            compacted[col] = column
+    if not compacted:
+        return df
+    saved = int(sum(usage[col] - column.memory_usage(index=False, deep=True) for col, column in compacted.items()))
+    # A shallow copy: the caller's frame keeps its columns, the untouched ones are shared
+    df = df.copy(deep=False)
+    for col, column in compacted.items():
+        df[col] = column
+    add_metrics(bytes_saved=saved)
+    if label:
+        before = int(usage.sum())
+        print(f"{label}: compacted {before / 1e6:.1f} MB to {(before - saved) / 1e6:.1f} MB "
+              f"({', '.join(f'{col} {column.dtype}' for col, column in compacted.items())})")
+    return df
+
+
+def stored(df, table_name):
+    """Return df with categoricals back to their values and integers at the registry's declared width"""
+    declared = column_types(table_name, df.columns)
+    restored = {}
+    for col in df.columns:
+        column = df[col]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            restored[col] = column.astype(column.cat.categories.dtype)
+        elif types.is_integer_dtype(column):
+            width = _STORED_INTEGERS.get(declared[col], "int64")
+            # Nullable integers keep their extension dtype (Int32, Int64)
+            width = width.capitalize() if types.is_extension_array_dtype(column) else width
+            if column.dtype != width:
+                restored[col] = column.astype(width)
+    if not restored:
+        return df
+    df = df.copy(deep=False)
+    for col, column in restored.items():
+        df[col] = column
+    return df
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+
+class CrossRates:
+    """Exchange rates between every pair of currencies, triangulated from one base's quotes.
+
+    With r[i] the price of one unit of the base in currency i, converting from
+    currency i to currency j is r[j] / r[i]. The full cross-rate matrix is the
+    rank-one outer product of 1 / r and r, so only the n quotes need to be
+    kept; the dense n x n matrix is built on demand.
+    """
+
+    def __init__(self, currencies, quotes):
+        self.currencies = np.asarray(currencies, dtype=str)
+        self.quotes = np.asarray(quotes, dtype=np.float64)
+        self._index = {currency: i for i, currency in enumerate(self.currencies)}
+
+    @classmethod
+    def from_quotes(cls, rates):
+        """Build from one API payload's {currency: rate} mapping"""
+        return cls(list(rates.keys()), list(rates.values()))
+
+    def __len__(self):
+        return len(self.currencies)
+
+    def __contains__(self, currency):
+        return currency in self._index
+
+    def index(self, currencies):
+        """Positions of one currency code or an array of codes; KeyError for unknown codes"""
+        if isinstance(currencies, str):
+            return self._index[currencies]
+        return np.fromiter((self._index[currency] for currency in currencies), dtype=np.intp)
+
+    def matrix(self, bases=None):
+        """Dense matrix of rates from each base (rows) to every currency (columns)"""
+        quotes = self.quotes if bases is None else self.quotes[self.index(bases)]
+        return np.outer(1.0 / quotes, self.quotes)
+
+    def rate(self, base, target):
+        return self.quotes[self.index(target)] / self.quotes[self.index(base)]
+
+    def convert(self, amounts, base, target):
+        """Convert amounts from base to target; base and target may be codes or arrays of codes"""
+        amounts = np.asarray(amounts, dtype=np.float64)
+        return amounts * self.quotes[self.index(target)] / self.quotes[self.index(base)]
+
+    def to_frame(self, bases=None):
+        """Long (base_currency, target_currency, rate) table for the given bases, all by default"""
+        bases = self.currencies if bases is None else np.asarray(bases, dtype=str)
+        return pd.DataFrame({
+            "base_currency": np.repeat(bases, len(self)),
+            "target_currency": np.tile(self.currencies, len(bases)),
+            "rate": self.matrix(bases).ravel()
+        })
+
+    def save(self, path):
+        """Store the quotes, not the matrix: n floats instead of n * n"""
+        with open(path, "wb") as f:
+            np.savez_compressed(f, currencies=self.currencies, quotes=self.quotes)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["currencies"], data["quotes"])
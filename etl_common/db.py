@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+
+# Connection settings, configured from the environment
+DB_CONFIG = {
+    "dbname": os.getenv("POSTGRES_DB", "etl_database"),
+    "user": os.getenv("POSTGRES_USER", "user"),
+    "password": os.getenv("POSTGRES_PASSWORD", "password"),
+    "host": os.getenv("POSTGRES_HOST", "db"),
+    "port": int(os.getenv("POSTGRES_PORT", "5432")),
+    "options": "-c client_encoding=UTF8",
+}
+POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "5"))
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; callers wait for a free slot instead
+_pool_slots = threading.BoundedSemaphore(POOL_MAX)
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, **DB_CONFIG)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection; an open transaction is rolled back on return"""
+    with _pool_slots:
+        conn = get_pool().getconn()
+        try:
+            yield conn
+        finally:
+            broken = bool(conn.closed)
+            if not broken and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            get_pool().putconn(conn, close=broken)
+
+
+def wait_for_db(retries=5, delay=5):
+    """Wait for the PostgreSQL service to be ready."""
+    while retries > 0:
+        try:
+            with connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            print("PostgreSQL is ready!")
+            return
+        except psycopg2.OperationalError:
+            close_pool()
+            retries -= 1
+            print("Waiting for PostgreSQL to be ready...")
+            time.sleep(delay)
+    raise Exception("PostgreSQL is not available after multiple attempts.")
+
+
+# Load-version stamps, bumped by the transform service whenever a table's data changes
+# and used by readers to key their caches
+LOAD_VERSION_TABLE = "etl_load_version"
+
+
+def ensure_load_version_table(cursor):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {LOAD_VERSION_TABLE} ("
+        "table_name TEXT PRIMARY KEY, version BIGINT NOT NULL, loaded_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    )
+
+
+def bump_load_version(cursor, table_name):
+    cursor.execute(
+        f"INSERT INTO {LOAD_VERSION_TABLE} (table_name, version) VALUES (%s, 1) "
+        f"ON CONFLICT (table_name) DO UPDATE SET version = {LOAD_VERSION_TABLE}.version + 1, loaded_at = now()",
+        (table_name,)
+    )
+
+
+def get_load_version(cursor, table_name):
+    """Return the table's load version, or 0 if it was never stamped"""
+    cursor.execute(f"SELECT to_regclass('{LOAD_VERSION_TABLE}') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute(f"SELECT version FROM {LOAD_VERSION_TABLE} WHERE table_name = %s", (table_name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
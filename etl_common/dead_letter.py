@@ -0,0 +1,50 @@
+"""Dead-letter store for the records the pipeline cannot use.
+
+Rejected records are appended to {DEAD_LETTER_DIR}/{dataset}.jsonl, one
+JSON object per line holding the time, the stage that rejected the record,
+the reason and the record itself. They can then be inspected and replayed
+instead of disappearing behind a log line.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from etl_common.metrics import add_metrics
+
+DEAD_LETTER_DIR = os.getenv("DEAD_LETTER_DIR", "/app/shared_data/dead_letter")
+
+_lock = threading.Lock()
+
+
+def dead_letter_path(table_name, directory=None):
+    return f"{directory or DEAD_LETTER_DIR}/{table_name}.jsonl"
+
+
+def dead_letter(table_name, records, reason, stage, directory=None):
+    """Append rejected records (JSON-compatible values) with the reason; returns how many were stored"""
+    if not records:
+        return 0
+    recorded_at = datetime.now(timezone.utc).isoformat()
+    lines = "".join(
+        json.dumps({"recorded_at": recorded_at, "stage": stage, "reason": reason, "record": record}, default=str) + "\n"
+        for record in records
+    )
+    path = dead_letter_path(table_name, directory)
+    with _lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One append per call, so lines from concurrent writers do not interleave
+        with open(path, "a") as f:
+            f.write(lines)
+    add_metrics(dead_letters=len(records))
+    print(f"{table_name}: {len(records)} records dead-lettered at {stage} ({reason}) to {path}")
+    return len(records)
+
+
+def read_dead_letters(table_name, directory=None):
+    """Every dead-lettered entry of a dataset, oldest first"""
+    try:
+        with open(dead_letter_path(table_name, directory), "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
@@ -0,0 +1,76 @@
+"""Arrow IPC handoff of raw API payloads from the api_service to the transform_service.
+
+With HANDOFF_FORMAT=arrow the extractor writes each payload as an
+uncompressed Arrow IPC (Feather v2) file instead of JSON, falling back to
+JSON only when the payload does not fit one schema. The transform service
+memory-maps it, so reading costs no parsing and the column buffers are
+shared with the page cache instead of being copied onto the heap.
+"""
+import os
+
+import pyarrow as pa
+
+from etl_common.dead_letter import dead_letter
+
+# Raw payloads are kept apart from the transform's outputs, which share their dataset names
+RAW_DATA_PATH = os.getenv("RAW_DATA_PATH", "/app/shared_data/raw")
+
+
+def _records_table(records):
+    # Columns are merged across all records; from_pylist would only take the first record's keys
+    if not records:
+        return pa.table({})
+    return pa.Table.from_batches([pa.RecordBatch.from_struct_array(pa.array(records))])
+
+
+def _payload_table(data):
+    if isinstance(data, dict):
+        # Keyed payloads (the exchange rates) become one row per key with the nested rates
+        # as a list of (target_currency, rate) pairs, which the transform explodes column-wise
+        keys = list(data)
+        values = [value if isinstance(value, dict) else {} for value in data.values()]
+        table = _records_table([{k: v for k, v in value.items() if k != "rates"} for value in values])
+        rates = pa.array(
+            [list((value.get("rates") or {}).items()) for value in values],
+            type=pa.list_(pa.struct([("target_currency", pa.string()), ("rate", pa.float64())]))
+        )
+        if table.num_columns == 0:
+            table = pa.table({"base_currency": keys})
+        else:
+            table = table.add_column(0, "base_currency", pa.array(keys, pa.string()))
+        return table.append_column("rates", rates)
+    # Non-dict records are dropped here (and dead-lettered once written), as the transforms would skip them anyway
+    return _records_table([entry for entry in data if isinstance(entry, dict)])
+
+
+def write_handoff(data, path):
+    """Write a raw JSON payload as an Arrow IPC file; return its size in bytes.
+
+    Raises pyarrow.ArrowException if the payload's types cannot be unified
+    into one schema, in which case callers should fall back to JSON.
+    """
+    table = _payload_table(data)
+    with pa.OSFile(f"{path}.tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    # Renaming keeps readers that still map the previous file on its old inode
+    os.replace(f"{path}.tmp", path)
+    if isinstance(data, list):
+        dead_letter(os.path.basename(path).rsplit(".", 1)[0],
+                    [entry for entry in data if not isinstance(entry, dict)], "not a JSON object", "extract")
+    return os.path.getsize(path)
+
+
+def read_handoff(path):
+    """Memory-map an Arrow IPC handoff file as a table without copying its buffers"""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def raw_input_path(base_path, table_name):
+    """The newer of the dataset's Arrow handoff and raw JSON file"""
+    arrow_path = f"{base_path}/{table_name}.arrow"
+    json_path = f"{base_path}/{table_name}.json"
+    if os.path.exists(arrow_path) and (
+            not os.path.exists(json_path) or os.path.getmtime(arrow_path) >= os.path.getmtime(json_path)):
+        return arrow_path
+    return json_path
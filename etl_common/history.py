@@ -0,0 +1,71 @@
+"""Time-partitioned history of the weather and exchange-rate snapshots.
+
+Every loaded snapshot row is kept in a history table partitioned by month
+on its observation time. The primary key (natural key, observed_at) serves
+latest-per-key lookups. A BRIN index on observed_at serves time-range scans
+and stays tiny because rows arrive in time order.
+"""
+from datetime import date
+
+HISTORY_TABLES = {
+    "weather_data": "weather_history",
+    "exchange_rate_data": "exchange_rate_history"
+}
+TIME_COLUMN = "observed_at"
+
+
+def history_table(table_name):
+    return HISTORY_TABLES.get(table_name)
+
+
+def _partition_bounds(month):
+    following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return month, following
+
+
+def ensure_history_table(cursor, table_name, column_definitions, keys):
+    """Create the partitioned history table of a snapshot table if it does not exist yet"""
+    history = HISTORY_TABLES[table_name]
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {history} ({column_definitions}, "
+        f"PRIMARY KEY ({', '.join(keys)}, {TIME_COLUMN})) PARTITION BY RANGE ({TIME_COLUMN})"
+    )
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {history}_{TIME_COLUMN}_brin ON {history} USING BRIN ({TIME_COLUMN})")
+    return history
+
+
+def ensure_partitions(cursor, table_name, timestamps):
+    """Create the monthly partitions covering a Series of UTC observation times"""
+    history = HISTORY_TABLES[table_name]
+    month_numbers = (timestamps.dt.year * 12 + timestamps.dt.month - 1).dropna().unique()
+    months = sorted(date(int(number) // 12, int(number) % 12 + 1, 1) for number in month_numbers)
+    for month in months:
+        start, end = _partition_bounds(month)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {history}_{start:%Y%m} PARTITION OF {history} "
+            f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+        )
+    return months
+
+
+def latest_query(table_name, key_column):
+    """SQL for the latest row of each key among %s (an array of keys).
+
+    One index probe per key and partition on the (key, observed_at) primary
+    key, however many snapshots the history holds.
+    """
+    history = HISTORY_TABLES[table_name]
+    return (
+        f"SELECT h.* FROM unnest(%s::text[]) AS k({key_column}) "
+        f"CROSS JOIN LATERAL (SELECT * FROM {history} h WHERE h.{key_column} = k.{key_column} "
+        f"ORDER BY h.{TIME_COLUMN} DESC LIMIT 1) h"
+    )
+
+
+def range_query(table_name, key_column):
+    """SQL for the rows of the keys in %s observed between two times (%s inclusive, %s exclusive)"""
+    history = HISTORY_TABLES[table_name]
+    return (
+        f"SELECT * FROM {history} WHERE {key_column} = ANY(%s) "
+        f"AND {TIME_COLUMN} >= %s AND {TIME_COLUMN} < %s ORDER BY {TIME_COLUMN}"
+    )
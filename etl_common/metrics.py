@@ -0,0 +1,230 @@
+import contextvars
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+METRICS_DIR = os.getenv("METRICS_DIR", "/app/shared_data/metrics")
+
+COUNTERS = ("rows", "bytes_read", "bytes_written", "bytes_saved", "dead_letters", "retries", "cache_hits", "revalidated")
+
+_events = []
+_events_lock = threading.Lock()
+_local = threading.local()
+# Label of the run the current context records into (None for a whole-process run). Daemons run one
+# labelled run per scheduled job, possibly concurrently; the Pipeline carries the label to its workers
+_current_run = contextvars.ContextVar("etl_run", default=None)
+_runs_started = {None: time.time()}
+# Last reported stages and runs per service, so every report holds the latest values of all of them
+_reports = {}
+_report_lock = threading.Lock()
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is the process high-water mark (kilobytes on Linux, bytes on macOS)
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+class PeakRSS:
+    """Sample the resident set size in a background thread while a block runs"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def instrument(stage, name, **counts):
+    """Record duration, counters, peak memory and outcome of one extract, transform or sink call.
+
+    Counters can be set on the yielded event or added from deeper calls
+    running in the same thread with add_metrics().
+    """
+    event = {"run": _current_run.get(), "stage": stage, "name": name, **{counter: 0 for counter in COUNTERS}, **counts}
+    _stack().append(event)
+    rss = PeakRSS(interval=0.01).__enter__()
+    start = time.perf_counter()
+    try:
+        yield event
+        event["status"] = "success"
+    except BaseException as e:
+        event["status"] = "failure"
+        event["error"] = str(e)
+        raise
+    finally:
+        event["seconds"] = time.perf_counter() - start
+        rss.__exit__(None, None, None)
+        event["peak_rss_bytes"] = rss.peak
+        _stack().pop()
+        with _events_lock:
+            _events.append(event)
+
+
+def add_metrics(**counts):
+    """Add to the counters of the innermost instrumented call in this thread, if any"""
+    stack = _stack()
+    if stack:
+        for counter, value in counts.items():
+            stack[-1][counter] = stack[-1].get(counter, 0) + value
+
+
+def current_run():
+    return _current_run.get()
+
+
+def _summarize(events):
+    """Aggregate events by (run, stage, name); streamed chunks show up as repeated events"""
+    summary = {}
+    for event in events:
+        entry = summary.setdefault((event["run"], event["stage"], event["name"]), {
+            "run": event["run"], "stage": event["stage"], "name": event["name"], "calls": 0, "failures": 0,
+            "seconds": 0.0, "peak_rss_bytes": 0, **{counter: 0 for counter in COUNTERS}
+        })
+        entry["calls"] += 1
+        entry["failures"] += event["status"] == "failure"
+        entry["seconds"] += event["seconds"]
+        entry["peak_rss_bytes"] = max(entry["peak_rss_bytes"], event["peak_rss_bytes"])
+        for counter in COUNTERS:
+            entry[counter] += event.get(counter, 0)
+    for entry in summary.values():
+        entry["rows_per_second"] = entry["rows"] / entry["seconds"] if entry["seconds"] else None
+    return list(summary.values())
+
+
+def _prometheus_lines(service, summary, runs):
+    def run_labels(entry):
+        return f'service="{service}"' + (f',run="{entry["run"]}"' if entry["run"] is not None else "")
+
+    def labels(entry):
+        return f'{run_labels(entry)},stage="{entry["stage"]}",name="{entry["name"]}"'
+
+    metrics = [
+        ("etl_stage_duration_seconds", "gauge", "Time spent in the stage during the last run", "seconds"),
+        ("etl_stage_rows", "gauge", "Rows handled by the stage during the last run", "rows"),
+        ("etl_stage_bytes_read", "gauge", "Bytes read by the stage during the last run", "bytes_read"),
+        ("etl_stage_bytes_written", "gauge", "Bytes written by the stage during the last run", "bytes_written"),
+        ("etl_stage_bytes_saved", "gauge", "Memory saved by compacting the stage's frames during the last run",
+         "bytes_saved"),
+        ("etl_stage_dead_letters", "gauge", "Records the stage rejected to the dead-letter store during the last run",
+         "dead_letters"),
+        ("etl_stage_retries", "gauge", "Retried requests of the stage during the last run", "retries"),
+        ("etl_stage_cache_hits", "gauge", "Requests served from the HTTP cache during the last run", "cache_hits"),
+        ("etl_stage_revalidated", "gauge", "Cached responses revalidated with a 304 during the last run", "revalidated"),
+        ("etl_stage_failures", "gauge", "Failed calls of the stage during the last run", "failures"),
+        ("etl_stage_peak_rss_bytes", "gauge", "Peak resident memory while the stage ran", "peak_rss_bytes"),
+        ("etl_stage_rows_per_second", "gauge", "Throughput of the stage during the last run", "rows_per_second"),
+        ("etl_stage_last_finished_timestamp_seconds", "gauge", "Unix time the last run of the stage finished",
+         "finished_at"),
+    ]
+    lines = []
+    for metric, metric_type, help_text, field in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for entry in summary:
+            if entry[field] is not None:
+                lines.append(f"{metric}{{{labels(entry)}}} {entry[field]}")
+    lines += [
+        "# HELP etl_run_duration_seconds Wall time of the last run",
+        "# TYPE etl_run_duration_seconds gauge",
+        *(f"etl_run_duration_seconds{{{run_labels(run)}}} {run['run_seconds']}" for run in runs),
+        "# HELP etl_run_last_finished_timestamp_seconds Unix time the last run finished",
+        "# TYPE etl_run_last_finished_timestamp_seconds gauge",
+        *(f"etl_run_last_finished_timestamp_seconds{{{run_labels(run)}}} {run['finished_at']}" for run in runs),
+    ]
+    return lines
+
+
+def _write_atomic(path, content):
+    with open(f"{path}.tmp", "w") as f:
+        f.write(content)
+    os.replace(f"{path}.tmp", path)
+
+
+def write_run_report(service, metrics_dir=None, reset=True):
+    """Write the current run's JSON report and Prometheus textfile metrics to the metrics directory.
+
+    Only the current run's events are taken. Its stages replace their previous
+    values in the service's report, while the stages of other runs keep theirs,
+    so daemons reporting one run at a time never drop another run's gauges.
+    """
+    metrics_dir = metrics_dir or METRICS_DIR
+    run = _current_run.get()
+    with _events_lock:
+        events = [event for event in _events if event["run"] == run]
+        if reset:
+            _events[:] = [event for event in _events if event["run"] != run]
+        finished_at = time.time()
+        run_seconds = finished_at - _runs_started.get(run, _runs_started[None])
+        if reset:
+            _runs_started[run] = finished_at
+        state = _reports.setdefault(service, {"stages": {}, "runs": {}})
+        for entry in _summarize(events):
+            state["stages"][(run, entry["stage"], entry["name"])] = {**entry, "finished_at": finished_at}
+        state["runs"][run] = {"run": run, "run_seconds": run_seconds, "finished_at": finished_at}
+        summary = list(state["stages"].values())
+        runs = list(state["runs"].values())
+
+    report = {
+        "service": service,
+        "run": run,
+        "finished_at": datetime.fromtimestamp(finished_at, timezone.utc).isoformat(),
+        "run_seconds": run_seconds,
+        "runs": runs,
+        "stages": summary,
+        "events": events
+    }
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        with _report_lock:
+            # Concurrent runs of one service write the same files
+            _write_atomic(f"{metrics_dir}/{service}_run_report.json", json.dumps(report, indent=2))
+            _write_atomic(f"{metrics_dir}/{service}.prom",
+                          "\n".join(_prometheus_lines(service, summary, runs)) + "\n")
+        print(f"Run report written to {metrics_dir}/{service}_run_report.json")
+    except OSError as e:
+        print(f"Error writing run report: {e}")
+    return report
+
+
+def reset_run(run=None):
+    """Start a new run, e.g. at the start of each scheduled cycle.
+
+    Events recorded in this context from now on belong to the run, whose
+    label tells concurrent runs of one service apart.
+    """
+    _current_run.set(run)
+    with _events_lock:
+        _events[:] = [event for event in _events if event["run"] != run]
+        _runs_started[run] = time.time()
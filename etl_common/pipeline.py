@@ -0,0 +1,85 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Pipeline:
+    """A DAG of named tasks, each run on a thread pool as soon as the tasks it depends on succeed.
+
+    A task is called with the return values of the tasks it runs after, in
+    that order, followed by its own arguments. Independent chains run side by
+    side, so one slow source does not hold up the others. When a task fails,
+    its dependents are skipped and every other task still runs. run() raises
+    a RuntimeError naming the failed tasks once everything has finished.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._tasks = {}
+
+    def add(self, name, func, *args, after=(), **kwargs):
+        # Dependencies must already be added, so the graph cannot contain a cycle
+        if name in self._tasks:
+            raise ValueError(f"Task {name} is already in the pipeline")
+        unknown = [dependency for dependency in after if dependency not in self._tasks]
+        if unknown:
+            raise ValueError(f"Task {name} runs after unknown tasks: {', '.join(unknown)}")
+        self._tasks[name] = (func, args, kwargs, tuple(after))
+        return name
+
+    def __len__(self):
+        return len(self._tasks)
+
+    @staticmethod
+    def _run_task(name, func, args, kwargs, inputs):
+        start = time.perf_counter()
+        try:
+            value = func(*inputs, *args, **kwargs)
+            return {"task": name, "status": "success", "seconds": time.perf_counter() - start, "error": None,
+                    "value": value}
+        except Exception as e:
+            return {"task": name, "status": "failure", "seconds": time.perf_counter() - start, "error": str(e),
+                    "value": None}
+
+    def run(self):
+        """Run every task and return {name: outcome}, printing one line per task"""
+        start = time.perf_counter()
+        results = {}
+        pending = dict(self._tasks)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Tasks are stored after their dependencies, so one pass settles every task that can start
+                for name, (func, args, kwargs, after) in list(pending.items()):
+                    blocked = [dependency for dependency in after
+                               if dependency in results and results[dependency]["status"] != "success"]
+                    if blocked:
+                        del pending[name]
+                        failed = [dependency for dependency in blocked if results[dependency]["status"] == "failure"]
+                        reason = f"after failed {', '.join(failed)}" if failed else f"after skipped {', '.join(blocked)}"
+                        results[name] = {"task": name, "status": "skipped", "seconds": 0.0, "error": reason,
+                                         "value": None}
+                    elif all(dependency in results for dependency in after):
+                        del pending[name]
+                        inputs = [results[dependency]["value"] for dependency in after]
+                        # Tasks run in the caller's context, so e.g. the metrics run label follows them
+                        running[executor.submit(contextvars.copy_context().run, self._run_task,
+                                                name, func, args, kwargs, inputs)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        elapsed = time.perf_counter() - start
+
+        for name in self._tasks:
+            result = results[name]
+            print(f"  {name:<32} {result['status']:<8} {result['seconds']:.2f}s"
+                  + (f"  {result['error']}" if result["error"] else ""))
+        failures = [name for name in self._tasks if results[name]["status"] == "failure"]
+        succeeded = sum(result["status"] == "success" for result in results.values())
+        print(f"{succeeded}/{len(results)} tasks succeeded in {elapsed:.2f}s "
+              f"(sum of task times {sum(result['seconds'] for result in results.values()):.2f}s)")
+        if failures:
+            raise RuntimeError(f"Tasks failed: {', '.join(failures)}")
+        return results
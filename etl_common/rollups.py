@@ -0,0 +1,193 @@
+"""Rollup tables kept up to date by the transform service and read by the dashboards.
+
+Each rollup aggregates one source table by a group expression. After every
+load only the groups touched by the loaded rows are recomputed, in the same
+transaction, so aggregate views cost O(groups) to read however long the
+history grows. A rollup over a table that keeps only the latest row per key
+cannot be recomputed from it; it accumulates the sums and counts of the
+rows each load inserts or changes instead.
+"""
+from psycopg2.extras import execute_values
+
+from etl_common.history import history_table
+
+ROLLUPS = {
+    "weather_data": {
+        "table": "weather_city_averages",
+        "columns": {
+            "city": "TEXT PRIMARY KEY",
+            "samples": "BIGINT",
+            "temperature_celsius": "DOUBLE PRECISION",
+            "humidity": "DOUBLE PRECISION",
+            "feels_like_temp": "DOUBLE PRECISION",
+            "temperature_celsius_sum": "DOUBLE PRECISION",
+            "humidity_sum": "DOUBLE PRECISION",
+            "feels_like_temp_sum": "DOUBLE PRECISION"
+        },
+        "aggregate": "avg",
+        # weather_data holds one row per city, so every loaded reading is added to running sums and a
+        # count; the first load backfills from weather_history when POSTGRES_HISTORY keeps one
+        "accumulate": ["temperature_celsius", "humidity", "feels_like_temp"],
+        "select": (
+            "city, COUNT(*), AVG(temperature_celsius), AVG(humidity), AVG(feels_like_temp), "
+            "SUM(temperature_celsius), SUM(humidity), SUM(feels_like_temp)"
+        ),
+        # The group expression evaluated over the source column, and that column's type
+        "group": "city",
+        "source_column": ("city", "text"),
+        "filter": "city = ANY(%(groups)s)"
+    },
+    "covid_data": {
+        "table": "covid_state_totals",
+        "columns": {
+            "state": "TEXT PRIMARY KEY",
+            "positive_cases": "BIGINT",
+            "hospitalized": "BIGINT",
+            "deaths": "BIGINT"
+        },
+        "aggregate": "sum",
+        "select": "state, SUM(positive_cases), SUM(hospitalized), SUM(deaths)",
+        "group": "state",
+        "source_column": ("state", "text"),
+        "filter": "state = ANY(%(groups)s)"
+    },
+    "spacex_data": {
+        "table": "spacex_monthly_launches",
+        "columns": {
+            "month": "DATE PRIMARY KEY",
+            "launches": "BIGINT"
+        },
+        "aggregate": "count",
+        "select": "date_trunc('month', launch_date AT TIME ZONE 'UTC')::date, COUNT(*)",
+        "group": "date_trunc('month', launch_date AT TIME ZONE 'UTC')::date",
+        "source_column": ("launch_date", "timestamptz"),
+        # The range lets the launch_date index narrow the scan to the touched months
+        "filter": (
+            "launch_date >= (%(first)s::timestamp AT TIME ZONE 'UTC') "
+            "AND launch_date < ((%(last)s::timestamp + interval '1 month') AT TIME ZONE 'UTC') "
+            "AND date_trunc('month', launch_date AT TIME ZONE 'UTC')::date = ANY(%(groups)s)"
+        ),
+        "index": "launch_date"
+    }
+}
+
+
+def rollup_for(table_name, group_column, aggregate, columns=()):
+    """Name of the rollup holding the aggregate of the columns by group_column, or None"""
+    rollup = ROLLUPS.get(table_name)
+    if rollup and rollup["aggregate"] == aggregate and group_column in rollup["columns"] \
+            and set(columns) <= set(rollup["columns"]):
+        return rollup["table"]
+    return None
+
+
+def _group_key(rollup):
+    return next(iter(rollup["columns"]))
+
+
+def ensure_rollup(cursor, table_name, keyed):
+    """Create the table's rollup if missing; return True if it was just created and needs a backfill"""
+    rollup = ROLLUPS.get(table_name)
+    if rollup is None:
+        return False
+    index_column = rollup.get("index", rollup["source_column"][0])
+    # Without a primary key on the group column, an index keeps the group recomputation cheap
+    if rollup.get("index") or not keyed:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_{index_column}_idx ON {table_name} ({index_column})")
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = %s",
+        (rollup["table"],)
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    if existing >= set(rollup["columns"]):
+        return False
+    if existing:
+        # Rollups created by earlier versions lack columns; they are rebuilt from the source
+        cursor.execute(f"DROP TABLE {rollup['table']}")
+    definitions = ", ".join(f"{col} {col_type}" for col, col_type in rollup["columns"].items())
+    cursor.execute(f"CREATE TABLE {rollup['table']} ({definitions})")
+    return True
+
+
+def backfill_rollup(cursor, table_name):
+    rollup = ROLLUPS[table_name]
+    source = table_name
+    if rollup.get("accumulate") and history_table(table_name):
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (history_table(table_name),))
+        if cursor.fetchone()[0]:
+            # Every kept snapshot, rather than only the latest one per key
+            source = history_table(table_name)
+    cursor.execute(
+        f"INSERT INTO {rollup['table']} SELECT {rollup['select']} FROM {source} "
+        f"WHERE {rollup['group']} IS NOT NULL GROUP BY 1"
+    )
+
+
+def touched_groups(cursor, table_name, df, keys=None):
+    """Groups of the rows in df, plus (by key) the groups the stored versions of those rows belong to"""
+    rollup = ROLLUPS.get(table_name)
+    column, column_type = rollup["source_column"]
+    values = df[column].astype(object).where(df[column].notna(), None).tolist()
+    cursor.execute(
+        f"SELECT DISTINCT {rollup['group']} FROM unnest(%s::{column_type}[]) AS t({column})",
+        (values,)
+    )
+    groups = {row[0] for row in cursor.fetchall()}
+    if keys and len(keys) == 1 and keys[0] != column:
+        # An updated row may move out of its old group, e.g. a rescheduled launch
+        cursor.execute(
+            f"SELECT DISTINCT {rollup['group']} FROM {table_name} WHERE {keys[0]} = ANY(%s)",
+            (df[keys[0]].dropna().tolist(),)
+        )
+        groups.update(row[0] for row in cursor.fetchall())
+    groups.discard(None)
+    return groups
+
+
+def accumulate_rollup(cursor, table_name, df):
+    """Add the sums and counts of the written rows in df to an accumulating rollup"""
+    rollup = ROLLUPS[table_name]
+    metrics = rollup["accumulate"]
+    group = rollup["group"]
+    grouped = df[df[group].notna()].groupby(group, observed=True)[metrics]
+    counts = grouped.size()
+    sums = grouped.sum()
+    if counts.empty:
+        return
+    rows = []
+    for key, count in counts.items():
+        totals = [float(sums.at[key, metric]) for metric in metrics]
+        rows.append((key, int(count), *(total / count for total in totals), *totals))
+    table = rollup["table"]
+    updates = ["samples = r.samples + EXCLUDED.samples"] + [
+        f"{metric}_sum = r.{metric}_sum + EXCLUDED.{metric}_sum" for metric in metrics
+    ] + [
+        f"{metric} = (r.{metric}_sum + EXCLUDED.{metric}_sum) / (r.samples + EXCLUDED.samples)" for metric in metrics
+    ]
+    execute_values(
+        cursor,
+        f"INSERT INTO {table} AS r ({', '.join(rollup['columns'])}) VALUES %s "
+        f"ON CONFLICT ({_group_key(rollup)}) DO UPDATE SET {', '.join(updates)}",
+        rows
+    )
+
+
+def refresh_rollup(cursor, table_name, groups, df=None):
+    """Recompute the rollup rows of the given groups from the source table.
+
+    Accumulating rollups add the written rows in df instead.
+    """
+    rollup = ROLLUPS[table_name]
+    if rollup.get("accumulate"):
+        accumulate_rollup(cursor, table_name, df)
+        return
+    if not groups:
+        return
+    groups = sorted(groups)
+    params = {"groups": groups, "first": groups[0], "last": groups[-1]}
+    cursor.execute(f"DELETE FROM {rollup['table']} WHERE {_group_key(rollup)} = ANY(%(groups)s)", params)
+    cursor.execute(
+        f"INSERT INTO {rollup['table']} SELECT {rollup['select']} FROM {table_name} "
+        f"WHERE {rollup['filter']} GROUP BY 1",
+        params
+    )
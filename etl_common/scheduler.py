@@ -0,0 +1,64 @@
+import heapq
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Scheduler:
+    """Run named jobs on fixed intervals inside one long-lived process.
+
+    A job never overlaps itself: if its previous run is still going when it
+    comes due, that tick is skipped. Missed ticks are not caught up either,
+    the next run is simply one interval later. Exceptions are printed and the
+    job stays scheduled.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._jobs = {}
+        self._queue = []
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def every(self, name, interval, func, run_now=True):
+        self._jobs[name] = (interval, func)
+        heapq.heappush(self._queue, (time.monotonic() + (0 if run_now else interval), name))
+
+    def _run_job(self, name, func):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            print(f"Scheduled job {name} failed: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(name)
+            print(f"Scheduled job {name} finished in {time.perf_counter() - start:.2f}s")
+
+    def stop(self, *_):
+        self._stopped.set()
+
+    def run(self):
+        """Block until SIGTERM/SIGINT or stop(), then wait for the running jobs"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while self._queue and not self._stopped.is_set():
+                due, name = self._queue[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._stopped.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                interval, func = self._jobs[name]
+                with self._lock:
+                    busy = name in self._running
+                    self._running.add(name)
+                if busy:
+                    print(f"Scheduled job {name} is still running, skipping this tick")
+                else:
+                    executor.submit(self._run_job, name, func)
+                heapq.heappush(self._queue, (max(due + interval, time.monotonic()), name))
+        print("Scheduler stopped")
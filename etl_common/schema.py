@@ -0,0 +1,152 @@
+import pandas as pd
+
+# Column types, natural keys and secondary lookup indexes of every dataset, shared by the loaders and the readers
+SCHEMAS = {
+    "weather_data": {
+        "columns": {
+            "city": "TEXT",
+            "temperature_celsius": "DOUBLE PRECISION",
+            "humidity": "INTEGER",
+            "weather": "TEXT",
+            "feels_like_temp": "DOUBLE PRECISION",
+            "latitude": "DOUBLE PRECISION",
+            "longitude": "DOUBLE PRECISION",
+            "observed_at": "TIMESTAMPTZ"
+        },
+        "primary_key": ["city"],
+        "indexes": [["weather"]]
+    },
+    "covid_data": {
+        "columns": {
+            "state": "TEXT",
+            "positive_cases": "BIGINT",
+            "hospitalized": "BIGINT",
+            "deaths": "BIGINT"
+        },
+        "primary_key": ["state"]
+    },
+    "exchange_rate_data": {
+        "columns": {
+            "base_currency": "TEXT",
+            "target_currency": "TEXT",
+            "rate": "DOUBLE PRECISION",
+            "observed_at": "TIMESTAMPTZ"
+        },
+        "primary_key": ["base_currency", "target_currency"],
+        "indexes": [["target_currency"]]
+    },
+    "spacex_data": {
+        "columns": {
+            "mission_id": "TEXT",
+            "mission_name": "TEXT",
+            "launch_date": "TIMESTAMPTZ",
+            "rocket": "TEXT"
+        },
+        "primary_key": ["mission_id"],
+        "indexes": [["launch_date"], ["rocket"]]
+    }
+}
+
+INTEGER_TYPES = {"INTEGER", "BIGINT"}
+FLOAT_TYPES = {"DOUBLE PRECISION", "NUMERIC"}
+
+# information_schema.columns.data_type for each declared type
+_INFORMATION_SCHEMA_TYPES = {
+    "TEXT": "text",
+    "INTEGER": "integer",
+    "BIGINT": "bigint",
+    "DOUBLE PRECISION": "double precision",
+    "NUMERIC": "numeric",
+    "TIMESTAMPTZ": "timestamp with time zone"
+}
+
+_SQLITE_TYPES = {
+    "TEXT": "TEXT",
+    "INTEGER": "INTEGER",
+    "BIGINT": "INTEGER",
+    "DOUBLE PRECISION": "REAL",
+    "NUMERIC": "REAL",
+    "TIMESTAMPTZ": "TEXT"
+}
+
+_NUMBER_PATTERN = r"^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$"
+_TIMESTAMP_PATTERN = r"^\s*[0-9]{4}-[0-9]{2}-[0-9]{2}"
+
+
+def column_types(table_name, columns=None):
+    """Declared type of every column; columns missing from the registry are TEXT"""
+    declared = SCHEMAS.get(table_name, {}).get("columns", {})
+    return {col: declared.get(col, "TEXT") for col in (columns if columns is not None else declared)}
+
+
+def primary_key(table_name):
+    return SCHEMAS.get(table_name, {}).get("primary_key")
+
+
+def indexes(table_name):
+    """Column lists of the secondary indexes declared for lookups and filters"""
+    return SCHEMAS.get(table_name, {}).get("indexes", [])
+
+
+def numeric_columns(table_name):
+    return [col for col, col_type in column_types(table_name).items() if col_type in INTEGER_TYPES | FLOAT_TYPES]
+
+
+def sqlite_types(table_name, columns):
+    return {col: _SQLITE_TYPES[col_type] for col, col_type in column_types(table_name, columns).items()}
+
+
+def conform(df, table_name):
+    """Coerce a DataFrame to the registry's types; values that do not parse become missing"""
+    df = df.copy()
+    for col, col_type in column_types(table_name, df.columns).items():
+        if col_type in INTEGER_TYPES:
+            df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+        elif col_type in FLOAT_TYPES:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+        elif col_type == "TIMESTAMPTZ":
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True)
+    return df
+
+
+def _cast_from_text(col, col_type):
+    """SQL expression converting a legacy TEXT column, mapping unparsable values to NULL"""
+    if col_type in INTEGER_TYPES | FLOAT_TYPES:
+        target = f"{col}::numeric::{col_type.lower()}" if col_type in INTEGER_TYPES else f"{col}::{col_type.lower()}"
+        return f"CASE WHEN {col} ~ '{_NUMBER_PATTERN}' THEN {target} END"
+    if col_type == "TIMESTAMPTZ":
+        return f"CASE WHEN {col} ~ '{_TIMESTAMP_PATTERN}' THEN {col}::timestamptz END"
+    return f"{col}::{col_type.lower()}"
+
+
+def ensure_table(cursor, table_name, columns, primary_key_columns=None):
+    """Create the table with its declared types and evolve an existing one.
+
+    Missing columns are added with their declared type, and columns still
+    stored as TEXT by earlier versions are converted in place. Any other type
+    mismatch is left alone and reported, since it cannot be converted safely.
+    """
+    types = column_types(table_name, columns)
+    column_definitions = ', '.join(f"{col} {col_type}" for col, col_type in types.items())
+    if primary_key_columns:
+        column_definitions += f", PRIMARY KEY ({', '.join(primary_key_columns)})"
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({column_definitions});")
+
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s",
+        (table_name,)
+    )
+    existing = dict(cursor.fetchall())
+    for col, col_type in types.items():
+        if col not in existing:
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} {col_type}")
+        elif existing[col] != _INFORMATION_SCHEMA_TYPES[col_type]:
+            if existing[col] == "text":
+                cursor.execute(
+                    f"ALTER TABLE {table_name} ALTER COLUMN {col} TYPE {col_type} "
+                    f"USING {_cast_from_text(col, col_type)}"
+                )
+                print(f"Converted {table_name}.{col} from TEXT to {col_type}")
+            else:
+                print(f"Keeping {table_name}.{col} as {existing[col]} (declared {col_type})")
@@ -0,0 +1,145 @@
+"""Declarative registry of the data sources.
+
+Each source is named after the table it loads, whose columns, keys and
+indexes are declared in etl_common/schema.py. Its entry says how to fetch
+it, which transform cleans it and which sinks it is written to. The
+extractor, the transform service and the dashboard all iterate this
+registry, so a new source needs an entry here, a schema and a transform
+function, and no changes to the orchestration.
+"""
+import os
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+SOURCES = {
+    "weather_data": {
+        "label": "Dados Meteorológicos",
+        # One request per fan-out key, with "{key}" substituted in the path and the params.
+        # The URLs can be pointed at the local stub server (stub_server.py) for offline runs
+        "url": os.getenv("WEATHER_API_URL", "http://api.openweathermap.org/data/2.5/weather"),
+        "path": "",
+        "params": {"q": "{key}", "appid": os.getenv("WEATHER_API_KEY")},
+        "fan_out": ["London", "New York", "Tokyo", "Paris", "Sydney"],
+        # "list" keeps the payloads in fan-out order, "dict" keys them by fan-out key, "single" is one payload
+        "collect": "list",
+        # Seconds a cached response is reused without contacting the API; older ones are revalidated
+        "cache_ttl": int(os.getenv("WEATHER_CACHE_TTL", "600")),
+        # Refresh interval in daemon mode
+        "interval": int(os.getenv("WEATHER_INTERVAL", "300")),
+        # Name of the function in transform_service/transform_data.py
+        "transform": "transform_weather_data",
+        "sinks": ("files", "parquet_dataset", "sqlite", "postgres"),
+        # Column the dashboard filters on
+        "filter_column": "city"
+    },
+    "covid_data": {
+        "label": "Dados de COVID-19",
+        "url": os.getenv("COVID_API_URL", "https://api.covidtracking.com/v1/states"),
+        "path": "/{key}/current.json",
+        "params": None,
+        "fan_out": ["ca", "ny", "tx", "fl", "wa"],
+        "collect": "list",
+        "cache_ttl": int(os.getenv("COVID_CACHE_TTL", "86400")),
+        "interval": int(os.getenv("COVID_INTERVAL", "86400")),
+        "transform": "transform_covid_data",
+        "sinks": ("files", "parquet_dataset", "sqlite", "postgres"),
+        "filter_column": "state"
+    },
+    "exchange_rate_data": {
+        "label": "Taxas de Câmbio",
+        "url": os.getenv("EXCHANGE_API_URL", "https://api.exchangerate-api.com/v4/latest"),
+        "path": "/{key}",
+        "params": None,
+        # One base is enough: the transform triangulates every other base from its quotes.
+        # List several (e.g. "USD,EUR,GBP") to fetch and store each base's own quotes instead.
+        "fan_out": _split(os.getenv("EXCHANGE_BASES", "USD")),
+        "collect": "dict",
+        "cache_ttl": int(os.getenv("EXCHANGE_CACHE_TTL", "3600")),
+        "interval": int(os.getenv("EXCHANGE_INTERVAL", "3600")),
+        "transform": "transform_exchange_rate_data",
+        "sinks": ("files", "parquet_dataset", "sqlite", "postgres", "cross_rates"),
+        "filter_column": "base_currency"
+    },
+    "spacex_data": {
+        "label": "Lançamentos da SpaceX",
+        "url": os.getenv("SPACEX_API_URL", "https://api.spacexdata.com/v4/launches/query"),
+        "path": "",
+        "params": None,
+        "fan_out": None,
+        # "pages" POSTs a query document per page and streams each page's docs to the raw file
+        "collect": "pages",
+        "page_size": int(os.getenv("SPACEX_PAGE_SIZE", "100")),
+        # Only the fields the transform reads, plus the watermark's flag
+        "select": ["id", "name", "date_utc", "rocket", "upcoming"],
+        "sort": {"date_utc": "asc", "flight_number": "asc"},
+        # Past launches up to the latest one already stored are settled: later runs only ask for
+        # the upcoming launches, those dated from that watermark on and, by key, those stored
+        # while still upcoming (they may have flown since, dated before the watermark), and keep
+        # the settled ones
+        "watermark": "date_utc",
+        "pending": "upcoming",
+        "key": "id",
+        "cache_ttl": int(os.getenv("SPACEX_CACHE_TTL", "3600")),
+        "interval": int(os.getenv("SPACEX_INTERVAL", "86400")),
+        "transform": "transform_spacex_data",
+        "sinks": ("files", "parquet_dataset", "sqlite", "postgres"),
+        "filter_column": "mission_name"
+    }
+}
+
+
+def request_jobs(name):
+    """The (key, url, params) requests of a source, one per fan-out key"""
+    source = SOURCES[name]
+    keys = source["fan_out"] if source["fan_out"] is not None else [name]
+    jobs = []
+    for key in keys:
+        params = source["params"]
+        if params:
+            params = {param: value.replace("{key}", key) if isinstance(value, str) else value
+                      for param, value in params.items()}
+        jobs.append((key, source["url"] + source["path"].replace("{key}", key), params))
+    return jobs
+
+
+def page_query(name, page, watermark=None, pending=()):
+    """The query document asking a paginated source for one page.
+
+    Given a watermark, only the pending records, those from the watermark on
+    and those whose keys are in pending (stored while still pending) are asked for.
+    """
+    source = SOURCES[name]
+    query = {}
+    if watermark is not None:
+        alternatives = [{source["pending"]: True}, {source["watermark"]: {"$gte": watermark}}]
+        if pending:
+            alternatives.append({source["key"]: {"$in": sorted(pending)}})
+        query = {"$or": alternatives}
+    return {
+        "query": query,
+        "options": {"select": source["select"], "sort": source["sort"], "limit": source["page_size"],
+                    "page": page, "pagination": True}
+    }
+
+
+def settled(name, record, watermark):
+    """Whether a stored record lies before the watermark, i.e. is not asked for again by page_query"""
+    source = SOURCES[name]
+    value = record.get(source["watermark"])
+    return not record.get(source["pending"]) and value is not None and value < watermark
+
+
+def collect_payload(name, results):
+    """Assemble one source's {key: payload} fetch results into the raw payload that is handed off.
+
+    Returns None when nothing usable was fetched.
+    """
+    collect = SOURCES[name]["collect"]
+    if collect == "single":
+        return results.get(name)
+    if not results:
+        return None
+    return dict(results) if collect == "dict" else list(results.values())
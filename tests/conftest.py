@@ -0,0 +1,126 @@
+import json
+import os
+import sys
+import threading
+import uuid
+from contextlib import closing
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The services import their own modules by name, as they do inside their containers
+sys.path[:0] = [ROOT, os.path.join(ROOT, "api_service"), os.path.join(ROOT, "transform_service")]
+
+
+def weather_payload(readings, observed_at=1792305005):
+    """A raw weather extract holding one record per {city: temperature in Kelvin}"""
+    return [
+        {"coord": {"lon": 0.0, "lat": 51.5}, "weather": [{"description": "clear sky"}],
+         "main": {"temp": temp, "humidity": 40}, "dt": observed_at, "name": city}
+        for city, temp in readings.items()
+    ]
+
+
+@pytest.fixture
+def shared_data(tmp_path, monkeypatch):
+    """Point every transform_service output (raw inputs, files, manifest, SQLite, Parquet history) into tmp_path.
+
+    PostgreSQL is not available in the tests: its writer and probe are
+    replaced by a fake keeping the rows loaded per table in .loaded.
+    """
+    import parquet_dataset
+    import run_manifest
+    import sqlite_loader
+    import transform_data
+    from etl_common import dead_letter
+
+    paths = SimpleNamespace(
+        root=tmp_path,
+        raw=tmp_path / "raw",
+        manifest=tmp_path / "run_manifest.json",
+        sqlite=tmp_path / "etl_database.sqlite",
+        loaded={}
+    )
+    paths.raw.mkdir()
+    monkeypatch.setattr(transform_data, "RAW_DATA_PATH", str(paths.raw))
+    monkeypatch.setattr(transform_data, "SHARED_DATA_PATH", str(tmp_path))
+    monkeypatch.setattr(transform_data, "CROSS_RATES_PATH", str(tmp_path / "cross_rates.npz"))
+    monkeypatch.setattr(run_manifest, "RUN_MANIFEST_PATH", str(paths.manifest))
+    monkeypatch.setattr(sqlite_loader, "SQLITE_PATH", str(paths.sqlite))
+    monkeypatch.setattr(parquet_dataset, "PARQUET_DATASET_PATH", str(tmp_path / "datasets"))
+    monkeypatch.setattr(dead_letter, "DEAD_LETTER_DIR", str(tmp_path / "dead_letter"))
+
+    def load_to_postgres(df, table_name):
+        paths.loaded.setdefault(table_name, []).append(len(df))
+
+    writers = dict(transform_data.SINK_WRITERS)
+    writers["files"] = lambda df, table_name: transform_data.save_data_to_file_formats(df, str(tmp_path), table_name)
+    writers["postgres"] = load_to_postgres
+    monkeypatch.setattr(transform_data, "SINK_WRITERS", writers)
+    states = dict(transform_data.SINK_STATES)
+    states["postgres"] = lambda table_name: sum(paths.loaded.get(table_name, [])) or None
+    monkeypatch.setattr(transform_data, "SINK_STATES", states)
+
+    def write_raw(table_name, payload):
+        path = paths.raw / f"{table_name}.json"
+        path.write_text(json.dumps(payload))
+        return path
+
+    paths.write_raw = write_raw
+    return paths
+
+
+@pytest.fixture
+def stub_api(tmp_path, monkeypatch):
+    """The bundled stub API server on a free local port, with the HTTP cache in tmp_path.
+
+    Set .handler's fail_first, fail_status and retry_after to inject failures;
+    .handler.requests counts the requests per (method, path).
+    """
+    import http_cache
+    from stub_server import StubHandler
+
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_DIR", str(tmp_path / "http_cache"))
+    handler = type("TestStubHandler", (StubHandler,), {"requests": {}, "requests_lock": threading.Lock()})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield SimpleNamespace(url=f"http://127.0.0.1:{server.server_port}", handler=handler)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """etl_common.db pointed at a fresh schema of the TEST_POSTGRES_DB database, dropped afterwards.
+
+    Skipped unless TEST_POSTGRES_DB names a scratch database reachable with the POSTGRES_* settings.
+    """
+    dbname = os.getenv("TEST_POSTGRES_DB")
+    if not dbname:
+        pytest.skip("TEST_POSTGRES_DB is not set")
+    import psycopg2
+    from etl_common import db
+
+    config = dict(db.DB_CONFIG, dbname=dbname)
+    schema = f"etl_test_{uuid.uuid4().hex[:12]}"
+    with closing(psycopg2.connect(**config)) as conn:
+        conn.autocommit = True
+        conn.cursor().execute(f"CREATE SCHEMA {schema}")
+    db.close_pool()
+    monkeypatch.setattr(db, "DB_CONFIG", dict(config, options=f"{config['options']} -c search_path={schema}"))
+    try:
+        with db.connection() as conn:
+            with conn.cursor() as cursor:
+                db.ensure_load_version_table(cursor)
+            conn.commit()
+        yield db
+    finally:
+        db.close_pool()
+        with closing(psycopg2.connect(**config)) as conn:
+            conn.autocommit = True
+            conn.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
@@ -0,0 +1,31 @@
+import sqlite3
+from contextlib import closing
+
+import transform_data
+from conftest import weather_payload
+
+
+def test_unchanged_input_is_skipped_and_changed_rows_are_loaded(shared_data):
+    shared_data.write_raw("weather_data", weather_payload({"London": 280.0, "Paris": 285.0}))
+    transform_data.process_datasets(["weather_data"])
+    done = set()
+    transform_data.process_datasets(["weather_data"], done)
+    assert shared_data.loaded == {"weather_data": [2]}
+    assert done == {"weather_data"}
+
+    shared_data.write_raw("weather_data", weather_payload({"London": 280.0, "Paris": 290.0}))
+    transform_data.process_datasets(["weather_data"])
+    assert shared_data.loaded == {"weather_data": [2, 1]}
+
+
+def test_dataset_is_reloaded_in_full_when_a_sink_lost_its_rows(shared_data):
+    shared_data.write_raw("weather_data", weather_payload({"London": 280.0, "Paris": 285.0}))
+    transform_data.process_datasets(["weather_data"])
+    with closing(sqlite3.connect(shared_data.sqlite)) as conn:
+        conn.execute("DROP TABLE weather_data")
+
+    transform_data.process_datasets(["weather_data"])
+
+    with closing(sqlite3.connect(shared_data.sqlite)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM weather_data").fetchone()[0] == 2
+    assert shared_data.loaded == {"weather_data": [2, 2]}
@@ -0,0 +1,38 @@
+import pytest
+
+import transform_data
+from conftest import weather_payload
+from run_manifest import load_manifest
+
+
+def test_failed_sink_is_resumed_from_the_checkpoint(shared_data, monkeypatch):
+    shared_data.write_raw("weather_data", weather_payload({"London": 280.0, "Paris": 285.0}))
+
+    def unavailable(df, table_name):
+        raise RuntimeError("PostgreSQL is down")
+
+    load_to_postgres = transform_data.SINK_WRITERS["postgres"]
+    monkeypatch.setitem(transform_data.SINK_WRITERS, "postgres", unavailable)
+    with pytest.raises(RuntimeError, match="postgres:weather_data"):
+        transform_data.process_datasets(["weather_data"])
+
+    manifest = load_manifest()
+    assert "weather_data" not in manifest["datasets"]
+    assert sorted(manifest["checkpoints"]["weather_data"]["completed"]) == \
+        ["files", "parquet_dataset", "sqlite", "transform"]
+
+    # The rerun neither transforms again nor rewrites the sinks that already succeeded
+    written = []
+    monkeypatch.setitem(transform_data.SINK_WRITERS, "postgres", load_to_postgres)
+    for sink in ("files", "parquet_dataset", "sqlite"):
+        monkeypatch.setitem(transform_data.SINK_WRITERS, sink, lambda df, table_name, sink=sink: written.append(sink))
+    monkeypatch.setattr(transform_data, "_transform_dataset", lambda *args: pytest.fail("transformed again"))
+    done = set()
+    transform_data.process_datasets(["weather_data"], done)
+
+    assert written == []
+    assert shared_data.loaded == {"weather_data": [2]}
+    assert done == {"weather_data"}
+    manifest = load_manifest()
+    assert "weather_data" in manifest["datasets"]
+    assert "weather_data" not in manifest["checkpoints"]
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from conftest import weather_payload
+from etl_common.compact import compact, stored
+from streaming import close_file_sinks, open_file_sinks, write_file_chunk
+from transform_data import transform_weather_data
+
+
+def _weather(readings, humidity=40):
+    return transform_weather_data(weather_payload(readings)).assign(humidity=humidity)
+
+
+def test_compact_downcasts_and_stored_restores_the_declared_types():
+    df = _weather({"London": 280.0, "Paris": 285.0, "Rome": 290.0, "Oslo": 275.0})
+    compacted = compact(df)
+    assert str(compacted["humidity"].dtype) == "int8"
+    assert isinstance(compacted["weather"].dtype, pd.CategoricalDtype)
+
+    restored = stored(compacted, "weather_data")
+    assert str(restored["humidity"].dtype) == "int32"
+    assert restored["weather"].tolist() == df["weather"].tolist()
+    pd.testing.assert_series_equal(restored["temperature_celsius"], df["temperature_celsius"])
+
+
+def test_streamed_chunks_of_different_widths_write_one_parquet_file(tmp_path):
+    sinks = open_file_sinks(str(tmp_path), "weather_data")
+    write_file_chunk(sinks, compact(_weather({"London": 280.0, "Paris": 285.0})))
+    write_file_chunk(sinks, compact(_weather({"Tokyo": 295.0}, humidity=1000)))
+    close_file_sinks(sinks)
+
+    df = pd.read_parquet(tmp_path / "weather_data.parquet")
+    assert df["city"].tolist() == ["London", "Paris", "Tokyo"]
+    assert df["humidity"].tolist() == [40, 40, 1000]
+    assert len(pd.read_csv(tmp_path / "weather_data.csv")) == 3
+    assert len(pd.read_json(tmp_path / "weather_data.json")) == 3
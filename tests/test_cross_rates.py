@@ -0,0 +1,22 @@
+import numpy as np
+
+from etl_common.cross_rates import CrossRates
+
+
+def test_cross_rates_are_triangulated_from_one_base():
+    rates = CrossRates.from_quotes({"USD": 1.0, "EUR": 0.5, "GBP": 0.25})
+    assert rates.rate("EUR", "GBP") == 0.5
+    assert rates.rate("GBP", "USD") == 4.0
+    np.testing.assert_allclose(rates.convert([1.0, 2.0], "USD", ["EUR", "GBP"]), [0.5, 0.5])
+
+    frame = rates.to_frame(["EUR"])
+    assert frame["target_currency"].tolist() == ["USD", "EUR", "GBP"]
+    np.testing.assert_allclose(frame["rate"], [2.0, 1.0, 0.5])
+
+
+def test_saved_quotes_load_back(tmp_path):
+    rates = CrossRates.from_quotes({"USD": 1.0, "JPY": 150.0})
+    rates.save(tmp_path / "cross_rates.npz")
+    loaded = CrossRates.load(tmp_path / "cross_rates.npz")
+    assert loaded.currencies.tolist() == ["USD", "JPY"]
+    np.testing.assert_array_equal(loaded.matrix(), rates.matrix())
@@ -0,0 +1,14 @@
+from conftest import weather_payload
+from etl_common.dead_letter import read_dead_letters
+from transform_data import transform_weather_data
+
+
+def test_malformed_records_are_dead_lettered(shared_data):
+    payload = weather_payload({"London": 280.0}) + [{"name": "Nowhere", "coord": {"lon": 0.0, "lat": 0.0}}, "oops"]
+
+    df = transform_weather_data(payload)
+
+    assert df["city"].tolist() == ["London"]
+    entries = read_dead_letters("weather_data")
+    assert [entry["record"] for entry in entries] == payload[1:]
+    assert {(entry["stage"], entry["reason"]) for entry in entries} == {("transform", "missing main or coord section")}
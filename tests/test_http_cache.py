@@ -0,0 +1,63 @@
+import os
+import time
+
+import http_cache
+import http_client
+
+
+def test_stale_entries_are_revalidated_with_a_conditional_request(stub_api):
+    url = f"{stub_api.url}/v4/latest/USD"
+    stats = {}
+    first = http_client.get_json(url, stats=stats, ttl=0)
+    downloaded = stats["bytes_read"]
+    assert http_cache.load(url)["etag"]
+
+    assert http_client.get_json(url, stats=stats, ttl=0) == first
+    assert stats["revalidated"] == 1
+    # The 304 carries no body
+    assert stats["bytes_read"] == downloaded
+    assert stub_api.handler.requests[("GET", "/v4/latest/USD")] == 2
+
+
+def test_fresh_entries_are_answered_without_a_request(stub_api):
+    url = f"{stub_api.url}/v4/latest/USD"
+    stats = {}
+    http_client.get_json(url, stats=stats, ttl=3600)
+    http_client.get_json(url, stats=stats, ttl=3600)
+    assert stats["cache_hits"] == 1
+    assert stub_api.handler.requests[("GET", "/v4/latest/USD")] == 1
+
+
+def test_query_bodies_are_cached_per_body(stub_api):
+    url = f"{stub_api.url}/v4/launches/query"
+    first = http_client.post_json(url, {"options": {"page": 1}}, ttl=3600)
+    second = http_client.post_json(url, {"options": {"page": 2}}, ttl=3600)
+    assert first["page"] == 1 and second["page"] == 2
+    assert http_client.post_json(url, {"options": {"page": 1}}, ttl=3600) == first
+    assert stub_api.handler.requests[("POST", "/v4/launches/query")] == 2
+
+
+def _age(url, params, seconds):
+    path = http_cache._path(http_cache.cache_key(url, params))
+    modified = time.time() - seconds
+    os.utime(path, (modified, modified))
+
+
+def test_prune_removes_expired_then_oldest_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_DIR", str(tmp_path))
+    for page in range(4):
+        http_cache.store("http://api/query", {"page": page}, {"docs": ["x" * 1000]})
+    _age("http://api/query", {"page": 0}, 3600)
+    _age("http://api/query", {"page": 1}, 60)
+    _age("http://api/query", {"page": 2}, 30)
+
+    assert http_cache.prune(max_age=600, max_bytes=10 ** 6) == 1
+    assert http_cache.load("http://api/query", {"page": 0}) is None
+
+    # Entry sizes vary with their timestamps, so the limit is exactly what the two newest take
+    kept = sum(os.path.getsize(http_cache._path(http_cache.cache_key("http://api/query", {"page": page})))
+               for page in (2, 3))
+    assert http_cache.prune(max_age=600, max_bytes=kept) == 1
+    assert http_cache.load("http://api/query", {"page": 1}) is None
+    assert http_cache.load("http://api/query", {"page": 2}) is not None
+    assert http_cache.load("http://api/query", {"page": 3}) is not None
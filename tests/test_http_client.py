@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import http_client
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The delays the client sleeps between attempts, with the jitter at its upper bound"""
+    delays = []
+    monkeypatch.setattr(http_client.time, "sleep", delays.append)
+    monkeypatch.setattr(http_client.random, "uniform", lambda low, high: high)
+    return delays
+
+
+def test_transient_failures_are_retried_with_exponential_backoff(stub_api, sleeps):
+    stub_api.handler.fail_first = 2
+    stats = {}
+    data = http_client.get_json(f"{stub_api.url}/v4/latest/EUR", stats=stats)
+
+    assert data["base"] == "EUR"
+    assert stats["retries"] == 2
+    assert sleeps == [http_client.BACKOFF_BASE, http_client.BACKOFF_BASE * 2]
+    assert stub_api.handler.requests[("GET", "/v4/latest/EUR")] == 3
+
+
+def test_retry_after_is_waited_out_before_the_jitter(stub_api, sleeps):
+    stub_api.handler.fail_first = 1
+    stub_api.handler.fail_status = 429
+    stub_api.handler.retry_after = 3
+    http_client.get_json(f"{stub_api.url}/v4/latest/EUR")
+
+    assert sleeps == [3 + http_client.BACKOFF_BASE]
+
+
+def test_retries_give_up_after_max_retries(stub_api, sleeps):
+    stub_api.handler.fail_first = 100
+    with pytest.raises(requests.HTTPError):
+        http_client.post_json(f"{stub_api.url}/v4/launches/query", {"query": {}})
+
+    assert len(sleeps) == http_client.MAX_RETRIES
+    assert stub_api.handler.requests[("POST", "/v4/launches/query")] == http_client.MAX_RETRIES + 1
+
+
+def test_client_errors_are_not_retried(stub_api, sleeps):
+    with pytest.raises(requests.HTTPError):
+        http_client.get_json(f"{stub_api.url}/no/such/endpoint")
+
+    assert sleeps == []
+
+
+def test_backoff_is_capped_and_retry_after_parsed():
+    assert 0 <= http_client._backoff_delay(20) <= http_client.BACKOFF_CAP
+    response = requests.Response()
+    response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert http_client._retry_after(response) == 0.0
+    response.headers["Retry-After"] = "3600"
+    assert http_client._retry_after(response) == http_client.RETRY_AFTER_CAP
+    assert http_client._retry_after(requests.Response()) is None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake monotonic clock that sleeping advances, recording each sleep"""
+    now = SimpleNamespace(value=0.0, sleeps=[])
+
+    def sleep(seconds):
+        now.sleeps.append(seconds)
+        now.value += seconds
+
+    monkeypatch.setattr(http_client.time, "monotonic", lambda: now.value)
+    monkeypatch.setattr(http_client.time, "sleep", sleep)
+    return now
+
+
+def test_token_bucket_allows_a_burst_then_paces_to_the_rate(clock):
+    bucket = http_client.TokenBucket(rate=2, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+
+    # An idle bucket refills only up to its burst
+    clock.value += 60
+    assert [bucket.acquire() for _ in range(4)] == pytest.approx([0.0, 0.0, 0.0, 0.5])
+
+
+def test_rate_limited_hosts_wait_for_a_token(stub_api, clock, monkeypatch):
+    monkeypatch.setitem(http_client.RATE_LIMITS, "127.0.0.1", (4, 1))
+    monkeypatch.setattr(http_client, "_buckets", {})
+    for currency in ("EUR", "USD", "GBP"):
+        http_client.get_json(f"{stub_api.url}/v4/latest/{currency}")
+
+    assert clock.sleeps == pytest.approx([0.25, 0.25])
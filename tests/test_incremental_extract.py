@@ -0,0 +1,28 @@
+import json
+
+import extract_data
+from etl_common.sources import SOURCES
+from stub_server import LAUNCH_HISTORY, UPCOMING_LAUNCHES, launch
+
+
+def _write_stored(path, records):
+    # The page-by-page layout extract_pages writes
+    path.write_text("[" + ",".join("\n" + json.dumps(record) for record in records) + "\n]\n")
+
+
+def test_launches_stored_as_upcoming_are_fetched_again_once_settled(stub_api, tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_data, "RAW_DATA_PATH", str(tmp_path))
+    monkeypatch.setitem(SOURCES["spacex_data"], "url", f"{stub_api.url}/v4/launches/query")
+    select = SOURCES["spacex_data"]["select"]
+    stored = [{field: launch(index, 0)[field] for field in select} for index in range(LAUNCH_HISTORY)]
+    # Launch 3 was still upcoming at the last run and has flown since, dated before the watermark
+    stored[3]["upcoming"] = True
+    _write_stored(tmp_path / "spacex_data.json", stored)
+
+    extract_data.extract_pages("spacex_data")
+
+    records = list(extract_data._stored_records(str(tmp_path / "spacex_data.json")))
+    by_id = {record["id"]: record for record in records}
+    assert len(records) == len(by_id) == LAUNCH_HISTORY
+    assert by_id[stored[3]["id"]]["upcoming"] is False
+    assert sum(record["upcoming"] for record in records) == UPCOMING_LAUNCHES
@@ -0,0 +1,44 @@
+import json
+
+import pandas as pd
+
+from conftest import weather_payload
+from etl_common.compact import compact
+from parquet_dataset import dataset_rows, write_parquet_dataset
+from transform_data import transform_weather_data
+
+
+def _weather(readings, humidity=40):
+    df = transform_weather_data(weather_payload(readings))
+    return df.assign(humidity=humidity)
+
+
+def test_runs_compacted_differently_read_back_together(tmp_path):
+    first = _weather({"London": 280.0, "Paris": 285.0})
+    # Compaction picks int8 and a categorical here, int16 below
+    write_parquet_dataset(compact(first), "weather_data", base_path=str(tmp_path), run_date="2024-01-01")
+    second = _weather({"Tokyo": 295.0}, humidity=1000)
+    write_parquet_dataset(compact(second), "weather_data", base_path=str(tmp_path), run_date="2024-01-02")
+    write_parquet_dataset(second, "weather_data", base_path=str(tmp_path), run_date="2024-01-02")
+
+    df = pd.read_parquet(tmp_path / "weather_data").sort_values(["run_date", "city"], ignore_index=True)
+    assert df["city"].astype(str).tolist() == ["London", "Paris", "Tokyo", "Tokyo"]
+    assert df["humidity"].tolist() == [40, 40, 1000, 1000]
+    assert str(df["humidity"].dtype) == "int32"
+    assert dataset_rows("weather_data", base_path=str(tmp_path)) == 4
+    with open(tmp_path / "weather_data" / "_manifest.json") as f:
+        partitions = json.load(f)["partitions"]
+    assert sorted(summary["rows"] for summary in partitions.values()) == [2, 2]
+
+
+def test_only_low_cardinality_columns_add_a_partition_level(tmp_path):
+    weather = _weather({"London": 280.0, "Paris": 285.0})
+    write_parquet_dataset(weather, "weather_data", base_path=str(tmp_path), run_date="2024-01-01")
+    rates = pd.DataFrame({"base_currency": ["USD", "USD", "EUR"], "target_currency": ["EUR", "GBP", "USD"],
+                          "rate": [0.9, 0.8, 1.1]})
+    write_parquet_dataset(rates, "exchange_rate_data", base_path=str(tmp_path), run_date="2024-01-01")
+
+    # No city= level: one small file per city and run would not pay off
+    assert all(p.suffix == ".parquet" for p in (tmp_path / "weather_data" / "run_date=2024-01-01").iterdir())
+    assert sorted(p.name for p in (tmp_path / "exchange_rate_data" / "run_date=2024-01-01").iterdir()) \
+        == ["base_currency=EUR", "base_currency=USD"]
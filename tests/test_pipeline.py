@@ -0,0 +1,36 @@
+import pytest
+
+from etl_common.pipeline import Pipeline
+
+
+def test_tasks_receive_their_dependencies_values():
+    pipeline = Pipeline(max_workers=2)
+    pipeline.add("a", lambda: 2)
+    pipeline.add("b", lambda: 3)
+    pipeline.add("sum", lambda a, b, offset: a + b + offset, 10, after=("a", "b"))
+    assert pipeline.run()["sum"]["value"] == 15
+
+
+def test_failure_skips_dependents_and_runs_everything_else():
+    ran = []
+
+    def fail():
+        raise ValueError("broken")
+
+    pipeline = Pipeline(max_workers=2)
+    pipeline.add("transform:a", fail)
+    pipeline.add("sink:a", ran.append, "sink:a", after=("transform:a",))
+    pipeline.add("manifest:a", ran.append, "manifest:a", after=("sink:a",))
+    pipeline.add("transform:b", ran.append, "transform:b")
+    with pytest.raises(RuntimeError, match="transform:a"):
+        pipeline.run()
+    assert ran == ["transform:b"]
+
+
+def test_unknown_and_duplicate_tasks_are_rejected():
+    pipeline = Pipeline()
+    pipeline.add("a", lambda: None)
+    with pytest.raises(ValueError):
+        pipeline.add("a", lambda: None)
+    with pytest.raises(ValueError):
+        pipeline.add("b", lambda: None, after=("missing",))
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+import transform_data
+from conftest import weather_payload
+from etl_common.db import get_load_version
+from transform_data import transform_weather_data
+
+
+def _query(db, sql):
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+
+
+def _covid(hospitalized):
+    return pd.DataFrame({
+        "state": ["NY", "CA", "TX"],
+        "positive_cases": [100, 200, 300],
+        "hospitalized": pd.array(hospitalized, dtype="Int64"),
+        "deaths": [1, 2, 3]
+    })
+
+
+@pytest.mark.parametrize("mode", ["copy", "values", "rows"])
+def test_every_load_mode_writes_the_same_rows(postgres, mode):
+    transform_data.load_to_postgres(_covid([10, None, 30]), "covid_data", mode=mode, batch_size=2,
+                                    write_mode="append")
+    assert _query(postgres, "SELECT state, positive_cases, hospitalized, deaths FROM covid_data ORDER BY state") == [
+        ("CA", 200, None, 2), ("NY", 100, 10, 1), ("TX", 300, 30, 3)
+    ]
+
+
+def test_upsert_merges_on_the_key_and_skips_identical_rows(postgres):
+    transform_data.load_to_postgres(_covid([10, 20, 30]), "covid_data", batch_size=2)
+    transform_data.load_to_postgres(_covid([10, 20, 30]), "covid_data", batch_size=2)
+    with postgres.connection() as conn:
+        with conn.cursor() as cursor:
+            assert get_load_version(cursor, "covid_data") == 1
+
+    transform_data.load_to_postgres(_covid([10, 25, None]), "covid_data", batch_size=2)
+    assert _query(postgres, "SELECT state, hospitalized FROM covid_data ORDER BY state") == [
+        ("CA", 25), ("NY", 10), ("TX", None)
+    ]
+    with postgres.connection() as conn:
+        with conn.cursor() as cursor:
+            assert get_load_version(cursor, "covid_data") == 2
+
+
+def test_staging_leaves_a_table_named_like_the_stage_alone(postgres):
+    with postgres.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE TABLE covid_data_stage (note TEXT)")
+            cursor.execute("INSERT INTO covid_data_stage VALUES ('keep me')")
+        conn.commit()
+
+    # Two loads in one transaction, as the atomic load does; neither leaves its stage behind
+    with postgres.connection() as conn:
+        transform_data.load_to_postgres(_covid([10, 20, 30]), "covid_data", conn=conn)
+        transform_data.load_to_postgres(_covid([10, 25, 30]), "covid_data", conn=conn)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM pg_class WHERE relnamespace = pg_my_temp_schema()")
+            assert cursor.fetchone()[0] == 0
+        conn.commit()
+    assert _query(postgres, "SELECT note FROM covid_data_stage") == [("keep me",)]
+
+
+def _weather(readings, observed_at):
+    return transform_weather_data(weather_payload(readings, observed_at=observed_at))
+
+
+def test_weather_averages_count_only_the_readings_written(postgres):
+    batch = _weather({"London": 280.0, "Paris": 290.0}, observed_at=1792305005)
+    transform_data.load_to_postgres(batch, "weather_data")
+    averages = _query(postgres, "SELECT city, samples, temperature_celsius FROM weather_city_averages ORDER BY city")
+    assert averages == [("London", 1, pytest.approx(6.85)), ("Paris", 1, pytest.approx(16.85))]
+
+    # The same batch again inserts and changes nothing, so no samples are added
+    transform_data.load_to_postgres(batch, "weather_data")
+    assert _query(postgres, "SELECT city, samples, temperature_celsius FROM weather_city_averages ORDER BY city") \
+        == averages
+
+    # A new London reading in a batch that repeats the stored Paris one adds one London sample
+    changed = pd.concat([_weather({"London": 284.0}, observed_at=1792308605), batch[batch["city"] == "Paris"]])
+    transform_data.load_to_postgres(changed, "weather_data")
+    assert _query(postgres, "SELECT city, samples, temperature_celsius FROM weather_city_averages ORDER BY city") == [
+        ("London", 2, pytest.approx(8.85)), ("Paris", 1, pytest.approx(16.85))
+    ]
@@ -0,0 +1,48 @@
+import pandas as pd
+
+from conftest import weather_payload
+from run_manifest import (changed_rows, forget_dataset, input_unchanged, load_manifest, record_dataset,
+                          save_manifest, stale_sinks)
+from transform_data import transform_weather_data
+
+
+def test_changed_rows_keeps_only_new_and_updated_rows(shared_data):
+    manifest = load_manifest()
+    first = transform_weather_data(weather_payload({"London": 280.0, "Paris": 285.0}))
+    changes, hashes = changed_rows(first, "weather_data")
+    assert len(changes) == 2
+    record_dataset(manifest, "weather_data", "digest-1", 100, first, hashes)
+
+    second = transform_weather_data(weather_payload({"London": 280.0, "Paris": 290.0, "Tokyo": 295.0}))
+    changes, _ = changed_rows(second, "weather_data")
+    assert changes["city"].tolist() == ["Paris", "Tokyo"]
+
+
+def test_input_unchanged_matches_the_recorded_digest(shared_data):
+    manifest = load_manifest()
+    df = transform_weather_data(weather_payload({"London": 280.0}))
+    record_dataset(manifest, "weather_data", "digest-1", 100, df, changed_rows(df, "weather_data")[1])
+    save_manifest(manifest)
+
+    manifest = load_manifest()
+    assert input_unchanged(manifest, "weather_data", "digest-1")
+    assert not input_unchanged(manifest, "weather_data", "digest-2")
+    assert not input_unchanged(manifest, "covid_data", "digest-1")
+
+
+def test_stale_sinks_and_forget_dataset(shared_data):
+    manifest = load_manifest()
+    df = transform_weather_data(weather_payload({"London": 280.0}))
+    record_dataset(manifest, "weather_data", "digest-1", 100, df, changed_rows(df, "weather_data")[1],
+                   sinks={"sqlite": 1, "postgres": 1})
+
+    assert stale_sinks(manifest, "weather_data", {"sqlite": 1, "postgres": 1}) == []
+    assert stale_sinks(manifest, "weather_data", {"sqlite": None, "postgres": 1}) == ["sqlite"]
+    assert stale_sinks(manifest, "weather_data", {"sqlite": None}, ignore=("sqlite",)) == []
+    # A sink enabled since the dataset was recorded has never seen its rows
+    assert stale_sinks(manifest, "weather_data", {"sqlite": 1, "files": [1, 2, 3]}) == ["files"]
+
+    forget_dataset(manifest, "weather_data")
+    assert "weather_data" not in manifest["datasets"]
+    changes, _ = changed_rows(df, "weather_data")
+    pd.testing.assert_frame_equal(changes, df)
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from etl_common import scheduler
+from etl_common.scheduler import Scheduler
+
+
+@pytest.fixture(autouse=True)
+def no_signal_handlers(monkeypatch):
+    # run() installs SIGTERM/SIGINT handlers, which would replace pytest's own
+    monkeypatch.setattr(scheduler.signal, "signal", lambda *args: None)
+
+
+def _run_for(jobs, seconds):
+    """Run the scheduler in this thread until `seconds` have passed"""
+    threading.Timer(seconds, jobs.stop).start()
+    jobs.run()
+
+
+def test_jobs_repeat_on_their_interval_and_survive_failures():
+    runs = {"fast": 0, "failing": 0, "later": 0}
+
+    def job(name, fail=False):
+        def run():
+            runs[name] += 1
+            if fail:
+                raise RuntimeError("boom")
+        return run
+
+    jobs = Scheduler()
+    jobs.every("fast", 0.05, job("fast"))
+    jobs.every("failing", 0.05, job("failing", fail=True))
+    jobs.every("later", 10, job("later"), run_now=False)
+    _run_for(jobs, 0.4)
+
+    assert runs["fast"] >= 4
+    assert runs["failing"] >= 4
+    assert runs["later"] == 0
+
+
+def test_a_job_still_running_skips_its_tick_instead_of_overlapping():
+    active, overlaps, runs = [0], [], []
+    lock = threading.Lock()
+
+    def slow():
+        with lock:
+            active[0] += 1
+            overlaps.append(active[0] > 1)
+        runs.append(time.monotonic())
+        time.sleep(0.15)
+        with lock:
+            active[0] -= 1
+
+    jobs = Scheduler(max_workers=4)
+    jobs.every("slow", 0.02, slow)
+    _run_for(jobs, 0.4)
+
+    assert not any(overlaps)
+    # Roughly one run per 0.15s rather than one per 0.02s tick
+    assert 2 <= len(runs) <= 4
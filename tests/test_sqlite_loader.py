@@ -0,0 +1,69 @@
+import sqlite3
+from contextlib import closing
+
+from conftest import weather_payload
+from sqlite_loader import connect, load_sqlite, table_rows
+from transform_data import transform_weather_data
+
+
+def _weather(readings):
+    return transform_weather_data(weather_payload(readings))
+
+
+def _temperatures(db_path):
+    with closing(sqlite3.connect(db_path)) as conn:
+        return conn.execute("SELECT city, temperature_celsius FROM weather_data ORDER BY city, rowid").fetchall()
+
+
+def test_upserts_merge_on_the_natural_key(tmp_path):
+    db_path = str(tmp_path / "etl.sqlite")
+    assert table_rows("weather_data", db_path=db_path) is None
+
+    assert load_sqlite(_weather({"London": 280.0, "Paris": 285.0}), "weather_data", db_path=db_path) == 2
+    load_sqlite(_weather({"Paris": 290.0, "Tokyo": 295.0}), "weather_data", db_path=db_path)
+
+    assert _temperatures(db_path) == [("London", 6.85), ("Paris", 16.85), ("Tokyo", 21.85)]
+    assert table_rows("weather_data", db_path=db_path) == 3
+    assert table_rows("covid_data", db_path=db_path) is None
+
+
+def test_append_keeps_every_row_and_replace_starts_over(tmp_path):
+    db_path = str(tmp_path / "etl.sqlite")
+    for _ in range(2):
+        load_sqlite(_weather({"London": 280.0}), "weather_data", db_path=db_path, mode="append")
+    assert _temperatures(db_path) == [("London", 6.85), ("London", 6.85)]
+
+    replaced = str(tmp_path / "replaced.sqlite")
+    load_sqlite(_weather({"London": 280.0, "Paris": 285.0}), "weather_data", db_path=replaced, mode="replace")
+    load_sqlite(_weather({"Tokyo": 295.0}), "weather_data", db_path=replaced, mode="replace")
+    assert _temperatures(replaced) == [("Tokyo", 21.85)]
+
+
+def test_database_is_in_wal_mode_with_its_indexes(tmp_path):
+    db_path = str(tmp_path / "etl.sqlite")
+    # A batch size below the row count takes the drop-and-rebuild index path
+    load_sqlite(_weather({"London": 280.0, "Paris": 285.0, "Tokyo": 295.0}), "weather_data",
+                db_path=db_path, batch_size=2)
+
+    with closing(connect(db_path)) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        index_names = {row[1] for row in conn.execute("PRAGMA index_list(weather_data)")}
+    assert "weather_data_weather_idx" in index_names
+    # The key is the table's PRIMARY KEY, not a separate unique index
+    assert "weather_data_city_key" not in index_names
+    assert table_rows("weather_data", db_path=db_path) == 3
+
+
+def test_tables_without_a_key_are_deduplicated_before_upserting(tmp_path):
+    db_path = str(tmp_path / "etl.sqlite")
+    # The layout the old to_sql loader left behind: no key, repeated cities
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("CREATE TABLE weather_data (city TEXT, temperature_celsius REAL)")
+        conn.executemany("INSERT INTO weather_data VALUES (?, ?)", [("London", 1.0), ("London", 2.0), ("Paris", 3.0)])
+        conn.commit()
+
+    load_sqlite(_weather({"Paris": 290.0}), "weather_data", db_path=db_path)
+    assert _temperatures(db_path) == [("London", 2.0), ("Paris", 16.85)]
+    with closing(sqlite3.connect(db_path)) as conn:
+        index_names = {row[1] for row in conn.execute("PRAGMA index_list(weather_data)")}
+    assert "weather_data_city_key" in index_names
@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+
+from etl_common.dead_letter import read_dead_letters
+from etl_common.handoff import read_handoff, write_handoff
+from transform_data import transform_covid_data, transform_spacex_data, transform_weather_data
+
+
+# The per-record transforms the vectorized ones replaced, kept as the reference output
+def loop_weather(data):
+    cleaned_data = []
+    for entry in data:
+        try:
+            city = entry.get("name", "Unknown City")
+            temperature = entry["main"].get("temp", 273.15)
+            humidity = entry["main"].get("humidity", 50)
+            weather = entry["weather"][0]["description"] if entry.get("weather") else "Unknown"
+            temperature_celsius = temperature - 273.15
+            feels_like_temp = temperature_celsius - (humidity / 100) * 2
+            cleaned_data.append({
+                "city": city,
+                "temperature_celsius": round(temperature_celsius, 2),
+                "humidity": humidity,
+                "weather": weather,
+                "feels_like_temp": round(feels_like_temp, 2),
+                "latitude": entry["coord"].get("lat", 0.0),
+                "longitude": entry["coord"].get("lon", 0.0)
+            })
+        except Exception:
+            pass
+    return pd.DataFrame(cleaned_data)
+
+
+def loop_covid(data):
+    return pd.DataFrame([{
+        "state": entry.get("state", "Unknown State"),
+        "positive_cases": entry.get("positive", 0),
+        "hospitalized": entry.get("hospitalized", 0),
+        "deaths": entry.get("death", 0)
+    } for entry in data])
+
+
+def loop_spacex(data):
+    return pd.DataFrame([{
+        "mission_name": entry.get("name", "Unknown Mission"),
+        "launch_date": entry.get("date_utc", "Unknown Date"),
+        "rocket": entry.get("rocket", "Unknown Rocket")
+    } for entry in data])
+
+
+WEATHER = [
+    {"name": "London", "main": {"temp": 280.0, "humidity": 40}, "coord": {"lat": 51.5, "lon": -0.1},
+     "weather": [{"description": "clear sky"}], "dt": 1},
+    {"name": None, "main": {"temp": 290.0}, "coord": {"lat": None}, "weather": [], "dt": 1},
+    {"main": {"humidity": 80}, "coord": {}, "weather": [{"description": None}], "dt": 1},
+    {"name": "Nulls", "main": {"temp": None, "humidity": 10}, "coord": {"lat": 1.0, "lon": 1.0}, "dt": 1},
+    {"name": "Nulls", "main": {"temp": 285.0, "humidity": None}, "coord": {"lat": 1.0, "lon": 1.0}, "dt": 1}
+]
+COVID = [
+    {"state": "NY", "positive": 100, "hospitalized": None, "death": 5},
+    {"state": "CA", "positive": 200, "death": None},
+    {"positive": 300, "hospitalized": 30, "death": 3}
+]
+SPACEX = [
+    {"id": "a", "name": "Mission A", "date_utc": "2024-01-01T00:00:00.000Z", "rocket": None},
+    {"id": "b", "date_utc": None}
+]
+
+
+def _values(df):
+    """Frame contents with every missing value as None, so NaN, NA and None compare equal"""
+    return df.astype(object).where(df.notna(), None).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("transform, reference, payload", [
+    (transform_weather_data, loop_weather, WEATHER),
+    (transform_covid_data, loop_covid, COVID),
+    (transform_spacex_data, loop_spacex, SPACEX)
+])
+def test_vectorized_transforms_match_the_per_record_loops(shared_data, transform, reference, payload):
+    expected = _values(reference(payload))
+    pd.testing.assert_frame_equal(_values(transform(payload)[list(expected.columns)]), expected)
+
+
+def test_explicit_nulls_stay_missing(shared_data):
+    covid = transform_covid_data(COVID)
+    assert covid["hospitalized"].isna().tolist() == [True, False, False]
+    assert covid["hospitalized"].tolist()[1:] == [0, 30]
+    assert str(covid["hospitalized"].dtype) == "Int64"
+
+    transform_weather_data(WEATHER)
+    reasons = [entry["reason"] for entry in read_dead_letters("weather_data")]
+    assert reasons == ["null temperature or humidity"] * 2
+
+
+@pytest.mark.parametrize("table_name, transform, payload", [
+    ("weather_data", transform_weather_data, [WEATHER[0], WEATHER[3], WEATHER[4], {
+        "name": None, "main": {"temp": 290.0, "humidity": 50}, "coord": {"lat": None, "lon": 2.0},
+        "weather": [{"description": None}], "dt": 1
+    }]),
+    ("covid_data", transform_covid_data, [COVID[0], {"state": None, "positive": 1, "hospitalized": 2, "death": None}]),
+    ("spacex_data", transform_spacex_data, SPACEX[:1])
+])
+def test_arrow_handoff_matches_the_json_path(shared_data, table_name, transform, payload):
+    # Arrow cannot tell a missing key from a null one, so these payloads only carry nulls per record
+    path = str(shared_data.raw / f"{table_name}.arrow")
+    write_handoff(payload, path)
+    pd.testing.assert_frame_equal(_values(transform(read_handoff(path))), _values(transform(payload)))
@@ -0,0 +1,111 @@
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from etl_common.compact import stored
+from etl_common.metrics import add_metrics
+
+PARQUET_DATASET_PATH = os.getenv("PARQUET_DATASET_PATH", "/app/shared_data/datasets")
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "131072"))
+# A second-level partition column with more distinct values than this is not partitioned on
+PARQUET_MAX_PARTITIONS = int(os.getenv("PARQUET_MAX_PARTITIONS", "1024"))
+
+# Every dataset is partitioned by run date; these add a second level where readers filter on it.
+# Only low-cardinality columns belong here: every run writes at least one file per partition it touches
+PARTITION_COLUMNS = {
+    "exchange_rate_data": ["base_currency"]
+}
+
+
+def _update_manifest(dataset_path, entries):
+    """Add the written files to the per-partition totals in the dataset's _manifest.json"""
+    manifest_path = f"{dataset_path}/_manifest.json"
+    manifest = {"partitions": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    partitions = manifest.setdefault("partitions", {})
+    # Manifests of earlier versions listed every file; they are folded into the totals
+    entries = manifest.pop("files", []) + entries
+    updated_at = datetime.now(timezone.utc).isoformat()
+    for entry in entries:
+        summary = partitions.setdefault(os.path.dirname(entry["path"]),
+                                        {"files": 0, "rows": 0, "row_groups": 0, "bytes": 0})
+        summary["files"] += 1
+        summary["rows"] += entry["rows"]
+        summary["row_groups"] += entry["row_groups"]
+        summary["bytes"] += entry["bytes"]
+        summary["updated_at"] = updated_at
+    manifest["rows"] = sum(summary["rows"] for summary in partitions.values())
+    manifest["updated_at"] = updated_at
+
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def dataset_rows(table_name, base_path=None):
+    """Rows the dataset's _manifest.json accounts for, or None when the dataset has none"""
+    manifest_path = f"{base_path or PARQUET_DATASET_PATH}/{table_name}/_manifest.json"
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f).get("rows")
+
+
+# Append a DataFrame to the dataset's hive-partitioned Parquet history
+def write_parquet_dataset(df, table_name, base_path=None, run_date=None,
+                          compression=None, row_group_size=None):
+    base_path = base_path or PARQUET_DATASET_PATH
+    run_date = run_date or datetime.now(timezone.utc).date().isoformat()
+    compression = compression or PARQUET_COMPRESSION
+    row_group_size = row_group_size or PARQUET_ROW_GROUP_SIZE
+    dataset_path = f"{base_path}/{table_name}"
+
+    table = pa.Table.from_pandas(stored(df, table_name).assign(run_date=run_date), preserve_index=False)
+    partition_columns = ["run_date"] + [
+        col for col in PARTITION_COLUMNS.get(table_name, [])
+        if col in df.columns and df[col].nunique() <= PARQUET_MAX_PARTITIONS
+    ]
+    partitioning = ds.partitioning(
+        pa.schema([table.schema.field(col) for col in partition_columns]),
+        flavor="hive"
+    )
+
+    written = []
+
+    def record_file(written_file):
+        metadata = written_file.metadata
+        written.append({
+            "path": os.path.relpath(written_file.path, dataset_path),
+            "run_date": run_date,
+            "rows": metadata.num_rows,
+            "row_groups": metadata.num_row_groups,
+            "bytes": os.path.getsize(written_file.path)
+        })
+
+    # Unique file names keep every run (and every streamed chunk) append-only
+    ds.write_dataset(
+        table,
+        dataset_path,
+        format="parquet",
+        partitioning=partitioning,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=ds.ParquetFileFormat().make_write_options(
+            compression=compression,
+            write_statistics=True
+        ),
+        max_rows_per_group=row_group_size,
+        max_partitions=PARQUET_MAX_PARTITIONS,
+        file_visitor=record_file
+    )
+    _update_manifest(dataset_path, written)
+    add_metrics(bytes_written=sum(entry["bytes"] for entry in written))
+    print(f"Data successfully appended to Parquet dataset {dataset_path} "
+          f"({len(df)} rows in {len(written)} files, compression={compression})")
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from etl_common.schema import primary_key
+
+RUN_MANIFEST_PATH = os.getenv("RUN_MANIFEST_PATH", "/app/shared_data/run_manifest.json")
+# "false" reprocesses every dataset in full on every run
+CHANGE_DETECTION = os.getenv("CHANGE_DETECTION", "true").lower() in ("1", "true", "yes")
+
+_HASH_CHUNK = 1 << 20
+
+
+def file_digest(path):
+    """SHA-256 of a raw file, read in 1 MiB chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hashes(df):
+    """One 64-bit content hash per row, independent of the index"""
+    return pd.util.hash_pandas_object(df, index=False)
+
+
+def frame_digest(df):
+    return hashlib.sha256(row_hashes(df).values.tobytes()).hexdigest()
+
+
+def _row_keys(df, table_name):
+    keys = primary_key(table_name)
+    if len(keys) == 1:
+        return df[keys[0]].astype(str)
+    return df[keys].astype(str).agg("\x1f".join, axis=1)
+
+
+def _row_hashes_path(table_name, manifest_path):
+    return f"{os.path.dirname(manifest_path)}/row_hashes/{table_name}.parquet"
+
+
+def load_manifest(manifest_path=None):
+    manifest_path = manifest_path or RUN_MANIFEST_PATH
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"datasets": {}}
+
+
+def save_manifest(manifest, manifest_path=None):
+    manifest_path = manifest_path or RUN_MANIFEST_PATH
+    manifest["updated_at"] = datetime.now(timezone.utc).isoformat()
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def input_unchanged(manifest, table_name, digest):
+    entry = manifest["datasets"].get(table_name)
+    return CHANGE_DETECTION and entry is not None and entry["input_sha256"] == digest
+
+
+def stale_sinks(manifest, table_name, states, ignore=()):
+    """Sinks whose probed state differs from the one recorded with the dataset.
+
+    The skip and the row diff assume the sinks still hold what the last
+    recorded run wrote; a dropped, emptied or rewritten sink breaks that.
+    Entries recorded without sink states treat every sink as stale.
+    """
+    recorded = manifest["datasets"].get(table_name, {}).get("sinks", {})
+    return [sink for sink, state in states.items()
+            if sink not in ignore and (sink not in recorded or recorded[sink] != state)]
+
+
+def forget_dataset(manifest, table_name, manifest_path=None):
+    """Drop the dataset's record, row hashes and checkpoint, so its next run loads it in full"""
+    manifest_path = manifest_path or RUN_MANIFEST_PATH
+    manifest["datasets"].pop(table_name, None)
+    path = _row_hashes_path(table_name, manifest_path)
+    if os.path.exists(path):
+        os.remove(path)
+    clear_checkpoint(manifest, table_name, manifest_path)
+
+
+def changed_rows(df, table_name, manifest_path=None):
+    """Return the rows of df that are new or differ from the last recorded run, and their keyed hashes.
+
+    Rows are matched on the table's primary key, so an updated value shows up
+    as a changed row while untouched rows are dropped.
+    """
+    manifest_path = manifest_path or RUN_MANIFEST_PATH
+    hashes = pd.Series(row_hashes(df).values, index=_row_keys(df, table_name).values)
+    if not CHANGE_DETECTION:
+        return df, hashes
+    try:
+        previous = pd.read_parquet(_row_hashes_path(table_name, manifest_path))
+        previous = pd.Series(previous["hash"].values, index=previous["key"].values)
+    except (OSError, ValueError):
+        return df, hashes
+    previous = previous[~previous.index.duplicated(keep="last")]
+    unchanged = previous.reindex(hashes.index).values == hashes.values
+    return df[~unchanged], hashes
+
+
+def record_dataset(manifest, table_name, input_digest, input_bytes, df=None, hashes=None, sinks=None,
+                   manifest_path=None):
+    """Record a dataset that went through every sink successfully, with the state its sinks were left in"""
+    manifest_path = manifest_path or RUN_MANIFEST_PATH
+    entry = {
+        "input_sha256": input_digest,
+        "input_bytes": input_bytes,
+        "recorded_at": datetime.now(timezone.utc).isoformat()
+    }
+    if df is not None:
+        entry["output_sha256"] = frame_digest(df)
+        entry["output_rows"] = len(df)
+    if sinks is not None:
+        entry["sinks"] = sinks
+    path = _row_hashes_path(table_name, manifest_path)
+    if hashes is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        latest = hashes[~hashes.index.duplicated(keep="last")]
+        pd.DataFrame({"key": latest.index, "hash": latest.values}).to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+    elif os.path.exists(path):
+        # Without fresh row hashes the old ones would hide changes from the next run
+        os.remove(path)
+    manifest["datasets"][table_name] = entry
+    clear_checkpoint(manifest, table_name, manifest_path)
+
+
+def _transform_checkpoint_path(table_name, manifest_path):
+    return f"{os.path.dirname(manifest_path)}/checkpoints/{table_name}.parquet"
+
+
+def checkpoint(manifest, table_name, input_digest):
+    """The checkpoint of the dataset's unfinished run over this input, started afresh for a new input.
+
+    Its "completed" list names the stages (transform, then each sink) that
+    already succeeded, so a restarted run only does the rest.
+    """
+    checkpoints = manifest.setdefault("checkpoints", {})
+    entry = checkpoints.get(table_name)
+    if entry is None or entry["input_sha256"] != input_digest:
+        entry = checkpoints[table_name] = {"input_sha256": input_digest, "completed": []}
+    return entry
+
+
+def complete_stage(manifest, table_name, stage, manifest_path=None):
+    """Mark a stage of the dataset's current run as done and persist the manifest right away"""
+    entry = manifest["checkpoints"][table_name]
+    if stage not in entry["completed"]:
+        entry["completed"].append(stage)
+        entry["updated_at"] = datetime.now(timezone.utc).isoformat()
+    save_manifest(manifest, manifest_path)
+
+
+def save_transform_checkpoint(table_name, df, changes, hashes, manifest_path=None):
+    """Keep the transform's output of an unfinished run, so a restart does not transform again"""
+    manifest_path = manifest_path or RUN_MANIFEST_PATH
+    path = _transform_checkpoint_path(table_name, manifest_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.assign(
+        _changed=df.index.isin(changes.index), _row_key=hashes.index.to_numpy(), _row_hash=hashes.to_numpy()
+    ).to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_transform_checkpoint(table_name, manifest_path=None):
+    """The frame, changed rows and row hashes saved by save_transform_checkpoint.
+
+    Raises OSError or ValueError when there is no usable checkpoint.
+    """
+    manifest_path = manifest_path or RUN_MANIFEST_PATH
+    df = pd.read_parquet(_transform_checkpoint_path(table_name, manifest_path))
+    changed = df.pop("_changed").to_numpy(dtype=bool)
+    hashes = pd.Series(df.pop("_row_hash").to_numpy(), index=df.pop("_row_key").to_numpy())
+    return df, df[changed], hashes
+
+
+def clear_checkpoint(manifest, table_name, manifest_path=None):
+    manifest_path = manifest_path or RUN_MANIFEST_PATH
+    manifest.get("checkpoints", {}).pop(table_name, None)
+    path = _transform_checkpoint_path(table_name, manifest_path)
+    if os.path.exists(path):
+        os.remove(path)
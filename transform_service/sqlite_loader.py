@@ -0,0 +1,165 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from etl_common.schema import conform, indexes, primary_key, sqlite_types
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "/app/sqlite_data/etl_database.sqlite")
+# "upsert" merges rows on the table's natural key, "append" adds them, "replace" empties the table first
+SQLITE_WRITE_MODE = os.getenv("SQLITE_WRITE_MODE", "upsert")
+SQLITE_BATCH_SIZE = int(os.getenv("SQLITE_BATCH_SIZE", "50000"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+
+
+def connect(db_path=None):
+    """Open the database in WAL mode, so readers keep reading while a load is in progress.
+
+    synchronous=NORMAL only syncs at checkpoints, which in WAL mode can lose
+    the last transactions on power loss but never corrupts the file.
+    Transactions are managed explicitly (isolation_level=None).
+    """
+    conn = sqlite3.connect(db_path or SQLITE_PATH, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _ensure_table(conn, table_name, columns, keys):
+    types = sqlite_types(table_name, columns)
+    definitions = ", ".join(f"{col} {col_type}" for col, col_type in types.items())
+    if keys:
+        # Without a key (append mode) the table keeps every row ever loaded
+        definitions += f", PRIMARY KEY ({', '.join(keys)})"
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({definitions})")
+
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}
+    for col, col_type in types.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} {col_type}")
+
+    if keys:
+        # Tables written by the old to_sql loader have no key; keep the last row per key, then add one
+        key_list = ", ".join(keys)
+        index_name = f"{table_name}_{'_'.join(keys)}_key"
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+                            "AND (name = ? OR name LIKE 'sqlite_autoindex_%')", (table_name, index_name)).fetchone():
+            conn.execute(f"DELETE FROM {table_name} WHERE rowid NOT IN "
+                         f"(SELECT MAX(rowid) FROM {table_name} GROUP BY {key_list})")
+            conn.execute(f"CREATE UNIQUE INDEX {index_name} ON {table_name} ({key_list})")
+
+
+def _secondary_indexes(table_name, columns):
+    return {
+        f"{table_name}_{'_'.join(index_columns)}_idx": index_columns
+        for index_columns in indexes(table_name) if set(index_columns) <= set(columns)
+    }
+
+
+def _create_indexes(conn, table_name, columns):
+    for name, index_columns in _secondary_indexes(table_name, columns).items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table_name} ({', '.join(index_columns)})")
+
+
+def _drop_indexes(conn, table_name, columns):
+    for name in _secondary_indexes(table_name, columns):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _timestamp_text(column, missing):
+    """UTC timestamps as the text to_sql used to write ("2024-01-01 12:00:00+00:00").
+
+    Formatted by NumPy in one pass, an order of magnitude faster than str() per value.
+    """
+    if column.dt.tz is not None:
+        column = column.dt.tz_convert("UTC").dt.tz_localize(None)
+    values = column.to_numpy("datetime64[us]")
+    fractional = (values[~missing].astype(np.int64) % 1_000_000 != 0).any()
+    text = np.datetime_as_string(values, unit="us" if fractional else "s").tolist()
+    return [None if absent else f"{value[:10]} {value[11:]}+00:00" for value, absent in zip(text, missing)]
+
+
+def _column_values(column):
+    """A column as a list of plain Python values, missing values as None"""
+    missing = column.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return _timestamp_text(column, missing)
+    elif pd.api.types.is_extension_array_dtype(column) and pd.api.types.is_numeric_dtype(column):
+        column = column.astype(object)
+    values = column.tolist()
+    if missing.any():
+        for i in missing.nonzero()[0]:
+            values[i] = None
+    return values
+
+
+def _rows(df):
+    """Rows of plain Python values, built column by column"""
+    return list(zip(*(_column_values(df[col]) for col in df.columns)))
+
+
+def _insert_sql(table_name, columns, keys, mode):
+    placeholders = ", ".join("?" for _ in columns)
+    sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+    if mode == "upsert" and keys:
+        updates = [col for col in columns if col not in keys]
+        action = f"DO UPDATE SET {', '.join(f'{col} = excluded.{col}' for col in updates)}" if updates else "DO NOTHING"
+        sql += f" ON CONFLICT ({', '.join(keys)}) {action}"
+    elif keys:
+        # Appending a key that is already there replaces that row
+        sql = sql.replace("INSERT INTO", "INSERT OR REPLACE INTO", 1)
+    return sql
+
+
+def load_sqlite(df, table_name, db_path=None, mode=None, batch_size=None):
+    """Write a DataFrame to SQLite in batched executemany calls inside one transaction.
+
+    Returns the number of rows written. Readers see either the previous or
+    the new contents of the table, never a partial load.
+    """
+    mode = mode or SQLITE_WRITE_MODE
+    batch_size = batch_size or SQLITE_BATCH_SIZE
+    keys = primary_key(table_name)
+    keys = keys if keys and set(keys) <= set(df.columns) else None
+    df = conform(df, table_name)
+    columns = list(df.columns)
+    sql = _insert_sql(table_name, columns, keys, mode)
+
+    conn = connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _ensure_table(conn, table_name, columns, keys if mode != "append" else None)
+            if mode == "replace":
+                conn.execute(f"DELETE FROM {table_name}")
+            # Building the secondary indexes once after a large load beats updating them row by row
+            bulk = len(df) >= batch_size
+            if bulk:
+                _drop_indexes(conn, table_name, columns)
+            for start in range(0, len(df), batch_size):
+                conn.executemany(sql, _rows(df.iloc[start:start + batch_size]))
+            _create_indexes(conn, table_name, columns)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return len(df)
+
+
+def table_rows(table_name, db_path=None):
+    """Number of rows in the table, or None when the database or the table does not exist"""
+    db_path = db_path or SQLITE_PATH
+    if not os.path.exists(db_path):
+        return None
+    conn = connect(db_path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone():
+            return None
+        return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    finally:
+        conn.close()
@@ -0,0 +1,116 @@
+import json
+import os
+
+import ijson
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from etl_common.compact import stored
+from etl_common.handoff import read_handoff
+
+
+def _first_byte(f):
+    """Peek at the first non-whitespace byte of a binary file"""
+    while True:
+        byte = f.read(1)
+        if not byte or not byte.isspace():
+            f.seek(f.tell() - len(byte))
+            return byte
+
+
+def _iter_items(path):
+    if path.endswith(".ndjson"):
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(path, "rb") as f:
+        if _first_byte(f) == b"{":
+            # Keyed payloads such as the exchange rates are streamed as (key, value) pairs
+            yield from ijson.kvitems(f, "", use_float=True)
+        else:
+            yield from ijson.items(f, "item", use_float=True)
+
+
+def iter_json_chunks(path, chunk_size):
+    """Parse a raw JSON array, JSON object or NDJSON file incrementally into chunks.
+
+    Arrays and NDJSON files yield lists of records; objects yield dicts holding
+    at most chunk_size keys, so every chunk has the shape the transforms expect.
+    """
+    chunk = []
+    keyed = False
+    for item in _iter_items(path):
+        keyed = isinstance(item, tuple)
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield dict(chunk) if keyed else chunk
+            chunk = []
+    if chunk:
+        yield dict(chunk) if keyed else chunk
+
+
+def iter_raw_chunks(path, chunk_size):
+    """Chunk a raw input: Arrow handoff files are sliced without copying, JSON is parsed incrementally"""
+    if path.endswith(".arrow"):
+        table = read_handoff(path)
+        for offset in range(0, len(table), chunk_size):
+            yield table.slice(offset, chunk_size)
+        return
+    yield from iter_json_chunks(path, chunk_size)
+
+
+# Chunked CSV, Parquet and JSON writers. Output goes to temporary files that are
+# renamed into place on close, so readers never see a partially written file.
+def open_file_sinks(base_path, table_name):
+    return {
+        "base_path": base_path,
+        "table_name": table_name,
+        "csv": open(f"{base_path}/{table_name}.csv.tmp", "w", newline=""),
+        "json": open(f"{base_path}/{table_name}.json.tmp", "w"),
+        "parquet": None,
+        "rows": 0,
+    }
+
+
+def write_file_chunk(sinks, df):
+    if df.empty:
+        return
+    df.to_csv(sinks["csv"], index=False, header=sinks["rows"] == 0)
+
+    # Append the chunk's records to one JSON array, as df.to_json(orient="records") would
+    records = df.to_json(orient="records")[1:-1]
+    if records:
+        sinks["json"].write(("[" if sinks["rows"] == 0 else ",") + records)
+
+    # Every chunk is compacted on its own; the file takes the registry's types
+    df = stored(df, sinks["table_name"])
+    if sinks["parquet"] is None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        path = f"{sinks['base_path']}/{sinks['table_name']}.parquet.tmp"
+        sinks["parquet"] = pq.ParquetWriter(path, table.schema)
+    else:
+        table = pa.Table.from_pandas(df, schema=sinks["parquet"].schema, preserve_index=False)
+    sinks["parquet"].write_table(table)
+
+    sinks["rows"] += len(df)
+
+
+def close_file_sinks(sinks, commit=True):
+    sinks["json"].write("[" if sinks["rows"] == 0 else "")
+    sinks["json"].write("]")
+    sinks["csv"].close()
+    sinks["json"].close()
+    if sinks["parquet"] is not None:
+        sinks["parquet"].close()
+
+    prefix = f"{sinks['base_path']}/{sinks['table_name']}"
+    for extension in ("csv", "json", "parquet"):
+        if not os.path.exists(f"{prefix}.{extension}.tmp"):
+            continue
+        if commit:
+            os.replace(f"{prefix}.{extension}.tmp", f"{prefix}.{extension}")
+        else:
+            os.remove(f"{prefix}.{extension}.tmp")
@@ -1,207 +1,943 @@
+import numpy as np
 import pandas as pd
+import io
 import json
+import os
 import psycopg2
+import psycopg2.extras
+import pyarrow as pa
+import pyarrow.compute as pc
 import sqlite3
+import threading
 import time
+import uuid
 
+from etl_common.cross_rates import CrossRates
+from etl_common.compact import compact, stored
+from etl_common.dead_letter import dead_letter
+from etl_common.db import bump_load_version, connection, ensure_load_version_table, get_load_version, wait_for_db
+from etl_common.handoff import RAW_DATA_PATH, raw_input_path, read_handoff
+from etl_common.metrics import add_metrics, instrument, reset_run, write_run_report
+from etl_common.pipeline import Pipeline
+from etl_common.history import TIME_COLUMN, ensure_history_table, ensure_partitions, history_table
+from etl_common.rollups import ROLLUPS, backfill_rollup, ensure_rollup, refresh_rollup, touched_groups
+from etl_common.schema import column_types, conform, ensure_table, primary_key
+from parquet_dataset import dataset_rows, write_parquet_dataset
+from etl_common.scheduler import Scheduler
+from etl_common.sources import SOURCES
+from run_manifest import (CHANGE_DETECTION, changed_rows, checkpoint, complete_stage, file_digest, forget_dataset,
+                          input_unchanged, load_manifest, load_transform_checkpoint, record_dataset, save_manifest,
+                          save_transform_checkpoint, stale_sinks)
+from sqlite_loader import SQLITE_WRITE_MODE, load_sqlite, table_rows
+from streaming import close_file_sinks, iter_raw_chunks, open_file_sinks, write_file_chunk
+
+SHARED_DATA_PATH = "/app/shared_data"
+# "once" processes every dataset and exits, "daemon" keeps running and processes each dataset when its extract lands
+RUN_MODE = os.getenv("RUN_MODE", "once")
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "2"))
+# Seconds before the daemon retries a dataset whose processing failed
+RETRY_INTERVAL = float(os.getenv("RETRY_INTERVAL", "60"))
+# "batch" loads each raw file in full, "streaming" parses it incrementally into fixed-size chunks
+TRANSFORM_MODE = os.getenv("TRANSFORM_MODE", "batch")
+TRANSFORM_CHUNK_SIZE = int(os.getenv("TRANSFORM_CHUNK_SIZE", "10000"))
+# "flat" overwrites one CSV/Parquet/JSON file per dataset, "dataset" appends to the
+# partitioned Parquet history, "both" does both
+FILE_OUTPUT_MODE = os.getenv("FILE_OUTPUT_MODE", "both")
+# Threads running the transform and sink tasks; the sink writes are I/O bound, so a small pool is enough
+SINK_WORKERS = int(os.getenv("SINK_WORKERS", "4"))
+
+# Bases expanded from a single-base exchange-rate fetch ("all" for every quoted currency)
+EXCHANGE_CROSS_BASES = os.getenv("EXCHANGE_CROSS_BASES", "USD,EUR,GBP")
+# Where the compact cross-rate quotes are stored; empty to skip
+CROSS_RATES_PATH = os.getenv("CROSS_RATES_PATH", "/app/shared_data/cross_rates.npz")
+
+# "copy" streams batches through COPY FROM STDIN, "values" uses batched execute_values,
+# "rows" keeps the original one INSERT per row
+POSTGRES_LOAD_MODE = os.getenv("POSTGRES_LOAD_MODE", "copy")
+POSTGRES_BATCH_SIZE = int(os.getenv("POSTGRES_BATCH_SIZE", "50000"))
+# "append" adds every run's rows, "upsert" merges each batch on the table's natural key
+POSTGRES_WRITE_MODE = os.getenv("POSTGRES_WRITE_MODE", "upsert")
+# Also keep every weather and exchange-rate snapshot in time-partitioned history tables
+POSTGRES_HISTORY = os.getenv("POSTGRES_HISTORY", "false").lower() in ("1", "true", "yes")
+# Load all datasets in one transaction so readers never see a partially refreshed set
+POSTGRES_ATOMIC_LOAD = os.getenv("POSTGRES_ATOMIC_LOAD", "false").lower() in ("1", "true", "yes")
+
+
+def _records(data, *sections):
+    """Split the records that are dicts carrying every nested section as a dict from the rejected ones"""
+    records, rejected = [], []
+    for entry in data:
+        valid = isinstance(entry, dict) and all(isinstance(entry.get(section), dict) for section in sections)
+        (records if valid else rejected).append(entry)
+    return records, rejected
+
+
+def _null_fields(data, fields):
+    """Split off the records in which one of the dotted fields is present but null"""
+    if isinstance(data, pa.Table):
+        null = pa.array([False] * len(data))
+        for field in fields:
+            section, key = field.split(".")
+            column = data[section] if section in data.column_names else None
+            if column is not None and pa.types.is_struct(column.type) and column.type.get_field_index(key) >= 0:
+                null = pc.or_(null, pc.and_(column.is_valid(), pc.is_null(pc.struct_field(column, key))))
+        return data.filter(pc.invert(null)), data.filter(null).to_pylist()
+    kept, rejected = [], []
+    for entry in data:
+        null = False
+        for field in fields:
+            section, key = field.split(".")
+            nested = entry.get(section) if isinstance(entry, dict) else None
+            null = null or (isinstance(nested, dict) and key in nested and nested[key] is None)
+        (rejected if null else kept).append(entry)
+    return kept, rejected
+
+
+def _first_item_field(column, key, default):
+    """Vectorized equivalent of entry[0][key] over a column of lists of dicts (default when empty)"""
+    items = column.explode()
+    first = items[~items.index.duplicated()].dropna()
+    values = pd.DataFrame(first.tolist(), columns=[key], index=first.index)[key]
+    # Only the empty lists get the default; a null key stays missing
+    return values.reindex(column.index, fill_value=default)
+
+
+def _absent_keys(records, fields):
+    """Per dotted field, a mask of the records without that key, which the defaults fill"""
+    absent = {}
+    for field in fields:
+        section, _, key = field.partition(".")
+        present = (key in entry[section] for entry in records) if key else (section in entry for entry in records)
+        absent[field] = ~np.fromiter(present, dtype=bool, count=len(records))
+    return absent
+
+
+def _normalize(records, fields):
+    """Flatten only the requested dotted fields into columns named as json_normalize would.
+
+    Projecting the few fields the transforms use is much cheaper than
+    pd.json_normalize, which flattens every nested key of every record.
+    Returns the frame and the _absent_keys masks of the fields.
+    """
+    sections = list(dict.fromkeys(field.split(".")[0] for field in fields))
+    df = pd.DataFrame.from_records(records, columns=sections)
+    columns = {}
+    for section in sections:
+        nested = [field.split(".", 1)[1] for field in fields if field.startswith(f"{section}.")]
+        if not nested:
+            columns[section] = df[section]
+            continue
+        expanded = pd.DataFrame(df[section].tolist(), columns=nested, index=df.index)
+        for key in nested:
+            columns[f"{section}.{key}"] = expanded[key]
+    return pd.DataFrame(columns, index=df.index), _absent_keys(records, fields)
 
-def wait_for_db():
-    """Wait for the PostgreSQL service to be ready."""
-    retries = 5
-    while retries > 0:
-        try:
-            conn = psycopg2.connect(
-                dbname="etl_database",
-                user="user",
-                password="password",
-                host="db",
-                port=5432
-            )
-            conn.close()
-            print("PostgreSQL is ready!")
-            return
-        except psycopg2.OperationalError:
-            retries -= 1
-            print("Waiting for PostgreSQL to be ready...")
-            time.sleep(5)
-    raise Exception("PostgreSQL is not available after multiple attempts.")
+
+def _arrow_normalize(table, fields, sections=()):
+    """Arrow counterpart of _records and _normalize for a memory-mapped handoff table.
+
+    Rows whose required sections are null are split off and returned as
+    records, nested structs are flattened into the same dotted column names
+    and only the requested fields ({field: arrow type}) are converted to
+    pandas. Fields missing from the handoff, or null throughout it, get their
+    declared type, so they convert to the same dtype as on the JSON path.
+    Also returns, like _normalize, the masks of the records without each
+    field. Arrow cannot tell a missing key from a null one, so only fields
+    absent from the whole handoff count as missing.
+    """
+    mask = None
+    for section in sections:
+        valid = table[section].is_valid() if section in table.column_names else pa.array([False] * len(table))
+        mask = valid if mask is None else pc.and_(mask, valid)
+    rejected = []
+    if mask is not None:
+        rejected = table.filter(pc.invert(mask)).to_pylist()
+        table = table.filter(mask)
+    while any(pa.types.is_struct(field.type) for field in table.schema):
+        table = table.flatten()
+    columns = {
+        field: table[field] if field in table.column_names and not pa.types.is_null(table[field].type)
+        else pa.nulls(len(table), field_type)
+        for field, field_type in fields.items()
+    }
+    absent = {field: np.full(len(table), field not in table.column_names) for field in fields}
+    return pa.table(columns).to_pandas(split_blocks=True), rejected, absent
+
+
+def _observed_at(seconds):
+    """Unix timestamps (seconds) as UTC datetimes; missing or malformed values become NaT"""
+    return pd.to_datetime(pd.to_numeric(seconds, errors="coerce"), unit="s", utc=True)
+
+
+def _column(df, name, default, absent=None):
+    """Vectorized equivalent of entry.get(name, default) over a normalized frame.
+
+    The default fills the records marked in absent, i.e. those without the
+    key; explicit nulls stay missing values.
+    """
+    if name not in df:
+        return pd.Series([default] * len(df), index=df.index)
+    column = df[name]
+    if absent is not None and absent.any():
+        column = column.mask(absent, default)
+    # Missing values force integer columns to float (or object); restore them, as nullable integers if nulls remain
+    if isinstance(default, int) and not pd.api.types.is_integer_dtype(column):
+        numeric = pd.to_numeric(column, errors="coerce")
+        if numeric.notna().sum() == column.notna().sum() and (numeric.dropna() % 1 == 0).all():
+            column = numeric.astype("int64" if numeric.notna().all() else "Int64")
+    return column
 
 
 # Clean and transform weather data
 def transform_weather_data(data):
-    cleaned_data = []
-    for entry in data:
-        try:
-            city = entry.get("name", "Unknown City")
-            temperature = entry["main"].get("temp", 273.15)
-            humidity = entry["main"].get("humidity", 50)
-            weather = entry["weather"][0]["description"] if entry.get("weather") else "Unknown"
-            temperature_celsius = temperature - 273.15
-            feels_like_temp = temperature_celsius - (humidity / 100) * 2
-            lat = entry["coord"].get("lat", 0.0)
-            lon = entry["coord"].get("lon", 0.0)
-
-            cleaned_data.append({
-                "city": city,
-                "temperature_celsius": round(temperature_celsius, 2),
-                "humidity": humidity,
-                "weather": weather,
-                "feels_like_temp": round(feels_like_temp, 2),
-                "latitude": lat,
-                "longitude": lon
-            })
-        except Exception as e:
-            print(f"Error cleaning weather data: {e}")
-    return pd.DataFrame(cleaned_data)
+    fields = {"name": pa.string(), "main.temp": pa.float64(), "main.humidity": pa.int64(),
+              "coord.lat": pa.float64(), "coord.lon": pa.float64(),
+              "weather": pa.list_(pa.struct([("description", pa.string())])), "dt": pa.int64()}
+    # A reading that is present but null cannot be converted, so the record is rejected
+    readings = ("main.temp", "main.humidity")
+    if isinstance(data, pa.Table):
+        data, null_readings = _null_fields(data, readings)
+        df, rejected, absent = _arrow_normalize(data, fields, sections=("main", "coord"))
+    else:
+        records, rejected = _records(data, "main", "coord")
+        records, null_readings = _null_fields(records, readings)
+        df, absent = _normalize(records, list(fields))
+    dead_letter("weather_data", rejected, "missing main or coord section", "transform")
+    dead_letter("weather_data", null_readings, "null temperature or humidity", "transform")
+    if df.empty:
+        return pd.DataFrame()
+
+    temperature = _column(df, "main.temp", 273.15, absent["main.temp"]).to_numpy(dtype=float)
+    humidity = _column(df, "main.humidity", 50, absent["main.humidity"])
+    temperature_celsius = temperature - 273.15
+    feels_like_temp = temperature_celsius - (humidity.to_numpy(dtype=float) / 100) * 2
+
+    weather = _first_item_field(df["weather"], "description", "Unknown")
+
+    return pd.DataFrame({
+        "city": _column(df, "name", "Unknown City", absent["name"]),
+        "temperature_celsius": np.round(temperature_celsius, 2),
+        "humidity": humidity,
+        "weather": weather,
+        "feels_like_temp": np.round(feels_like_temp, 2),
+        "latitude": _column(df, "coord.lat", 0.0, absent["coord.lat"]),
+        "longitude": _column(df, "coord.lon", 0.0, absent["coord.lon"]),
+        "observed_at": _observed_at(df["dt"])
+    })
 
 
 # Clean and transform COVID-19 data
 def transform_covid_data(data):
-    cleaned_data = []
-    for entry in data:
-        try:
-            state = entry.get("state", "Unknown State")
-            positive_cases = entry.get("positive", 0)
-            hospitalized = entry.get("hospitalized", 0)
-            deaths = entry.get("death", 0)
-
-            cleaned_data.append({
-                "state": state,
-                "positive_cases": positive_cases,
-                "hospitalized": hospitalized,
-                "deaths": deaths
-            })
-        except Exception as e:
-            print(f"Error cleaning COVID data: {e}")
-    return pd.DataFrame(cleaned_data)
+    fields = {"state": pa.string(), "positive": pa.int64(), "hospitalized": pa.int64(), "death": pa.int64()}
+    if isinstance(data, pa.Table):
+        # Non-object records never reach an Arrow handoff; the extractor dead-letters them
+        df, rejected, absent = _arrow_normalize(data, fields)
+    else:
+        records, rejected = _records(data)
+        df = pd.DataFrame.from_records(records, columns=list(fields))
+        absent = _absent_keys(records, fields)
+    dead_letter("covid_data", rejected, "not a JSON object", "transform")
+    if df.empty:
+        return pd.DataFrame()
+
+    # covidtracking sends null for counts it does not have; those stay missing rather than becoming 0
+    return pd.DataFrame({
+        "state": _column(df, "state", "Unknown State", absent["state"]),
+        "positive_cases": _column(df, "positive", 0, absent["positive"]),
+        "hospitalized": _column(df, "hospitalized", 0, absent["hospitalized"]),
+        "deaths": _column(df, "death", 0, absent["death"])
+    })
+
+
+def _single_base_quotes(data):
+    """CrossRates from a payload holding one base's quotes, from JSON or an Arrow handoff"""
+    if isinstance(data, pa.Table):
+        rates = pc.list_flatten(data["rates"])
+        return CrossRates(pc.struct_field(rates, "target_currency").to_numpy(zero_copy_only=False),
+                          pc.struct_field(rates, "rate").to_numpy(zero_copy_only=False))
+    return CrossRates.from_quotes(next(iter(data.values()))["rates"])
+
+
+def _update_times(data):
+    """time_last_updated of every base in the payload, in payload order"""
+    if isinstance(data, pa.Table):
+        if "time_last_updated" not in data.column_names:
+            return pd.Series([None] * len(data), dtype=object)
+        return data["time_last_updated"].to_pandas()
+    return pd.Series([payload.get("time_last_updated") if isinstance(payload, dict) else None
+                      for payload in data.values()], dtype=object)
+
+
+def _cross_bases(cross_rates):
+    if EXCHANGE_CROSS_BASES == "all":
+        return None
+    bases = [base.strip() for base in EXCHANGE_CROSS_BASES.split(",") if base.strip()]
+    missing = [base for base in bases if base not in cross_rates]
+    if missing:
+        print(f"Error cleaning exchange rate data: no quotes for {', '.join(missing)}")
+    return [base for base in bases if base in cross_rates]
+
+
+def _quoted_bases(data):
+    """Keep the bases whose payload carries its rates, dead-lettering the others"""
+    if isinstance(data, pa.Table):
+        if "rates" not in data.column_names:
+            missing = pa.array([True] * len(data))
+        else:
+            missing = pc.is_null(data["rates"])
+        rejected = data.filter(missing).to_pylist()
+        data = data.filter(pc.invert(missing))
+    else:
+        rejected = [{"base_currency": base_currency, "payload": payload} for base_currency, payload in data.items()
+                    if not (isinstance(payload, dict) and isinstance(payload.get("rates"), dict))]
+        missing = {entry["base_currency"] for entry in rejected}
+        data = {base_currency: payload for base_currency, payload in data.items() if base_currency not in missing}
+    dead_letter("exchange_rate_data", rejected, "payload without rates", "transform")
+    return data
 
 
 # Clean and transform exchange rate data
 def transform_exchange_rate_data(data):
-    cleaned_data = []
-    for base_currency, exchange_data in data.items():
-        for target_currency, rate in exchange_data["rates"].items():
-            cleaned_data.append({
-                "base_currency": base_currency,
-                "target_currency": target_currency,
-                "rate": rate
-            })
-    return pd.DataFrame(cleaned_data)
+    data = _quoted_bases(data)
+    if len(data) == 1:
+        # A single base's quotes are triangulated into every requested base without further requests
+        cross_rates = _single_base_quotes(data)
+        df = cross_rates.to_frame(_cross_bases(cross_rates))
+        return df.assign(observed_at=_observed_at(_update_times(data)).iloc[0])
+    if isinstance(data, pa.Table):
+        # One row per base with a list of (target_currency, rate) pairs: explode them column-wise
+        rates = pc.list_flatten(data["rates"])
+        parents = pc.list_parent_indices(data["rates"]).to_numpy()
+        df = pa.table({
+            "base_currency": data["base_currency"].take(parents),
+            "target_currency": pc.struct_field(rates, "target_currency"),
+            "rate": pc.struct_field(rates, "rate")
+        }).to_pandas(split_blocks=True)
+        df["observed_at"] = _observed_at(_update_times(data)).iloc[parents].to_numpy()
+        return df
+    frames = [
+        pd.DataFrame({
+            "base_currency": base_currency,
+            "target_currency": list(exchange_data["rates"].keys()),
+            "rate": list(exchange_data["rates"].values()),
+            "observed_at": exchange_data.get("time_last_updated")
+        })
+        for base_currency, exchange_data in data.items()
+    ]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    df["observed_at"] = _observed_at(df["observed_at"])
+    return df
 
 
 # Clean and transform SpaceX data
 def transform_spacex_data(data):
-    cleaned_data = []
-    for entry in data:
-        try:
-            mission_name = entry.get("name", "Unknown Mission")
-            launch_date = entry.get("date_utc", "Unknown Date")
-            rocket = entry.get("rocket", "Unknown Rocket")
-
-            cleaned_data.append({
-                "mission_name": mission_name,
-                "launch_date": launch_date,
-                "rocket": rocket
-            })
-        except Exception as e:
-            print(f"Error cleaning SpaceX data: {e}")
-    return pd.DataFrame(cleaned_data)
+    fields = {"id": pa.string(), "name": pa.string(), "date_utc": pa.string(), "rocket": pa.string()}
+    if isinstance(data, pa.Table):
+        df, rejected, absent = _arrow_normalize(data, fields)
+    else:
+        records, rejected = _records(data)
+        df = pd.DataFrame.from_records(records, columns=list(fields))
+        absent = _absent_keys(records, fields)
+    dead_letter("spacex_data", rejected, "not a JSON object", "transform")
+    if df.empty:
+        return pd.DataFrame()
 
+    return pd.DataFrame({
+        "mission_id": df["id"],
+        "mission_name": _column(df, "name", "Unknown Mission", absent["name"]),
+        "launch_date": _column(df, "date_utc", "Unknown Date", absent["date_utc"]),
+        "rocket": _column(df, "rocket", "Unknown Rocket", absent["rocket"])
+    })
 
-# Load data into PostgreSQL
-def load_to_postgres(df, table_name):
-    try:
-        conn = psycopg2.connect(
-            dbname="etl_database",
-            user="user",
-            password="password",
-            host="db",
-            port=5432
+
+def _python_rows(df):
+    """Yield rows as tuples of plain Python values, with missing values as None"""
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def _copy_batches(cursor, df, table_name, batch_size):
+    columns = ', '.join(df.columns)
+    for start in range(0, len(df), batch_size):
+        buffer = io.StringIO()
+        df.iloc[start:start + batch_size].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _insert_batches(cursor, df, table_name, batch_size):
+    columns = ', '.join(df.columns)
+    psycopg2.extras.execute_values(
+        cursor,
+        f"INSERT INTO {table_name} ({columns}) VALUES %s",
+        _python_rows(df),
+        page_size=batch_size
+    )
+
+
+def _insert_rows(cursor, df, table_name):
+    columns = ', '.join(df.columns)
+    values = ', '.join(['%s'] * len(df.columns))
+    for row in _python_rows(df):
+        cursor.execute(f"INSERT INTO {table_name} ({columns}) VALUES ({values})", row)
+
+
+def _write_batches(cursor, df, table_name, mode, batch_size):
+    if mode == "copy":
+        _copy_batches(cursor, df, table_name, batch_size)
+    elif mode == "values":
+        _insert_batches(cursor, df, table_name, batch_size)
+    else:
+        _insert_rows(cursor, df, table_name)
+
+
+def _ensure_primary_key(cursor, table_name, keys):
+    """Give tables created by the append mode their natural primary key"""
+    cursor.execute(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+        (table_name,)
+    )
+    if cursor.fetchone():
+        return
+    key_columns = ', '.join(keys)
+    # Keep only the most recently appended row per key; rows without a key cannot be merged
+    cursor.execute(f"DELETE FROM {table_name} WHERE {' OR '.join(f'{key} IS NULL' for key in keys)}")
+    cursor.execute(
+        f"DELETE FROM {table_name} a USING {table_name} b "
+        f"WHERE a.ctid < b.ctid AND {' AND '.join(f'a.{key} = b.{key}' for key in keys)}"
+    )
+    cursor.execute(f"ALTER TABLE {table_name} ADD PRIMARY KEY ({key_columns})")
+
+
+def _upsert_batches(cursor, df, table_name, keys, mode, batch_size, returning=None):
+    """Stage the batch in a temporary table and merge it on the natural key.
+
+    Returns the number of rows inserted or changed; identical rows are not rewritten.
+    With returning, a DataFrame of those columns of the inserted or changed rows instead.
+    """
+    columns = ', '.join(df.columns)
+    key_columns = ', '.join(keys)
+    # A unique name in the session's own temporary schema never collides with a real table or another load
+    stage_table = f"pg_temp.{table_name}_stage_{uuid.uuid4().hex[:12]}"
+    cursor.execute(f"CREATE TEMP TABLE {stage_table} (LIKE {table_name}) ON COMMIT DROP")
+    _write_batches(cursor, df, stage_table, mode, batch_size)
+
+    updates = [col for col in df.columns if col not in keys]
+    if updates:
+        conflict_action = (
+            f"DO UPDATE SET {', '.join(f'{col} = EXCLUDED.{col}' for col in updates)} "
+            f"WHERE ({', '.join(f'{table_name}.{col}' for col in updates)}) "
+            f"IS DISTINCT FROM ({', '.join(f'EXCLUDED.{col}' for col in updates)})"
         )
-        cursor = conn.cursor()
+    else:
+        conflict_action = "DO NOTHING"
+    # The last staged row wins when a batch repeats a key
+    cursor.execute(
+        f"INSERT INTO {table_name} ({columns}) "
+        f"SELECT DISTINCT ON ({key_columns}) {columns} FROM {stage_table} ORDER BY {key_columns}, ctid DESC "
+        f"ON CONFLICT ({key_columns}) {conflict_action}"
+        + (f" RETURNING {', '.join(returning)}" if returning else "")
+    )
+    written = pd.DataFrame(cursor.fetchall(), columns=returning) if returning else cursor.rowcount
+    # Freed now rather than at commit, as an atomic load stages every table in one transaction
+    cursor.execute(f"DROP TABLE {stage_table}")
+    return written
 
-        # Create a table dynamically based on DataFrame columns
-        column_definitions = ', '.join([f"{col} TEXT" for col in df.columns])
-        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({column_definitions});")
 
-        for _, row in df.iterrows():
-            columns = ', '.join(row.keys())
-            values = ', '.join(['%s'] * len(row))
-            cursor.execute(f"INSERT INTO {table_name} ({columns}) VALUES ({values})", tuple(row))
+def _load_history(cursor, df, table_name, mode, batch_size):
+    """Add the snapshot rows to the table's monthly-partitioned history; return the rows written"""
+    keys = primary_key(table_name) + [TIME_COLUMN]
+    df = df.dropna(subset=keys)
+    if df.empty:
+        return 0
+    definitions = ", ".join(f"{col} {col_type}" for col, col_type in column_types(table_name).items())
+    history = ensure_history_table(cursor, table_name, definitions, primary_key(table_name))
+    ensure_partitions(cursor, table_name, df[TIME_COLUMN])
+    # A snapshot seen again (same key and observation time) is only rewritten if its values changed
+    return _upsert_batches(cursor, df, history, keys, mode, batch_size)
 
-        conn.commit()
-        print(f"Data successfully loaded into PostgreSQL table: {table_name}")
+
+def _load_table(cursor, df, table_name, mode, batch_size, write_mode):
+    keys = primary_key(table_name) if write_mode == "upsert" else None
+
+    # Create or evolve the table with the column types declared in the schema registry
+    ensure_table(cursor, table_name, list(df.columns), keys)
+    df = conform(df, table_name)
+    if keys:
+        _ensure_primary_key(cursor, table_name, keys)
+        unkeyed = df[keys].isna().any(axis=1)
+        if unkeyed.any():
+            rejected = df[unkeyed].astype(object).where(df[unkeyed].notna(), None).to_dict("records")
+            dead_letter(table_name, rejected, f"missing primary key ({', '.join(keys)})", "postgres")
+            df = df[~unkeyed]
+
+    # Rollups are recomputed for the groups the rows land in and, for updated rows, leave
+    has_rollup = table_name in ROLLUPS and ROLLUPS[table_name]["source_column"][0] in df.columns
+    backfill = has_rollup and ensure_rollup(cursor, table_name, keyed=bool(keys))
+    accumulate = has_rollup and not backfill and ROLLUPS[table_name].get("accumulate")
+    recompute = has_rollup and not backfill and not accumulate
+    groups = touched_groups(cursor, table_name, df, keys) if recompute else set()
+
+    loaded = df
+    if keys and accumulate:
+        # Only the rows the merge inserted or changed are new samples; a batch loaded again adds none
+        loaded = _upsert_batches(cursor, df, table_name, keys, mode, batch_size,
+                                 returning=[ROLLUPS[table_name]["group"]] + accumulate)
+        written = len(loaded)
+    elif keys:
+        written = _upsert_batches(cursor, df, table_name, keys, mode, batch_size)
+    else:
+        _write_batches(cursor, df, table_name, mode, batch_size)
+        written = len(df)
+
+    if POSTGRES_HISTORY and history_table(table_name) and TIME_COLUMN in df.columns:
+        _load_history(cursor, df, table_name, mode, batch_size)
+
+    # After the history load, so a backfill from the history includes these rows
+    if backfill:
+        backfill_rollup(cursor, table_name)
+    elif has_rollup and written:
+        refresh_rollup(cursor, table_name, groups, loaded)
+
+    # Readers key their caches on this stamp, so only bump it when rows changed
+    if written or backfill:
+        bump_load_version(cursor, table_name)
+    return written
+
+
+# Load data into PostgreSQL
+def load_to_postgres(df, table_name, mode=None, batch_size=None, write_mode=None, conn=None):
+    """Load a DataFrame into a table in a single transaction.
+
+    With conn given, the caller owns the transaction: nothing is committed and
+    errors are raised so the caller can roll back the whole load.
+    """
+    mode = mode or POSTGRES_LOAD_MODE
+    batch_size = batch_size or POSTGRES_BATCH_SIZE
+    write_mode = write_mode or POSTGRES_WRITE_MODE
+    start = time.perf_counter()
+    try:
+        if conn is not None:
+            with conn.cursor() as cursor:
+                written = _load_table(cursor, df, table_name, mode, batch_size, write_mode)
+        else:
+            # Each table borrows its own pooled connection, so parallel sink tasks load side by side
+            with connection() as pooled_conn:
+                with pooled_conn.cursor() as cursor:
+                    written = _load_table(cursor, df, table_name, mode, batch_size, write_mode)
+                pooled_conn.commit()
+        elapsed = time.perf_counter() - start
+        rate = len(df) / elapsed if elapsed > 0 else float("inf")
+        print(f"Data successfully loaded into PostgreSQL table: {table_name} "
+              f"({len(df)} rows, {written} written in {elapsed:.2f}s, {rate:,.0f} rows/s, mode={mode}/{write_mode})")
     except Exception as e:
         print(f"Error loading data to PostgreSQL: {e}")
-    finally:
-        conn.close()
+        raise
+
+
+# Load every dataset into PostgreSQL in one transaction on one pooled connection
+def load_all_to_postgres(frames):
+    with connection() as conn:
+        try:
+            for table_name, df in frames.items():
+                load_to_postgres(df, table_name, conn=conn)
+            conn.commit()
+            print(f"Committed {len(frames)} PostgreSQL tables in one transaction")
+        except Exception as e:
+            conn.rollback()
+            print(f"Rolled back the PostgreSQL load: {e}")
+            raise
 
 
 # Load data into SQLite
-def load_to_sqlite(df, db_path="/app/sqlite_data/etl_database.sqlite", table_name="weather_data"):
+def load_to_sqlite(df, db_path=None, table_name="weather_data", mode=None):
     try:
-        conn = sqlite3.connect(db_path)
-        df.to_sql(table_name, conn, if_exists='replace', index=False)
-        conn.commit()
-        print(f"Data successfully loaded into SQLite table: {table_name}")
+        # Concurrent sink tasks share the file; each waits for the write lock instead of failing
+        start = time.perf_counter()
+        rows = load_sqlite(df, table_name, db_path=db_path, mode=mode)
+        elapsed = time.perf_counter() - start
+        print(f"Data successfully loaded into SQLite table: {table_name} "
+              f"({rows} rows in {elapsed:.2f}s, {rows / elapsed if elapsed else 0:,.0f} rows/s)")
     except Exception as e:
         print(f"Error loading data to SQLite: {e}")
-    finally:
-        conn.close()
+        raise
 
 
 # Save data to multiple formats
-def save_data_to_file_formats(df, base_path="/app/shared_data", table_name="data"):
+def save_data_to_file_formats(df, base_path=SHARED_DATA_PATH, table_name="data"):
     try:
         # CSV
         df.to_csv(f"{base_path}/{table_name}.csv", index=False)
         # Parquet
-        df.to_parquet(f"{base_path}/{table_name}.parquet", index=False)
+        stored(df, table_name).to_parquet(f"{base_path}/{table_name}.parquet", index=False)
         # JSON
         df.to_json(f"{base_path}/{table_name}.json", orient="records")
+        add_metrics(bytes_written=sum(
+            os.path.getsize(f"{base_path}/{table_name}.{extension}") for extension in ("csv", "parquet", "json")
+        ))
         print(f"Data successfully saved for {table_name}")
     except Exception as e:
         print(f"Error saving data to files for {table_name}: {e}")
+        raise
+
+
+def save_cross_rates(df, path=None):
+    """Store the quotes of the frame's first base, from which every cross rate can be rebuilt"""
+    path = path or CROSS_RATES_PATH
+    first = df[df["base_currency"] == df["base_currency"].iloc[0]]
+    CrossRates(first["target_currency"].to_numpy(), first["rate"].to_numpy()).save(f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    add_metrics(bytes_written=os.path.getsize(path))
+
+
+# Stream one raw file through its transform and its enabled sinks, chunk by chunk
+def stream_dataset(table_name, transform, base_path=SHARED_DATA_PATH, chunk_size=None, raw_path=None):
+    chunk_size = chunk_size or TRANSFORM_CHUNK_SIZE
+    sinks = _enabled_sinks(table_name, streaming=True)
+    file_sinks = open_file_sinks(base_path, table_name) if "files" in sinks else None
+    committed = False
+    rows = 0
+    try:
+        path = raw_input_path(raw_path or RAW_DATA_PATH, table_name)
+        add_metrics(bytes_read=os.path.getsize(path))
+        for chunk in iter_raw_chunks(path, chunk_size):
+            with instrument("transform", table_name) as event:
+                df = compact(transform(chunk))
+                event["rows"] = len(df)
+            if df.empty:
+                continue
+            first_chunk = rows == 0
+            rows += len(df)
+            for sink in sinks:
+                if sink == "files":
+                    write_file_chunk(file_sinks, df)
+                elif sink == "sqlite":
+                    # A replacing load only empties the table for the first chunk
+                    load_to_sqlite(df, table_name=table_name,
+                                   mode="append" if SQLITE_WRITE_MODE == "replace" and not first_chunk else None)
+                elif sink == "cross_rates":
+                    # The quotes of the first base are all the store needs, and a chunk never splits a base
+                    if first_chunk:
+                        save_cross_rates(df)
+                else:
+                    SINK_WRITERS[sink](df, table_name)
+        committed = True
+        print(f"Data successfully streamed for {table_name} ({rows} rows to {', '.join(sinks)})")
+    except Exception as e:
+        print(f"Error streaming data for {table_name}: {e}")
+        raise
+    finally:
+        if file_sinks is not None:
+            close_file_sinks(file_sinks, commit=committed)
+
+
+# The transform of every registered source, looked up by the name its registry entry gives
+DATASET_TRANSFORMS = {name: globals()[source["transform"]] for name, source in SOURCES.items()}
+
+# Writers of the sinks a source can declare, called with (rows, table_name)
+SINK_WRITERS = {
+    "files": lambda df, table_name: save_data_to_file_formats(df, table_name=table_name),
+    "parquet_dataset": write_parquet_dataset,
+    "sqlite": lambda df, table_name: load_to_sqlite(df, table_name=table_name),
+    "postgres": load_to_postgres,
+    "cross_rates": lambda df, table_name: save_cross_rates(df)
+}
+
+
+def _enabled_sinks(table_name, streaming=False):
+    """The source's declared sinks, less those switched off by the output settings"""
+    disabled = set()
+    if FILE_OUTPUT_MODE not in ("flat", "both"):
+        disabled.add("files")
+    if FILE_OUTPUT_MODE not in ("dataset", "both"):
+        disabled.add("parquet_dataset")
+    if not CROSS_RATES_PATH:
+        disabled.add("cross_rates")
+    if POSTGRES_ATOMIC_LOAD and not streaming:
+        # Loaded together with the other datasets by one postgres:all task; a stream loads chunk by chunk
+        disabled.add("postgres")
+    return [sink for sink in SOURCES[table_name]["sinks"] if sink not in disabled]
+
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def _postgres_state(table_name):
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+            if not cursor.fetchone()[0]:
+                return None
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            rows = cursor.fetchone()[0]
+            return [get_load_version(cursor, table_name), rows]
+
+
+# Cheap probes of what each sink holds, recorded with every dataset and checked before the manifest is trusted
+SINK_STATES = {
+    "files": lambda table_name: [
+        _file_size(f"{SHARED_DATA_PATH}/{table_name}.{extension}") for extension in ("csv", "parquet", "json")
+    ],
+    "parquet_dataset": dataset_rows,
+    "sqlite": table_rows,
+    "postgres": _postgres_state,
+    "cross_rates": lambda table_name: _file_size(CROSS_RATES_PATH)
+}
+
+
+def _sink_states(table_name):
+    """The probed state of each sink the dataset is configured to write; None where a probe fails"""
+    states = {}
+    for sink in _enabled_sinks(table_name, streaming=True):
+        try:
+            states[sink] = SINK_STATES[sink](table_name)
+        except (OSError, ValueError, sqlite3.Error, psycopg2.Error) as e:
+            print(f"Could not probe the {sink} sink of {table_name}: {e}")
+            states[sink] = None
+    return states
+
+
+def _sink_rows(sink, transformed):
+    """The flat files, the cross rates and a replacing SQLite load take the full snapshot;
+    the other sinks only need the new or changed rows"""
+    if sink in ("files", "cross_rates") or (sink == "sqlite" and SQLITE_WRITE_MODE == "replace"):
+        return transformed["frame"]
+    return transformed["changes"]
+
+
+def _write_sink(transformed, sink, table_name):
+    df = _sink_rows(sink, transformed)
+    if df.empty and sink != "files":
+        return 0
+    with instrument("sink", f"{sink}:{table_name}", rows=len(df)):
+        SINK_WRITERS[sink](df, table_name)
+    return len(df)
+
+
+def _transform_dataset(table_name, path, size):
+    """Read one raw input and transform it; returns the frame, its new or changed rows and their hashes"""
+    with instrument("transform", table_name) as event:
+        if path.endswith(".arrow"):
+            raw_data = read_handoff(path)
+        else:
+            with open(path, "r") as f:
+                raw_data = json.load(f)
+        df = DATASET_TRANSFORMS[table_name](raw_data)
+        event["bytes_read"] = size
+        event["rows"] = len(df)
+        changes, hashes = changed_rows(df, table_name)
+        # Row hashes are taken first, so they do not depend on the dtypes compaction picks
+        df = compact(df, table_name)
+        changes = df.loc[changes.index]
+    print(f"{table_name}: {len(changes)} of {len(df)} rows new or changed")
+    return {"frame": df, "changes": changes, "hashes": hashes}
+
+
+def _load_all_changes(*transformed, table_names):
+    changes = {table_name: result["changes"] for table_name, result in zip(table_names, transformed)
+               if len(result["changes"])}
+    if changes:
+        load_all_to_postgres(changes)
 
 
 # Main transformation process
 def transform_data():
+    try:
+        _transform_data()
+    finally:
+        write_run_report("transform_service")
+
+
+def _prepare_database():
     # Wait for the database to be ready
     wait_for_db()
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            ensure_load_version_table(cursor)
+        conn.commit()
+
+
+def _transform_data():
+    _prepare_database()
+    process_datasets(DATASET_TRANSFORMS)
+
+
+def process_datasets(table_names, done=None):
+    """Transform the given datasets and write them to every sink, resuming unfinished runs.
+
+    When a done set is given, it collects the datasets whose input is fully
+    processed, i.e. recorded in the manifest or unchanged since it was.
+    """
+    done = set() if done is None else done
+    # Datasets whose raw file is byte-identical to the last successful run are skipped entirely
+    manifest = load_manifest()
+    inputs = {}
+    for table_name in table_names:
+        path = raw_input_path(RAW_DATA_PATH, table_name)
+        if not os.path.exists(path):
+            print(f"Skipping {table_name}: no extract in {RAW_DATA_PATH} yet")
+            continue
+        digest = file_digest(path)
+        if CHANGE_DETECTION and table_name in manifest["datasets"]:
+            # Sinks the unfinished run over this input already wrote have legitimately moved on
+            pending = manifest.get("checkpoints", {}).get(table_name, {})
+            finished = pending.get("completed", []) if pending.get("input_sha256") == digest else []
+            stale = stale_sinks(manifest, table_name, _sink_states(table_name), ignore=finished)
+            if stale:
+                print(f"Reloading {table_name} in full, its sinks no longer match the manifest: {', '.join(stale)}")
+                forget_dataset(manifest, table_name)
+        if input_unchanged(manifest, table_name, digest):
+            print(f"Skipping {table_name}: input unchanged since {manifest['datasets'][table_name]['recorded_at']}")
+            done.add(table_name)
+            continue
+        inputs[table_name] = (path, digest, os.path.getsize(path))
+        completed = checkpoint(manifest, table_name, digest)["completed"]
+        if completed:
+            print(f"Resuming {table_name}: {', '.join(completed)} already done for this input")
+    if not inputs:
+        print("All datasets unchanged, nothing to do.")
+        return
+
+    # Every dataset is its own transform -> sinks -> manifest chain; the chains run side by side.
+    # Each finished stage is checkpointed at once, so a restart only runs the stages still missing.
+    pipeline = Pipeline(max_workers=SINK_WORKERS)
+    manifest_lock = threading.Lock()
+    transformed_now = {}
+
+    def completed(table_name):
+        return manifest["checkpoints"][table_name]["completed"]
+
+    def complete(table_name, stage):
+        with manifest_lock:
+            complete_stage(manifest, table_name, stage)
+
+    def transform(table_name, path, size):
+        if "transform" in completed(table_name):
+            try:
+                df, changes, hashes = load_transform_checkpoint(table_name)
+                print(f"{table_name}: {len(changes)} of {len(df)} rows new or changed (from the checkpoint)")
+                return {"frame": df, "changes": changes, "hashes": hashes}
+            except (OSError, ValueError) as e:
+                print(f"Transforming {table_name} again, its checkpoint is unusable: {e}")
+        transformed_now[table_name] = _transform_dataset(table_name, path, size)
+        return transformed_now[table_name]
+
+    def write_sink(transformed, sink, table_name):
+        written = _write_sink(transformed, sink, table_name)
+        complete(table_name, sink)
+        return written
+
+    def load_all(*transformed, table_names):
+        _load_all_changes(*transformed, table_names=table_names)
+        for table_name in table_names:
+            complete(table_name, "postgres")
+
+    def record(transformed, *_, table_name, digest, size):
+        # Only datasets whose whole chain succeeded are recorded, which also drops their checkpoint
+        sinks = _sink_states(table_name)
+        with manifest_lock:
+            if transformed is None:
+                record_dataset(manifest, table_name, digest, size, sinks=sinks)
+            else:
+                record_dataset(manifest, table_name, digest, size, transformed["frame"], transformed["hashes"],
+                               sinks=sinks)
+            done.add(table_name)
+
+    if TRANSFORM_MODE == "streaming":
+        # A stream is checkpointed as a whole; an interrupted one is streamed again (loads are idempotent upserts)
+        for table_name, (path, digest, size) in inputs.items():
+            stream = pipeline.add(f"stream:{table_name}", stream_dataset, table_name, DATASET_TRANSFORMS[table_name])
+            pipeline.add(f"manifest:{table_name}", record, after=(stream,),
+                         table_name=table_name, digest=digest, size=size)
+    else:
+        stages = {}
+        for table_name, (path, digest, size) in inputs.items():
+            transform_task = pipeline.add(f"transform:{table_name}", transform, table_name, path, size)
+            stages[table_name] = [transform_task] + [
+                pipeline.add(f"{sink}:{table_name}", write_sink, sink, table_name, after=(transform_task,))
+                for sink in _enabled_sinks(table_name) if sink not in completed(table_name)
+            ]
+        if POSTGRES_ATOMIC_LOAD:
+            # All tables commit in one transaction, so this step joins the chains
+            loaded = [table_name for table_name in inputs
+                      if "postgres" in SOURCES[table_name]["sinks"] and "postgres" not in completed(table_name)]
+            if loaded:
+                postgres = pipeline.add("postgres:all", load_all,
+                                        after=[f"transform:{table_name}" for table_name in loaded], table_names=loaded)
+                for table_name in loaded:
+                    stages[table_name].append(postgres)
+        for table_name, (path, digest, size) in inputs.items():
+            pipeline.add(f"manifest:{table_name}", record, after=stages[table_name],
+                         table_name=table_name, digest=digest, size=size)
+
+    try:
+        pipeline.run()
+    finally:
+        # Unfinished datasets keep their transform output for the next attempt
+        for table_name, transformed in transformed_now.items():
+            if table_name in manifest["checkpoints"]:
+                save_transform_checkpoint(table_name, transformed["frame"], transformed["changes"],
+                                          transformed["hashes"])
+                complete(table_name, "transform")
+        save_manifest(manifest)
+
+
+def _input_signature(table_name):
+    path = raw_input_path(RAW_DATA_PATH, table_name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def run_daemon():
+    """Watch the shared volume and process each dataset as soon as its extract lands.
+
+    The database wait, imports and connection pool are paid once; afterwards
+    only datasets whose raw file changed since the last poll are processed.
+    """
+    _prepare_database()
+    seen = {}
+    failed = {}
+
+    def due(table_name, signature):
+        if signature in (None, seen.get(table_name)):
+            return False
+        # A failed input is retried after RETRY_INTERVAL, a newer extract right away
+        failure = failed.get(table_name)
+        return failure is None or failure[0] != signature or time.monotonic() - failure[1] >= RETRY_INTERVAL
+
+    def poll():
+        signatures = {table_name: _input_signature(table_name) for table_name in DATASET_TRANSFORMS}
+        landed = [table_name for table_name, signature in signatures.items() if due(table_name, signature)]
+        if not landed:
+            return
+        print(f"New or unfinished extracts: {', '.join(landed)}")
+        reset_run()
+        done = set()
+        try:
+            process_datasets(landed, done)
+        finally:
+            # Only finished datasets are marked as seen; the others resume from their checkpoint
+            for table_name in landed:
+                if table_name in done:
+                    seen[table_name] = signatures[table_name]
+                    failed.pop(table_name, None)
+                else:
+                    failed[table_name] = (signatures[table_name], time.monotonic())
+            write_run_report("transform_service")
 
-    # Load raw datasets
-    with open("/app/shared_data/weather_data.json", "r") as f:
-        weather_data = json.load(f)
-    with open("/app/shared_data/covid_data.json", "r") as f:
-        covid_data = json.load(f)
-    with open("/app/shared_data/exchange_rate_data.json", "r") as f:
-        exchange_rate_data = json.load(f)
-    with open("/app/shared_data/spacex_data.json", "r") as f:
-        spacex_data = json.load(f)
-
-    # Clean and transform datasets
-    weather_df = transform_weather_data(weather_data)
-    covid_df = transform_covid_data(covid_data)
-    exchange_rate_df = transform_exchange_rate_data(exchange_rate_data)
-    spacex_df = transform_spacex_data(spacex_data)
-
-    # Save to multiple formats
-    save_data_to_file_formats(weather_df, table_name="weather_data")
-    save_data_to_file_formats(covid_df, table_name="covid_data")
-    save_data_to_file_formats(exchange_rate_df, table_name="exchange_rate_data")
-    save_data_to_file_formats(spacex_df, table_name="spacex_data")
-
-    # Load into databases
-    load_to_postgres(weather_df, "weather_data")
-    load_to_postgres(covid_df, "covid_data")
-    load_to_postgres(exchange_rate_df, "exchange_rate_data")
-    load_to_postgres(spacex_df, "spacex_data")
-
-    load_to_sqlite(weather_df, table_name="weather_data")
-    load_to_sqlite(covid_df, table_name="covid_data")
-    load_to_sqlite(exchange_rate_df, table_name="exchange_rate_data")
-    load_to_sqlite(spacex_df, table_name="spacex_data")
+    scheduler = Scheduler(max_workers=1)
+    scheduler.every("watch_extracts", WATCH_INTERVAL, poll)
+    scheduler.run()
 
 
 if __name__ == "__main__":
-    transform_data()
+    if RUN_MODE == "daemon":
+        run_daemon()
+    else:
+        transform_data()
@@ -1,30 +1,40 @@
 # Import required libraries
+import argparse
+import os
 import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-import psycopg2
+from matplotlib.figure import Figure
 
-# dfbase connection parameters
-DB_NAME = "etl_database"
-DB_USER = "user"
-DB_PASSWORD = "password"
-DB_HOST = "localhost"  # If running within Docker, use "db"
-DB_PORT = 5432
+# Database connection parameters come from the POSTGRES_* environment variables
+os.environ.setdefault("POSTGRES_HOST", "localhost")  # If running within Docker, use "db"
 
+from etl_common.db import close_pool, connection  # noqa: E402
 
-# Connect to PostgreSQL
+# Larger series are downsampled or aggregated to at most this many points per chart
+MAX_POINTS = int(os.getenv("REPORT_MAX_POINTS", "2000"))
+# At most this many bars or tick labels per chart; the largest categories are drawn, extra ticks left unlabelled
+MAX_LABELS = int(os.getenv("REPORT_MAX_LABELS", "40"))
+PIE_SLICES = 10
+
+# Every dataset the charts draw from, fetched once per run
+DATASET_QUERIES = {
+    # Per-city averages and per-state totals, maintained by the transform service as rows are loaded
+    "weather": "SELECT city, samples, temperature_celsius, humidity, feels_like_temp FROM weather_city_averages ORDER BY city",
+    "covid": "SELECT state, positive_cases, deaths FROM covid_state_totals ORDER BY state",
+    "exchange": "SELECT base_currency, target_currency, rate FROM exchange_rate_data",
+    "spacex": "SELECT mission_name, launch_date FROM spacex_data ORDER BY launch_date",
+    "spacex_monthly": "SELECT month, launches FROM spacex_monthly_launches ORDER BY month"
+}
+
+
+# Connect to PostgreSQL (columns arrive typed as declared in etl_common/schema.py)
 def fetch_data_postgres(query):
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    with connection() as conn:
+        return pd.read_sql_query(query, conn)
 
 
 # Connect to SQLite
@@ -35,161 +45,235 @@ def fetch_data_sqlite(query, db_path="/app/shared_data/etl_database.sqlite"):
     return df
 
 
-# Fetch Weather Data and Plot Temperature & Humidity
-def visualize_weather_data():
-    query = "SELECT city, temperature_celsius, humidity, feels_like_temp FROM weather_data"
-    df = fetch_data_postgres(query)
+def fetch_datasets(names=None):
+    """Read each dataset once, all over the same pooled connection"""
+    with connection() as conn:
+        return {name: pd.read_sql_query(DATASET_QUERIES[name], conn) for name in names or DATASET_QUERIES}
 
-    # Convert metrics to float for plotting
-    df['temperature_celsius'] = df['temperature_celsius'].astype(float)
-    df['feels_like_temp'] = df['feels_like_temp'].astype(float)
-    df['humidity'] = df['humidity'].astype(float)
 
-    bar_width = 0.35
-    cities = df['city']
-    x = range(len(cities))
-
-    # Bar plot for temperature and feels like temperature
-    plt.bar(x, df['temperature_celsius'], width=bar_width, label='Temperature (°C)')
-    plt.bar([i + bar_width for i in x], df['feels_like_temp'], width=bar_width, label='Feels Like Temp (°C)')
-    plt.xlabel('City')
-    plt.ylabel('Value (°C)')
-    plt.title('Temperature vs Feels Like Temperature by City')
-    plt.xticks([i + bar_width / 2 for i in x], cities)
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
+def _tick_step(count):
+    return max(1, -(-count // MAX_LABELS))
 
-    # Scatter plot for temperature and humidity (with annotations)
-    fig, ax = plt.subplots()
-    ax.scatter(df['temperature_celsius'], df['humidity'])
-    plt.xlabel('Temperature (°C)')
-    plt.ylabel('Humidity (%)')
-    plt.title('Temperature vs Humidity by City')
-    for i, txt in enumerate(cities):
-        ax.annotate(txt, (df['temperature_celsius'][i], df['humidity'][i]))
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
 
+def _sample_positions(count):
+    """Evenly spaced positions of at most MAX_POINTS rows out of count, first and last included"""
+    if count <= MAX_POINTS:
+        return np.arange(count)
+    return np.linspace(0, count - 1, MAX_POINTS).astype(int)
 
-# Fetch COVID-19 Data and Visualize Cases & Deaths
-def visualize_covid_data():
-    query = "SELECT state, positive_cases, deaths FROM covid_data"
-    df = fetch_data_postgres(query)
 
-    # Convert metrics to float for plotting
-    df['positive_cases'] = df['positive_cases'].astype(float)
-    df['deaths'] = df['deaths'].astype(float)
+def _largest(df, column):
+    """The MAX_LABELS rows with the largest values in column, in their original order"""
+    if len(df) <= MAX_LABELS:
+        return df
+    return df.nlargest(MAX_LABELS, column).sort_index()
 
-    bar_width = 0.35
-    states = df['state']
-    x = range(len(states))
-
-    # Bar plot for positive cases and deaths
-    plt.bar(x, df['positive_cases'], width=bar_width, label='Positive Cases')
-    plt.bar([i + bar_width for i in x], df['deaths'], width=bar_width, label='Deaths')
-    plt.xlabel('State')
-    plt.ylabel('Count')
-    plt.title('COVID-19 Cases and Deaths by State')
-    plt.xticks([i + bar_width / 2 for i in x], states)
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
 
-    # Pie chart for positive cases by state
-    fig, ax = plt.subplots()
-    ax.pie(df['positive_cases'], labels=states, autopct='%1.1f%%')
-    plt.title('COVID-19 Positive Cases by State')
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
+# Temperature & feels like temperature by city
+def weather_temperature_chart(fig, df):
+    # With many cities, the most observed ones are drawn
+    df = _largest(df, "samples").reset_index(drop=True)
+    ax = fig.subplots()
+    bar_width = 0.35
+    x = np.arange(len(df))
+
+    ax.bar(x, df['temperature_celsius'], width=bar_width, label='Temperature (°C)')
+    ax.bar(x + bar_width, df['feels_like_temp'], width=bar_width, label='Feels Like Temp (°C)')
+    ax.set_xlabel('City')
+    ax.set_ylabel('Value (°C)')
+    ax.set_title('Temperature vs Feels Like Temperature by City')
+    ax.set_xticks(x + bar_width / 2, df['city'])
+    ax.legend()
+    ax.grid(True)
+
+
+# Temperature & humidity by city (annotated while few enough to read)
+def weather_humidity_chart(fig, df):
+    ax = fig.subplots()
+    points = df.iloc[_sample_positions(len(df))]
+    ax.scatter(points['temperature_celsius'], points['humidity'])
+    ax.set_xlabel('Temperature (°C)')
+    ax.set_ylabel('Humidity (%)')
+    ax.set_title('Temperature vs Humidity by City')
+    if len(points) <= MAX_LABELS:
+        for city, temperature, humidity in zip(points['city'], points['temperature_celsius'], points['humidity']):
+            ax.annotate(city, (temperature, humidity))
+    ax.grid(True)
+
+
+# COVID-19 positive cases & deaths by state
+def covid_cases_chart(fig, df):
+    df = _largest(df, "positive_cases").reset_index(drop=True)
+    ax = fig.subplots()
+    bar_width = 0.35
+    x = np.arange(len(df))
+
+    ax.bar(x, df['positive_cases'], width=bar_width, label='Positive Cases')
+    ax.bar(x + bar_width, df['deaths'], width=bar_width, label='Deaths')
+    ax.set_xlabel('State')
+    ax.set_ylabel('Count')
+    ax.set_title('COVID-19 Cases and Deaths by State')
+    ax.set_xticks(x + bar_width / 2, df['state'])
+    ax.tick_params(axis='x', labelrotation=90)
+    ax.legend()
+    ax.grid(True)
+
+
+# COVID-19 share of positive cases by state; the smallest states share one slice
+def covid_share_chart(fig, df):
+    df = df[df['positive_cases'] > 0]
+    if len(df) > PIE_SLICES:
+        top = df.nlargest(PIE_SLICES - 1, 'positive_cases')
+        df = pd.concat([top, pd.DataFrame({
+            'state': ['Other'], 'positive_cases': [df.drop(top.index)['positive_cases'].sum()]
+        })])
+    ax = fig.subplots()
+    ax.pie(df['positive_cases'], labels=df['state'], autopct='%1.1f%%')
+    ax.set_title('COVID-19 Positive Cases by State')
 
     # TODO: Add visualizations related to hospitalizations
 
 
-# Fetch Exchange Rate Data and Plot Currency Comparison
-def visualize_exchange_rate_data():
-    query = "SELECT base_currency, target_currency, rate FROM exchange_rate_data"
-    df = fetch_data_postgres(query)
-
-    # Convert rate to float for plotting
-    df['rate'] = df['rate'].astype(float)
+# Exchange rates of one base currency
+def exchange_rate_chart(fig, df):
+    df = df.sort_values(by='rate', ascending=True)
+    base_currency = df['base_currency'].iloc[0]
+    y = np.arange(len(df))
+    step = _tick_step(len(df))
+
+    ax = fig.subplots()
+    ax.barh(y, df['rate'])
+    ax.set_xlabel('Rate')
+    ax.set_ylabel('Target Currency')
+    ax.set_title(f'Exchange Rates for {base_currency}')
+    # Rates span several orders of magnitude across currencies
+    if len(df) > 1 and df['rate'].min() > 0 and df['rate'].max() / df['rate'].min() > 1000:
+        ax.set_xscale('log')
+    ax.set_yticks(y[::step], df['target_currency'].iloc[::step])
+
+
+# SpaceX mission timeline
+def spacex_timeline_chart(fig, df):
+    df = df.dropna(subset=['launch_date'])
+    # Each mission keeps its position in the full timeline, however many are drawn
+    order = _sample_positions(len(df))
+    df = df.iloc[order]
+
+    ax = fig.subplots()
+    ax.plot(df['launch_date'], order, marker='o', linestyle='', markersize=10 if len(df) <= MAX_LABELS else 3)
+
+    # Missions are named on the y axis, every n-th one once there are too many to read
+    step = _tick_step(len(df))
+    ax.set_yticks(order[::step], df['mission_name'].iloc[::step])
+    ax.set_xlabel('Launch Date')
+    ax.set_title('Space Mission Timeline')
+    ax.grid(True)
+
+
+# SpaceX launches per month, read from the monthly rollup (per year for long histories)
+def spacex_frequency_chart(fig, df):
+    months = pd.to_datetime(df['month'])
+    if len(df) > MAX_LABELS * 3:
+        launches = df['launches'].groupby(months.dt.year.rename('year')).sum()
+        labels, xlabel = launches.index.astype(str), 'Year'
+    else:
+        launches = df['launches']
+        labels, xlabel = [f"({year}, {month})" for year, month in zip(months.dt.year, months.dt.month)], 'Year, Month'
+    x = np.arange(len(launches))
+    step = _tick_step(len(launches))
+
+    ax = fig.subplots()
+    ax.bar(x, launches.to_numpy())
+    ax.set_xticks(x[::step], list(labels)[::step], rotation=90)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel('Number of Launches')
+    ax.set_title('SpaceX Launch Frequency')
+    ax.grid(True)
 
-    for base_currency in df['base_currency'].unique():
-        # Filter the dataframe by base currency
-        base_df = df[df['base_currency'] == base_currency]
-
-        # Sort the dataframe by rate
-        base_df = base_df.sort_values(by='rate', ascending=True)
-        x = range(len(base_df))
-
-        # Horizontal plot for exchange rates
-        plt.barh(x, base_df['rate'])
-        plt.xlabel('Rate')
-        plt.ylabel('Target Currency')
-        plt.title(f'Exchange Rates for {base_currency}')
-        plt.yticks(x, base_df['target_currency'])
-        plt.tight_layout()
-        plt.show()
-
-
-# Fetch SpaceX Data and Plot Launch Frequency
-def visualize_spacex_data():
-    query = "SELECT mission_name, launch_date FROM spacex_data"
-    df = fetch_data_postgres(query)
-
-    # Convert launch_date to datetime format
-    df['launch_date'] = pd.to_datetime(df['launch_date'])
-
-    # Sorting the dataframe by launch date
-    df = df.sort_values(by='launch_date')
-
-    # Timeline plot for SpaceX missions
-    plt.figure(figsize=(12, 6))
-    plt.plot(df['launch_date'], range(len(df)), marker='o', linestyle='', markersize=10)
-
-    # Adding labels to the points
-    for i, row in df.iterrows():
-        plt.text(row['launch_date'], i, row['mission_name'], ha='left', va='center')
+    # TODO: Add visualizations related to rockets
 
-    # Formatting the plot
-    plt.xlabel('Launch Date')
-    plt.title('Space Mission Timeline')
-    plt.yticks(range(len(df)), df['mission_name'])
-    plt.grid(True)
-    plt.tight_layout()
 
-    # Displaying the plot
-    plt.show()
+# Chart name: (dataset, draw function, figure size)
+CHARTS = {
+    "weather_temperature": ("weather", weather_temperature_chart, (10, 6)),
+    "weather_humidity": ("weather", weather_humidity_chart, (8, 6)),
+    "covid_cases": ("covid", covid_cases_chart, (12, 6)),
+    "covid_share": ("covid", covid_share_chart, (8, 8)),
+    "exchange_rates": ("exchange", exchange_rate_chart, (8, 12)),
+    "spacex_timeline": ("spacex", spacex_timeline_chart, (12, 6)),
+    "spacex_frequency": ("spacex_monthly", spacex_frequency_chart, (12, 6))
+}
+
+
+def chart_jobs(datasets):
+    """(file name, chart, rows) of every figure to draw; one exchange-rate figure per base currency"""
+    for chart, (dataset, _, _) in CHARTS.items():
+        df = datasets[dataset]
+        if df.empty:
+            continue
+        if chart == "exchange_rates":
+            for base_currency, base_df in df.groupby('base_currency', sort=True):
+                yield f"{chart}_{base_currency}", chart, base_df
+        else:
+            yield chart, chart, df
+
+
+def render_chart(job, output_dir, formats):
+    """Draw one figure off-screen and save it in every format; returns the written paths.
+
+    The figure is not registered with pyplot, so it is rendered by the Agg
+    canvas without any display and is freed as soon as it goes out of scope.
+    """
+    name, chart, df = job
+    _, draw, figsize = CHARTS[chart]
+    fig = Figure(figsize=figsize, layout='tight')
+    draw(fig, df)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        fig.savefig(path, format=fmt)
+        paths.append(path)
+    return paths
+
+
+def render_report(output_dir, formats=("png",), workers=None):
+    """Fetch every dataset once, then render all figures to files in parallel worker processes"""
+    start = time.perf_counter()
+    datasets = fetch_datasets()
+    # Workers only draw; they must not inherit the pool's open sockets
+    close_pool()
+    fetched = time.perf_counter()
+
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = list(chart_jobs(datasets))
+    paths = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_chart, job, output_dir, formats) for job in jobs]
+        for future in futures:
+            paths.extend(future.result())
+    print(f"Fetched {len(datasets)} datasets in {fetched - start:.2f}s, "
+          f"rendered {len(jobs)} figures to {len(paths)} files in {time.perf_counter() - fetched:.2f}s")
+    return paths
 
-    # Bar Plot (Number of Launches per Month/Year)
-    df['year'] = df['launch_date'].dt.year
-    df['month'] = df['launch_date'].dt.month
 
-    # Grouping by year and month
-    monthly_launches = df.groupby(['year', 'month']).size()
+def run_all_visualizations():
+    """Show every chart in interactive windows"""
+    import matplotlib.pyplot as plt
 
-    # Plotting the data
-    monthly_launches.plot(kind='bar', figsize=(12, 6))
-    plt.xlabel('Year, Month')
-    plt.ylabel('Number of Launches')
-    plt.title('SpaceX Launch Frequency')
-    plt.grid(True)
-    plt.tight_layout()
+    for name, chart, df in chart_jobs(fetch_datasets()):
+        _, draw, figsize = CHARTS[chart]
+        draw(plt.figure(name, figsize=figsize, layout='tight'), df)
     plt.show()
 
-    # TODO: Add visualizations related to rockets
-
-
-def run_all_visualizations():
-    visualize_weather_data()
-    visualize_covid_data()
-    visualize_exchange_rate_data()
-    visualize_spacex_data()
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot the ETL tables")
+    parser.add_argument("--output-dir", help="Render every figure to files in this directory instead of showing them")
+    parser.add_argument("--formats", default="png", help="Comma-separated file formats, e.g. png,svg")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (default: one per CPU)")
+    args = parser.parse_args()
 
-# Run the visualizations
-run_all_visualizations()
+    if args.output_dir:
+        render_report(args.output_dir, tuple(args.formats.split(",")), args.workers)
+    else:
+        run_all_visualizations()